@@ -0,0 +1,123 @@
+"""
+Records a synthetic session in the csv and in the columnar storage format, compresses its lap files with every codec at
+a few levels and reports the disk space saved, the time it takes to compress and the time it takes to load the laps
+compared to the uncompressed lap files. Also checks that compressed laps load the same as uncompressed laps.
+
+Run from the repository root with: python -m benchmarks.bench_compression [number of laps]
+"""
+import configparser
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from f1_2020_telemetry.packets import unpack_udp_packet
+
+from benchmarks.synthetic import SyntheticSession
+from src.packets.packet_saver import PacketSaver
+from src.sessions import SessionData
+from src.storage import LapCompressor, find_compressed
+
+# (codec, level), None for the default level
+SETTINGS = [('gzip', 1), ('gzip', 6), ('bz2', 9), ('lzma', 0), ('lzma', 6)]
+
+
+def record(data_root, session, storage_format):
+	shutil.copytree('cfg', os.path.join(data_root, 'cfg'))
+	os.makedirs(os.path.join(data_root, 'data'))
+
+	recorder_config = configparser.ConfigParser()
+	recorder_config.read(os.path.join(data_root, 'cfg', 'recorder.ini'))
+	recorder_config['storage']['format'] = storage_format
+	recorder_config['compression']['enabled'] = 'no'
+	with open(os.path.join(data_root, 'cfg', 'recorder.ini'), 'w') as config_file:
+		recorder_config.write(config_file)
+
+	saver = PacketSaver(session.session_uid, data_root)
+	for _, datagram in session.datagrams():
+		saver.save(unpack_udp_packet(datagram))
+	saver.close()
+
+
+def lap_files(data_root):
+	"""
+	:return: Paths of all lap files, csv files and columnar folders, below data_root
+	"""
+	paths = []
+	for folder, folder_names, file_names in os.walk(os.path.join(data_root, 'data')):
+		for name in folder_names + file_names:
+			if name.startswith('lap') and (name.endswith('.csv') or name.endswith('.col')):
+				paths.append(os.path.join(folder, name))
+	return paths
+
+
+def disk_usage(paths):
+	"""
+	:return: Bytes used by the files, for folders the files in them, compressed versions of the files included
+	"""
+	size = 0
+	for path in paths:
+		if os.path.isdir(path):
+			size += sum(entry.stat().st_size for entry in os.scandir(path))
+		elif os.path.exists(path):
+			size += os.path.getsize(path)
+		else:
+			size += os.path.getsize(find_compressed(path)[1])
+	return size
+
+
+def load_time(data_root, session, repeat=3):
+	"""
+	:return: Best time in seconds to load all laps of the session, and the laps
+	"""
+	session_data = SessionData(session.session_uid, os.path.join(data_root, 'data'))
+	best, laps = float('inf'), None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		laps = [session_data.load_telemetry(lap, use_cache=False) for lap in range(1, session.num_laps + 1)]
+		best = min(best, time.perf_counter() - start)
+	return best, laps
+
+
+def main(num_laps=2):
+	session = SyntheticSession(num_laps=num_laps)
+
+	for storage_format in ('csv', 'columnar'):
+		source = tempfile.mkdtemp(prefix='f1telemetry-bench-')
+		try:
+			record(os.path.join(source, 'uncompressed'), session, storage_format)
+			paths = lap_files(os.path.join(source, 'uncompressed'))
+			size = disk_usage(paths)
+			seconds, laps = load_time(os.path.join(source, 'uncompressed'), session)
+
+			print(f'{storage_format}: {len(paths)} lap files of {num_laps} laps')
+			print(f'  {"codec":<12}{"MB":>8}{"saved":>8}{"compress s":>12}{"load ms/lap":>13}{"load vs. none":>15}')
+			print(f'  {"none":<12}{size / 1e6:>8.2f}{"":>8}{"":>12}{seconds / num_laps * 1e3:>13.1f}')
+
+			for codec, level in SETTINGS:
+				data_root = os.path.join(source, f'{codec}{level}')
+				shutil.copytree(os.path.join(source, 'uncompressed'), data_root)
+
+				compressor = LapCompressor(codec, level)
+				start = time.perf_counter()
+				compressor.submit(lap_files(data_root))
+				compressor.close()
+				compress_seconds = time.perf_counter() - start
+
+				compressed_size = disk_usage([os.path.join(data_root, os.path.relpath(p, os.path.join(source, 'uncompressed')))
+											  for p in paths])
+				compressed_seconds, compressed_laps = load_time(data_root, session)
+				for lap, compressed_lap in zip(laps, compressed_laps):
+					pd.testing.assert_frame_equal(lap, compressed_lap)
+
+				print(f'  {f"{codec} {level}":<12}{compressed_size / 1e6:>8.2f}{1 - compressed_size / size:>8.0%}'
+					  f'{compress_seconds:>12.2f}{compressed_seconds / num_laps * 1e3:>13.1f}'
+					  f'{compressed_seconds / seconds:>14.2f}x')
+		finally:
+			shutil.rmtree(source, ignore_errors=True)
+
+
+if __name__ == '__main__':
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 2)
@@ -0,0 +1,42 @@
+"""
+Checks that the numpy decoder gives the same values as the ctypes decoder for random packets of every packet type,
+and compares the time it takes to unpack a packet and to read a field of all cars with both decoders.
+
+Run from the repository root with: python -m benchmarks.bench_decoder
+"""
+import timeit
+
+import numpy as np
+from f1_2020_telemetry.packets import HeaderFieldsToPacketType, unpack_udp_packet
+
+from src.packets.numpy_packets import unpack_udp_packet_numpy
+from tests.helpers import assert_same, random_datagram
+
+
+def main(number=20000):
+	rng = np.random.default_rng(2020)
+
+	for packet_type in HeaderFieldsToPacketType.values():
+		for _ in range(20):
+			datagram = random_datagram(packet_type, rng)
+			assert_same(unpack_udp_packet(datagram), unpack_udp_packet_numpy(datagram), packet_type.__name__)
+	print('numpy decoder gives the same values as the ctypes decoder for all packet types')
+
+	datagram = random_datagram(HeaderFieldsToPacketType[(2020, 1, 6)], rng)
+	ctypes_packet = unpack_udp_packet(datagram)
+	numpy_packet = unpack_udp_packet_numpy(datagram)
+
+	results = {
+		'unpack ctypes': timeit.timeit(lambda: unpack_udp_packet(datagram), number=number),
+		'unpack numpy': timeit.timeit(lambda: unpack_udp_packet_numpy(datagram), number=number),
+		'speed of 22 cars ctypes': timeit.timeit(lambda: [c.speed for c in ctypes_packet.carTelemetryData], number=number),
+		'speed of 22 cars numpy': timeit.timeit(lambda: numpy_packet['carTelemetryData']['speed'], number=number),
+		'speed of 1 car ctypes': timeit.timeit(lambda: ctypes_packet.carTelemetryData[0].speed, number=number),
+		'speed of 1 car numpy': timeit.timeit(lambda: numpy_packet['carTelemetryData'][0]['speed'], number=number),
+	}
+	for name, t in results.items():
+		print(f'{name:<28}{t / number * 1e6:>10.2f} us')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,53 @@
+"""
+Compares the per packet cost of formatting the saved fields of a structure with the old _retrieve_attr implementation
+and with the precompiled ExtractionPlan of PacketConfig.
+
+Run from the repository root with: python -m benchmarks.bench_extraction
+"""
+import os
+import timeit
+
+import numpy as np
+from f1_2020_telemetry.packets import CarTelemetryData_V1, CarStatusData_V1, CarMotionData_V1, LapData_V1
+
+from src.packets.packet_config import PacketConfig
+
+
+def legacy_retrieve_attr(structure, fields, newline=True):
+	"""
+	The implementation of PacketSaver._retrieve_attr before extraction plans were introduced.
+	"""
+	save_string = ''
+	for f in fields:
+		if 'Array' in type(getattr(structure, f)).__name__:
+			save_string += str(np.ctypeslib.as_array(getattr(structure, f)))[1:-1] + ','
+		else:
+			try:
+				save_string += str(getattr(structure, f).decode('utf-8')) + ','
+			except (UnicodeDecodeError, AttributeError):
+				save_string += str(getattr(structure, f)) + ','
+
+	if newline:
+		return save_string[:-1] + '\n'
+	else:
+		return save_string[:-1]
+
+
+def main(number=20000):
+	packet_config = PacketConfig(os.path.join('cfg', 'packet_keys.ini'))
+
+	print(f'{"structure":<24}{"before (us)":>14}{"after (us)":>14}{"speedup":>10}')
+	for structure_type, name in [(CarTelemetryData_V1, 'car_telemetry_data'), (CarStatusData_V1, 'car_status_data'),
+								 (CarMotionData_V1, 'car_motion_data'), (LapData_V1, 'lap_data')]:
+		structure = structure_type()
+		fields = packet_config.get_fields(name)
+		plan = packet_config.get_extraction_plan(name, structure_type)
+
+		before = timeit.timeit(lambda: legacy_retrieve_attr(structure, fields), number=number) / number * 1e6
+		after = timeit.timeit(lambda: plan.format(structure), number=number) / number * 1e6
+
+		print(f'{structure_type.__name__:<24}{before:>14.2f}{after:>14.2f}{before / after:>9.1f}x')
+
+
+if __name__ == '__main__':
+	main()
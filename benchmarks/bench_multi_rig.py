@@ -0,0 +1,93 @@
+"""
+Sends the packets of several synthetic games at once, each from its own process at the game's real rate, to a
+UdpListener and PacketWriterThread in this process, as a recorder for several rigs would run. Reports per game how
+many packets were received and saved, the CPU time the recorder used, and checks that every game was saved in its own
+session. Half of the games share a port, the other half each send to their own port.
+
+Run from the repository root with: python -m benchmarks.bench_multi_rig [number of games] [seconds]
+"""
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.synthetic import SyntheticSession
+from src.packets import PacketWriterThread, UdpListener
+
+BASE_PORT = 20900
+
+
+def send(session_uid, port, seconds):
+	"""
+	Sends the first seconds of a synthetic session to localhost:port at the rate the game would send them.
+	:return:
+	"""
+	session = SyntheticSession(session_uid=session_uid, num_laps=1, seed=session_uid)
+	udp_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+	start = time.perf_counter()
+	for session_time, datagram in session.datagrams():
+		if session_time > seconds:
+			break
+		delay = session_time - (time.perf_counter() - start)
+		if delay > 0:
+			time.sleep(delay)
+		udp_socket.sendto(datagram, ('127.0.0.1', port))
+	udp_socket.close()
+
+
+def main(num_games=4, seconds=10.):
+	game_ports = [BASE_PORT if i < num_games // 2 else BASE_PORT + 1 + i - num_games // 2 for i in range(num_games)]
+	ports = sorted(set(game_ports))
+
+	data_root = tempfile.mkdtemp(prefix='f1telemetry-bench-')
+	try:
+		shutil.copytree('cfg', os.path.join(data_root, 'cfg'))
+		os.makedirs(os.path.join(data_root, 'data'))
+		os.makedirs(os.path.join(data_root, 'logs'))
+
+		writer_thread = PacketWriterThread(data_root)
+		writer_thread.start()
+		listener = UdpListener(ports, lambda datagram, source: writer_thread.put(datagram, source=source))
+		listener_thread = threading.Thread(target=listener.run)
+		listener_thread.start()
+		time.sleep(.5)
+
+		cpu_start, wall_start = time.process_time(), time.perf_counter()
+		senders = [multiprocessing.Process(target=send, args=(i + 1, port, seconds)) for i, port in enumerate(game_ports)]
+		for sender in senders:
+			sender.start()
+		for sender in senders:
+			sender.join()
+		time.sleep(.5)
+
+		listener.quit()
+		listener_thread.join()
+		recorder = writer_thread._packet_recorder
+		num_sessions = len(recorder.packet_savers)
+		writer_thread.close()
+		cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+		stats = writer_thread.stats()
+		listener_stats = listener.stats()
+		print(f'{num_games} games on ports {ports} for {seconds:.0f} s')
+		for source, received in sorted(listener_stats['received'].items()):
+			print(f'  {source:<22}{received:>8} packets received')
+		frame_gaps = sum(gaps['gaps'] for gaps in stats['frame_gaps'].values())
+		print(f'  {frame_gaps} frame gaps, {stats["saved"]} saved, {stats["dropped"]} dropped, {stats["errors"]} errors, '
+			  f'{num_sessions} sessions open at the end, max queue depth {stats["max_queue_depth"]}')
+		print(f'  {stats["received"] / listener_stats["wake_ups"]:.2f} datagrams per wake up')
+		print(f'  recorder CPU time {cpu:.2f} s in {wall:.2f} s, {cpu / wall:.0%} of one core, '
+			  f'{cpu / max(stats["saved"], 1) * 1e6:.1f} us per packet')
+
+		sessions = sorted(d for d in os.listdir(os.path.join(data_root, 'data')) if d.isdigit())
+		assert sessions == [str(i + 1) for i in range(num_games)], sessions
+	finally:
+		shutil.rmtree(data_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 4, float(sys.argv[2]) if len(sys.argv) > 2 else 10.)
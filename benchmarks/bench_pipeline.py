@@ -0,0 +1,151 @@
+"""
+Measures the throughput of every stage of the recorder pipeline on a synthetic session, without the game running:
+unpacking datagrams, PacketSaver.save per packet type, TabsWidget.update_data and loading the saved laps with
+SessionData. The session is saved in a temporary data root with a copy of cfg/, so the configured storage format,
+full grid mode and frames are benchmarked.
+
+Run from the repository root with: python -m benchmarks.bench_pipeline [number of laps]
+The UI stage is skipped when PyQt5 cannot be imported, set QT_QPA_PLATFORM=offscreen to run it without a display.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from f1_2020_telemetry.packets import unpack_udp_packet
+
+from benchmarks.synthetic import SyntheticSession
+from src.packets.metrics import PACKET_NAMES
+from src.packets.numpy_packets import unpack_udp_packet_numpy
+from src.packets.packet_saver import PacketSaver
+from src.sessions import LAP_CACHE, SessionData
+
+
+def print_rates(title, times, counts):
+	"""
+	Prints packets/s and µs/packet per packet type and in total.
+	:param title: Name of the stage
+	:param times: Total seconds spent per packetId
+	:param counts: Number of packets per packetId
+	:return:
+	"""
+	print(title)
+	for packet_id, name in enumerate(PACKET_NAMES):
+		if counts[packet_id]:
+			print_rate(f'  {name}', times[packet_id], counts[packet_id])
+	print_rate('  total', sum(times), sum(counts))
+
+
+def print_rate(name, seconds, count):
+	print(f'{name:<28}{count:>8} packets{count / seconds if seconds else 0:>14,.0f} packets/s'
+		  f'{seconds / count * 1e6 if count else 0:>10.2f} us/packet')
+
+
+def time_per_type(function, items, packet_ids):
+	"""
+	Calls function on every item and adds up the time per packetId.
+	:return: List of total seconds per packetId
+	"""
+	times = [0.] * len(PACKET_NAMES)
+	perf_counter = time.perf_counter
+	for item, packet_id in zip(items, packet_ids):
+		start = perf_counter()
+		function(item)
+		times[packet_id] += perf_counter() - start
+	return times
+
+
+def bench_unpack(datagrams, packet_ids, counts):
+	print_rates('unpack_udp_packet (ctypes)', time_per_type(unpack_udp_packet, datagrams, packet_ids), counts)
+	print_rates('unpack_udp_packet_numpy', time_per_type(unpack_udp_packet_numpy, datagrams, packet_ids), counts)
+
+
+def bench_saver(data_root, session_uid, packets, packet_ids, counts):
+	saver = PacketSaver(session_uid, data_root)
+	times = time_per_type(saver.save, packets, packet_ids)
+
+	start = time.perf_counter()
+	saver.close()
+	print_rates('PacketSaver.save', times, counts)
+	print(f'  close{time.perf_counter() - start:>58.3f} s')
+
+
+def bench_ui(data_root, packets, packet_ids, counts, batch_size=12):
+	"""
+	:param batch_size: Packets per TabsWidget.update_data_batch call, at the default refresh rate and 60 packets per
+	second per packet type about this many packets arrive between two refreshes
+	"""
+	try:
+		from PyQt5 import QtWidgets
+		from src.ui.app_window import TabsWidget
+	except ImportError as e:
+		print(f'Skipping TabsWidget, {e}')
+		return
+
+	app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+	tabs = TabsWidget(data_root)
+	tabs.timer.stop()
+	print_rates('TabsWidget.update_data', time_per_type(tabs.update_data, packets, packet_ids), counts)
+
+	tabs = TabsWidget(data_root)
+	tabs.timer.stop()
+	start = time.perf_counter()
+	redraws = 0
+	for i in range(0, len(packets), batch_size):
+		tabs.update_data_batch(packets[i:i + batch_size])
+		if i % (batch_size * 10) == 0:
+			tabs.redraw_active_tab()
+			app.processEvents()
+			redraws += 1
+	print_rate(f'TabsWidget.update_data_batch, {redraws} redraws', time.perf_counter() - start, len(packets))
+
+
+def bench_load(data_root, session_uid, num_laps):
+	session_data = SessionData(session_uid, os.path.join(data_root, 'data'))
+	print('SessionData.load_telemetry')
+
+	def load(name, **kwargs):
+		start = time.perf_counter()
+		laps = [session_data.load_telemetry(lap, **kwargs) for lap in range(1, num_laps + 1)]
+		seconds = time.perf_counter() - start
+		rows = sum(len(lap) for lap in laps)
+		memory = sum(lap.memory_usage(deep=True).sum() for lap in laps)
+		print(f'  {name:<26}{num_laps:>8} laps{rows:>10} rows{seconds / num_laps * 1e3:>12.2f} ms/lap'
+			  f'{memory / num_laps / 1e6:>10.2f} MB/lap')
+
+	LAP_CACHE.clear()
+	load('all columns, compact', use_cache=False, compact=True)
+	load('all columns', use_cache=False)
+	load('speed, lapDistance', columns=['speed', 'lapDistance'], use_cache=False, compact=True)
+	load('all columns, cache miss', compact=True)
+	load('all columns, cache hit', compact=True)
+
+
+def main(num_laps=2):
+	session = SyntheticSession(num_laps=num_laps)
+
+	start = time.perf_counter()
+	datagrams = [datagram for _, datagram in session.datagrams()]
+	print(f'Generated {len(datagrams)} datagrams of {num_laps} laps in {time.perf_counter() - start:.1f} s')
+
+	packets = [unpack_udp_packet(datagram) for datagram in datagrams]
+	packet_ids = [packet.header.packetId for packet in packets]
+	counts = [packet_ids.count(packet_id) for packet_id in range(len(PACKET_NAMES))]
+
+	data_root = tempfile.mkdtemp(prefix='f1telemetry-bench-')
+	try:
+		shutil.copytree('cfg', os.path.join(data_root, 'cfg'))
+		os.makedirs(os.path.join(data_root, 'data'))
+		os.makedirs(os.path.join(data_root, 'logs'))
+
+		bench_unpack(datagrams, packet_ids, counts)
+		bench_saver(data_root, session.session_uid, packets, packet_ids, counts)
+		bench_ui(data_root, packets, packet_ids, counts)
+		bench_load(data_root, session.session_uid, num_laps)
+	finally:
+		shutil.rmtree(data_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 2)
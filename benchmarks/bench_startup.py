@@ -0,0 +1,113 @@
+"""
+Measures the cold start of the entry points of main.py: per scenario a fresh Python process is started a few times, and
+its wall time, peak memory and whether it imported Qt, matplotlib or pandas are reported. The headless recorder is also
+started with main.py --record --headless in a temporary data root and timed until it is recording.
+
+Run from the repository root with: python -m benchmarks.bench_startup [repeats]
+"""
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY_MODULES = ('PyQt5', 'matplotlib', 'pandas')
+
+# Prints the modules of HEAVY_MODULES that were imported, after the statements of a scenario
+REPORT_MODULES = f'import sys; print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules) or "-")'
+
+IMPORT_SCENARIOS = {
+	'import main': 'import main',
+	'headless recorder imports': 'import main; from src.packets import LiveRecorder',
+	'import main, src.sessions': 'import main, src.sessions',
+	'src.sessions.SessionCatalog': 'from src.sessions import SessionCatalog',
+	'main.py GUI imports': 'import main; from src.ui.app_window import AppWindow'
+}
+
+# Port of the headless recorder, away from the game's default port
+RECORD_PORT = 20960
+
+
+def wait(process):
+	"""
+	:return: Peak resident memory of the finished process in MiB
+	"""
+	_, status, rusage = os.wait4(process.pid, 0)
+	process.returncode = os.waitstatus_to_exitcode(status)
+	# ru_maxrss is in KiB on Linux
+	return rusage.ru_maxrss / 1024
+
+
+def run_import(statements):
+	"""
+	:return: Wall time in seconds, peak memory in MiB and the heavy modules that were imported, or the exit code if the
+	statements failed, e.g. when the Qt backend of matplotlib cannot be selected without a display
+	"""
+	start = time.perf_counter()
+	process = subprocess.Popen([sys.executable, '-c', f'{statements}; {REPORT_MODULES}'], stdout=subprocess.PIPE,
+							   stderr=subprocess.DEVNULL, text=True)
+	modules = process.stdout.read().strip()
+	peak = wait(process)
+	if process.returncode != 0:
+		modules = f'failed with exit code {process.returncode}'
+	return time.perf_counter() - start, peak, modules
+
+
+def run_headless_record():
+	"""
+	Starts main.py --record --headless in a temporary data root, and stops it with SIGINT once it is recording.
+	:return: Wall time in seconds until it is recording and peak memory in MiB, None if main.py has no headless mode
+	"""
+	data_root = tempfile.mkdtemp(prefix='f1telemetry-bench-')
+	try:
+		shutil.copytree('cfg', os.path.join(data_root, 'cfg'))
+		for folder in ('data', 'logs'):
+			os.makedirs(os.path.join(data_root, folder))
+		recorder_ini = os.path.join(data_root, 'cfg', 'recorder.ini')
+		with open(recorder_ini) as f:
+			recorder_config = f.read().replace('ports=20777', f'ports={RECORD_PORT}')
+		with open(recorder_ini, 'w') as f:
+			f.write(recorder_config)
+
+		start = time.perf_counter()
+		process = subprocess.Popen([sys.executable, os.path.join(os.getcwd(), 'main.py'), '--record', '--headless'],
+								   cwd=data_root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+		# The recorder prints a line once it is recording
+		line = process.stdout.readline()
+		elapsed = time.perf_counter() - start
+		if not line.startswith('Recording'):
+			process.kill()
+			process.wait()
+			return None
+
+		process.send_signal(signal.SIGINT)
+		process.stdout.read()
+		return elapsed, wait(process), ''
+	finally:
+		shutil.rmtree(data_root, ignore_errors=True)
+
+
+def print_result(name, results):
+	"""
+	:param results: List of (wall time, peak memory, modules) of the runs of a scenario
+	"""
+	best = min(results)
+	print(f'  {name:<30}{best[0] * 1000:>8.0f} ms{max(r[1] for r in results):>8.1f} MiB  {best[2]}')
+
+
+def main(repeats=5):
+	print(f'Best wall time and peak memory of {repeats} runs, and the heavy modules {", ".join(HEAVY_MODULES)} imported')
+	for name, statements in IMPORT_SCENARIOS.items():
+		print_result(name, [run_import(statements) for _ in range(repeats)])
+
+	results = [run_headless_record() for _ in range(repeats)]
+	if None in results:
+		print('  main.py --record --headless is not available')
+	else:
+		print_result('main.py --record --headless', results)
+
+
+if __name__ == '__main__':
+	main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
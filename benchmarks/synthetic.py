@@ -0,0 +1,339 @@
+"""
+Generates valid F1 2020 UDP datagrams of all ten packet types without the game, for benchmarks and for trying out the
+recorder. Cars drive laps around a circular track with a speed profile that slows down for a corner every few hundred
+metres, so the saved laps look like real laps: lap distance and lap numbers progress, lap times are set, fuel goes down
+and tyres wear.
+
+Write a capture file that can be replayed with main.py --replay from the repository root with:
+	python -m benchmarks.synthetic [capture file] [number of laps]
+"""
+import sys
+
+import numpy as np
+
+from src.packets.capture import CaptureWriter
+from src.packets.numpy_packets import PACKET_DTYPES
+
+PACKET_FORMAT = 2020
+GAME_MAJOR_VERSION = 1
+GAME_MINOR_VERSION = 18
+PACKET_VERSION = 1
+
+# The game runs at 60 frames per second, packets are sent every 60 / send_rate frames
+FRAMES_PER_SECOND = 60
+
+
+class SyntheticSession:
+	"""
+	SyntheticSession simulates one session of a number of cars and yields the datagrams the game would send.
+	Lap data, telemetry, status and motion packets are sent at the send rate, session and car setups packets twice per
+	second, participants every five seconds, an event at the start and end of the session, lobby info once before the
+	start and final classification at the end.
+	"""
+
+	def __init__(self, session_uid=1, session_type=12, track_id=3, track_length=5000., num_laps=3, num_cars=22,
+				 send_rate=60, seed=2020):
+		"""
+		:param session_uid: sessionUID in the headers
+		:param session_type: sessionType of the session packets, e.g. 10 for a race or 12 for time trial
+		:param track_id: trackId of the session packets
+		:param track_length: Length of a lap in metres
+		:param num_laps: The session ends when the player has finished this many laps
+		:param num_cars: Number of active cars, the player is car 0
+		:param send_rate: Packets per second of the lap data, telemetry, status and motion packets
+		:param seed: Seed of the random variations between cars and laps
+		"""
+		self.session_uid = session_uid
+		self.session_type = session_type
+		self.track_id = track_id
+		self.track_length = track_length
+		self.num_laps = num_laps
+		self.num_cars = num_cars
+		self.frame_step = FRAMES_PER_SECOND // send_rate
+
+		self._rng = np.random.default_rng(seed)
+		# Some cars are a bit faster than others
+		self._pace = 1. + self._rng.normal(0., 0.01, num_cars)
+		self._pace[0] = 1.
+
+	def _speed(self, distance):
+		"""
+		:return: Speed in km/h at lap distance, slowing down to ~120 km/h for a corner every 625 metres
+		"""
+		return 215. - 95. * np.cos(2 * np.pi * distance / 625.)
+
+	def datagrams(self):
+		"""
+		Simulates the session.
+		:return: Generator of (sessionTime, datagram) tuples, in the order the game would send them
+		"""
+		n = self.num_cars
+		# Cars start behind each other on the grid, just before the line
+		distance = -10. - 8. * np.arange(n)
+		lap_number = np.ones(n, dtype=int)
+		lap_time = np.zeros(n)
+		last_lap_time = np.zeros(n)
+		best_lap_time = np.zeros(n)
+		lap_invalid = np.zeros(n, dtype=int)
+		total_distance = distance.copy()
+		speed = np.zeros(n)
+		fuel = np.full(n, 20. + self.num_laps * 1.6)
+		tyre_wear = np.zeros((n, 4))
+		# Times in ms of the first and second sector of the current lap, 0 until the car has driven them
+		sector_times = np.zeros((n, 2))
+
+		frame = 0
+		dt = 1. / FRAMES_PER_SECOND
+
+		packets = self._packets()
+		yield self._lobby_info(packets, 0., frame)
+		yield self._participants(packets, 0., frame)
+		yield self._event(packets, 0., frame, b'SSTA')
+
+		while lap_number[0] <= self.num_laps:
+			frame += 1
+			session_time = frame * dt
+
+			# Drive, with a little noise so no two laps are the same
+			target = self._speed(np.mod(distance, self.track_length)) * self._pace * (1 + self._rng.normal(0, 0.002, n))
+			acceleration = (target - speed) / 3.6 / dt
+			acceleration = np.clip(acceleration, -45., 12.)
+			speed = np.maximum(speed + acceleration * 3.6 * dt, 0.)
+			step = speed / 3.6 * dt
+			distance += step
+			total_distance += step
+			lap_time += dt
+			fuel -= step / self.track_length * 1.6
+			tyre_wear += step[:, np.newaxis] / self.track_length * np.array([1.1, 1.2, 0.8, 0.9])
+			for sector in range(2):
+				crossed = (sector_times[:, sector] == 0) & (distance >= self.track_length * (sector + 1) / 3)
+				sector_times[crossed, sector] = (lap_time[crossed] - sector_times[crossed, :sector].sum(axis=1) / 1000.) * 1000.
+
+			# Occasionally a car goes off track and invalidates its lap
+			lap_invalid |= self._rng.random(n) < 1e-4
+
+			finished = distance >= self.track_length
+			if finished.any():
+				last_lap_time[finished] = lap_time[finished]
+				best = finished & ((best_lap_time == 0) | (lap_time < best_lap_time)) & (lap_invalid == 0)
+				best_lap_time[best] = lap_time[best]
+				distance[finished] -= self.track_length
+				lap_time[finished] = 0.
+				lap_number[finished] += 1
+				lap_invalid[finished] = 0
+				sector_times[finished] = 0.
+
+			if frame % self.frame_step == 0:
+				state = {
+					'distance': distance, 'lap_number': lap_number, 'lap_time': lap_time, 'last_lap_time': last_lap_time,
+					'best_lap_time': best_lap_time, 'lap_invalid': lap_invalid, 'total_distance': total_distance,
+					'speed': speed, 'acceleration': acceleration, 'fuel': fuel, 'tyre_wear': tyre_wear,
+					'sector_times': sector_times
+				}
+				yield self._motion(packets, session_time, frame, state)
+				yield self._lap_data(packets, session_time, frame, state)
+				yield self._car_telemetry(packets, session_time, frame, state)
+				yield self._car_status(packets, session_time, frame, state)
+
+			if frame % (FRAMES_PER_SECOND // 2) == 0:
+				yield self._session(packets, session_time, frame)
+				yield self._car_setups(packets, session_time, frame)
+
+			if frame % (FRAMES_PER_SECOND * 5) == 0:
+				yield self._participants(packets, session_time, frame)
+
+		yield self._event(packets, frame * dt, frame, b'SEND')
+		yield self._final_classification(packets, frame * dt, frame, lap_number, best_lap_time, total_distance)
+
+	def write_capture(self, path):
+		"""
+		Writes the datagrams of the session to a capture file, with their sessionTime as timestamp.
+		:param path: Path of the capture file
+		:return: Number of datagrams written
+		"""
+		writer = CaptureWriter(path)
+		count = 0
+		for session_time, datagram in self.datagrams():
+			writer.write(datagram, session_time)
+			count += 1
+		writer.close()
+		return count
+
+	@staticmethod
+	def _packets():
+		"""
+		:return: A zeroed numpy record per packetId, reused for every packet of that type
+		"""
+		return {packet_id: np.zeros(1, dtype=packet_dtype) for packet_id, packet_dtype in PACKET_DTYPES.items()}
+
+	def _finish(self, packet, packet_id, session_time, frame):
+		"""
+		Fills in the header of a packet.
+		:return: (sessionTime, datagram) tuple
+		"""
+		header = packet['header']
+		header['packetFormat'] = PACKET_FORMAT
+		header['gameMajorVersion'] = GAME_MAJOR_VERSION
+		header['gameMinorVersion'] = GAME_MINOR_VERSION
+		header['packetVersion'] = PACKET_VERSION
+		header['packetId'] = packet_id
+		header['sessionUID'] = self.session_uid
+		header['sessionTime'] = session_time
+		header['frameIdentifier'] = frame
+		header['playerCarIndex'] = 0
+		header['secondaryPlayerCarIndex'] = 255
+		return session_time, packet.tobytes()
+
+	def _motion(self, packets, session_time, frame, state):
+		packet = packets[0]
+		cars = packet['carMotionData'][0, :self.num_cars]
+		angle = 2 * np.pi * state['distance'] / self.track_length
+		radius = self.track_length / (2 * np.pi)
+		cars['worldPositionX'] = radius * np.cos(angle)
+		cars['worldPositionZ'] = radius * np.sin(angle)
+		cars['worldVelocityX'] = -np.sin(angle) * state['speed'] / 3.6
+		cars['worldVelocityZ'] = np.cos(angle) * state['speed'] / 3.6
+		cars['gForceLateral'] = (state['speed'] / 3.6) ** 2 / radius / 9.81
+		cars['gForceLongitudinal'] = state['acceleration'] / 9.81
+		cars['gForceVertical'] = 1.
+		cars['yaw'] = angle + np.pi / 2
+		packet['wheelSpeed'][0] = state['speed'][0] / 3.6
+		return self._finish(packet, 0, session_time, frame)
+
+	def _session(self, packets, session_time, frame):
+		packet = packets[1]
+		packet['weather'] = 0
+		packet['trackTemperature'] = 33
+		packet['airTemperature'] = 24
+		packet['totalLaps'] = self.num_laps
+		packet['trackLength'] = self.track_length
+		packet['sessionType'] = self.session_type
+		packet['trackId'] = self.track_id
+		packet['sessionDuration'] = 3600
+		packet['sessionTimeLeft'] = max(3600 - int(session_time), 0)
+		packet['pitSpeedLimit'] = 80
+		return self._finish(packet, 1, session_time, frame)
+
+	def _lap_data(self, packets, session_time, frame, state):
+		packet = packets[2]
+		cars = packet['lapData'][0, :self.num_cars]
+		cars['lastLapTime'] = state['last_lap_time']
+		cars['currentLapTime'] = state['lap_time']
+		cars['sector1TimeInMS'] = state['sector_times'][:, 0]
+		cars['sector2TimeInMS'] = state['sector_times'][:, 1]
+		cars['bestLapTime'] = state['best_lap_time']
+		cars['lapDistance'] = state['distance']
+		cars['totalDistance'] = state['total_distance']
+		cars['currentLapNum'] = state['lap_number']
+		cars['sector'] = np.clip(np.mod(state['distance'], self.track_length) * 3 // self.track_length, 0, 2)
+		cars['currentLapInvalid'] = state['lap_invalid']
+		cars['carPosition'] = np.argsort(np.argsort(-state['total_distance'])) + 1
+		cars['gridPosition'] = np.arange(1, self.num_cars + 1)
+		cars['driverStatus'] = 1
+		cars['resultStatus'] = 2
+		return self._finish(packet, 2, session_time, frame)
+
+	def _event(self, packets, session_time, frame, code):
+		packet = packets[3]
+		packet['eventStringCode'] = code
+		return self._finish(packet, 3, session_time, frame)
+
+	def _participants(self, packets, session_time, frame):
+		packet = packets[4]
+		packet['numActiveCars'] = self.num_cars
+		cars = packet['participants'][0, :self.num_cars]
+		cars['aiControlled'] = 1
+		cars['aiControlled'][0] = 0
+		cars['driverId'] = np.arange(self.num_cars)
+		cars['teamId'] = np.arange(self.num_cars) // 2
+		cars['raceNumber'] = np.arange(self.num_cars) + 2
+		cars['name'] = [f'Driver {i}'.encode() for i in range(self.num_cars)]
+		return self._finish(packet, 4, session_time, frame)
+
+	def _car_setups(self, packets, session_time, frame):
+		packet = packets[5]
+		cars = packet['carSetups'][0, :self.num_cars]
+		cars['frontWing'] = 5
+		cars['rearWing'] = 5
+		cars['brakeBias'] = 56
+		cars['fuelLoad'] = 20. + self.num_laps * 1.6
+		return self._finish(packet, 5, session_time, frame)
+
+	def _car_telemetry(self, packets, session_time, frame, state):
+		packet = packets[6]
+		cars = packet['carTelemetryData'][0, :self.num_cars]
+		speed = state['speed']
+		braking = state['acceleration'] < 0
+		cars['speed'] = speed
+		cars['throttle'] = np.where(braking, 0., 1.)
+		cars['brake'] = np.where(braking, np.clip(-state['acceleration'] / 45., 0., 1.), 0.)
+		cars['steer'] = np.sin(2 * np.pi * state['distance'] / 625.) * 0.3
+		cars['gear'] = np.clip(speed // 45 + 1, 1, 8)
+		cars['engineRPM'] = 7000 + (speed % 45) / 45 * 5000
+		cars['brakesTemperature'] = 400 + braking[:, np.newaxis] * 300
+		cars['tyresSurfaceTemperature'] = 95
+		cars['tyresInnerTemperature'] = 100
+		cars['engineTemperature'] = 110
+		cars['tyresPressure'] = np.array([22.5, 22.5, 24., 24.], dtype=np.float32)
+		return self._finish(packet, 6, session_time, frame)
+
+	def _car_status(self, packets, session_time, frame, state):
+		packet = packets[7]
+		cars = packet['carStatusData'][0, :self.num_cars]
+		cars['fuelMix'] = 1
+		cars['frontBrakeBias'] = 56
+		cars['fuelInTank'] = state['fuel']
+		cars['fuelCapacity'] = 110.
+		cars['fuelRemainingLaps'] = state['fuel'] / 1.6
+		cars['maxRPM'] = 12000
+		cars['idleRPM'] = 4000
+		cars['maxGears'] = 8
+		cars['tyresWear'] = state['tyre_wear']
+		cars['actualTyreCompound'] = 17
+		cars['visualTyreCompound'] = 17
+		cars['tyresAgeLaps'] = state['lap_number'] - 1
+		cars['ersStoreEnergy'] = 4e6
+		cars['ersDeployMode'] = 1
+		return self._finish(packet, 7, session_time, frame)
+
+	def _final_classification(self, packets, session_time, frame, lap_number, best_lap_time, total_distance):
+		packet = packets[8]
+		packet['numCars'] = self.num_cars
+		cars = packet['classificationData'][0, :self.num_cars]
+		cars['position'] = np.argsort(np.argsort(-total_distance)) + 1
+		cars['numLaps'] = lap_number - 1
+		cars['gridPosition'] = np.arange(1, self.num_cars + 1)
+		cars['resultStatus'] = 3
+		cars['bestLapTime'] = best_lap_time
+		cars['totalRaceTime'] = session_time
+		cars['numTyreStints'] = 1
+		return self._finish(packet, 8, session_time, frame)
+
+	def _lobby_info(self, packets, session_time, frame):
+		packet = packets[9]
+		packet['numPlayers'] = self.num_cars
+		players = packet['lobbyPlayers'][0, :self.num_cars]
+		players['aiControlled'] = 1
+		players['teamId'] = np.arange(self.num_cars) // 2
+		players['name'] = [f'Driver {i}'.encode() for i in range(self.num_cars)]
+		players['readyStatus'] = 1
+		return self._finish(packet, 9, session_time, frame)
+
+
+def synthetic_sessions(session_types=(5, 6, 7), num_laps=2, **kwargs):
+	"""
+	Simulates several sessions after each other, each with its own sessionUID, like a qualifying of Q1, Q2 and Q3.
+	:param session_types: sessionType of each session
+	:param num_laps: Number of laps per session
+	:param kwargs: Passed on to SyntheticSession
+	:return: Generator of (sessionTime, datagram) tuples
+	"""
+	for i, session_type in enumerate(session_types):
+		yield from SyntheticSession(session_uid=i + 1, session_type=session_type, num_laps=num_laps, seed=2020 + i,
+									**kwargs).datagrams()
+
+
+if __name__ == '__main__':
+	capture_path = sys.argv[1] if len(sys.argv) > 1 else 'synthetic.f1cap'
+	laps = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+	print(f'Wrote {SyntheticSession(num_laps=laps).write_capture(capture_path)} datagrams to {capture_path}')
@@ -2,20 +2,22 @@ import os
 import sys
 from os.path import abspath
 
-import numpy as np
-from PyQt5 import QtWidgets
-from matplotlib import pyplot as plt, cm
-from matplotlib.cm import ScalarMappable
-from matplotlib.collections import LineCollection
-
-from src import sessions, config
-from src.ui.app_window import AppWindow
+# Qt, matplotlib and pandas take most of the start up time and memory, they are only imported by the modes that use
+# them, so that the headless recorder does not load them at all
 
 
 def plot_data(data_root):
+	from matplotlib import pyplot as plt
+
+	from src import sessions, config
+	from src.ui.graphs import LodLine, TrackMap
+
 	config.setup_field_config(data_root)
+	sessions.configure_lap_cache(data_root)
 	data_path = os.path.join(data_root, 'data')
 
+	track_geometries = sessions.TrackGeometryCache(data_path)
+
 	sd = sessions.SessionData(12413849075212313025, data_path)  # RB ring
 	# sd = sessions.SessionData(9607873297504516202, data_path)  # Silverstone
 	# sd = sessions.SessionData(11541244035795733387, data_path)  # Brazil
@@ -29,10 +31,11 @@ def plot_data(data_root):
 
 		fig, (ax0, ax1, ax2, ax3) = plt.subplots(4, sharex='all')
 
-		ax0.plot(data['lapDistance'], data['speed'])
-		ax1.plot(data['lapDistance'], data['throttle'])
-		ax2.plot(data['lapDistance'], data['brake'])
-		ax3.plot(data['lapDistance'], data['gear'])
+		# Lines only draw a level of detail of the visible range, which is recomputed on pan and zoom
+		LodLine.plot(ax0, data['lapDistance'], data['speed'])
+		LodLine.plot(ax1, data['lapDistance'], data['throttle'])
+		LodLine.plot(ax2, data['lapDistance'], data['brake'])
+		LodLine.plot(ax3, data['lapDistance'], data['gear'])
 
 		ax0.set_ylabel(config.get_axis_label('speed'))
 		ax1.set_ylabel(config.get_axis_label('throttle'))
@@ -44,30 +47,58 @@ def plot_data(data_root):
 
 		field_to_plot = 'speed'
 
-		vmax = max(data[field_to_plot])
-		data = data[data.lapDistance > 0]
+		# The map is drawn on the cached centerline of the track, built from the recorded laps the first time
+		session_info = sd.session_info()
+		track_id = session_info['track_id'] if session_info is not None else None
+		# The track is unknown when no session packet was received for the session type, or the session type is not in
+		# the catalog, then only this lap is drawn
+		geometry = track_geometries.get(track_id) if track_id is not None else None
+		geometry = geometry or sessions.TrackGeometry.from_laps(track_id, [data])
+		track_map = TrackMap(ax, geometry, norm=plt.Normalize(1, max(data[field_to_plot])))
+		track_map.set_lap(data['lapDistance'], data[field_to_plot])
 
-		x = np.array(data['worldPositionX'])
-		y = np.array(data['worldPositionZ'])
+		fig.colorbar(track_map.collection)
 
-		points = np.array([x, y]).T.reshape(-1, 1, 2)
-		segments = np.concatenate([points[:-1], points[1:]], axis=1)
+	plt.show()
 
-		cmap = cm.get_cmap('viridis', int(vmax))
-		lc_comp = LineCollection(segments, cmap=cmap, norm=plt.Normalize(1, vmax))
-		lc_comp.set_array(data[field_to_plot])
-		lc_comp.set_linewidth(5)
 
-		ax.add_collection(lc_comp)
-		ax.axis('equal')
-		# For some reason, tracks are mirroed so unmirror it by inverting an axis
-		ax.invert_yaxis()
-		ax.tick_params(labelleft=False, left=False, labelbottom=False, bottom=False)
+def run_app(data_root, **kwargs):
+	"""
+	Starts the application window, it records or replays packets and shows them.
+	:param data_root: Points to the base folder which contains the folders data, cfg and logs.
+	:param kwargs: Passed to AppWindow
+	:return:
+	"""
+	from PyQt5 import QtWidgets
 
-		sm = ScalarMappable(cmap=cmap, norm=plt.Normalize(1, cmap.N + 1))
-		fig.colorbar(sm)
+	from src.ui.app_window import AppWindow
+
+	app = QtWidgets.QApplication(sys.argv)
+	window = AppWindow(data_root, **kwargs)
+
+	# Start qt application
+	app.exec_()
 
-	plt.show()
+
+def record_headless(data_root):
+	"""
+	Records packets without a window until interrupted with Ctrl+C or SIGTERM, e.g. on a PC without a display.
+	:param data_root: Points to the base folder which contains the folders data, cfg and logs.
+	:return:
+	"""
+	import signal
+
+	from src.packets import LiveRecorder
+
+	live_recorder = LiveRecorder(data_root)
+	for signal_number in (signal.SIGINT, signal.SIGTERM):
+		signal.signal(signal_number, lambda *args: live_recorder.quit())
+
+	print('Recording, press Ctrl+C to stop.', flush=True)
+	live_recorder.run()
+
+	stats = live_recorder.stats()
+	print(f'Stopped recording, {stats["saved"]} packets saved, {stats["dropped"]} dropped.')
 
 
 if __name__ == '__main__':
@@ -75,11 +106,27 @@ if __name__ == '__main__':
 	data_root = abspath(os.getcwd())
 
 	# --record is to record data while playing F1 2020
+	# --headless records without a window, and without importing Qt and matplotlib
 	if '--record' in sys.argv:
-		app = QtWidgets.QApplication(sys.argv)
-		window = AppWindow(data_root)
-
-		# Start qt application
-		app.exec_()
+		if '--headless' in sys.argv:
+			record_headless(data_root)
+		else:
+			run_app(data_root)
+	# --replay [capture file] replays a capture file recorded with [capture] enabled in cfg/recorder.ini
+	# --speed [factor|max] sets the replay speed, default is real time
+	elif '--replay' in sys.argv:
+		replay_path = sys.argv[sys.argv.index('--replay') + 1]
+		replay_speed = 1.
+		if '--speed' in sys.argv:
+			speed_arg = sys.argv[sys.argv.index('--speed') + 1]
+			replay_speed = None if speed_arg == 'max' else float(speed_arg)
+
+		run_app(data_root, replay_path=replay_path, replay_speed=replay_speed)
 	elif '--plot' in sys.argv:
 		plot_data(data_root)
+	# --rebuild-catalog rebuilds data/catalog.json from the recorded lap files
+	elif '--rebuild-catalog' in sys.argv:
+		from src import sessions
+
+		num_sessions = sessions.rebuild_catalog(os.path.join(data_root, 'data'))
+		print(f'Catalog rebuilt, {num_sessions} sessions.')
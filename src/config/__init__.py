@@ -1,4 +1,5 @@
 from .field_config import FieldConfig
+from .recorder_config import RecorderConfig
 
 global field_config
 
@@ -12,4 +13,4 @@ def get_axis_label(field):
     if field_config is not None:
         return field_config.get_axis_label(field)
     else:
-        raise ValueError('Field config is not set up yet, call config.setup_field_config first.')
\ No newline at end of file
+        raise ValueError('Field config is not set up yet, call config.setup_field_config first.')
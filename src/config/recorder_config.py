@@ -0,0 +1,24 @@
+import os
+from configparser import ConfigParser
+
+
+class RecorderConfig:
+    """
+    RecorderConfig reads cfg/recorder.ini, which specifies how the recorder writes packets to disk.
+    """
+
+    def __init__(self, data_root):
+        self.recorder_config = ConfigParser()
+        self.recorder_config.read(os.path.join(data_root, 'cfg', 'recorder.ini'))
+
+    def get(self, section, option, fallback=None):
+        return self.recorder_config.get(section, option, fallback=fallback)
+
+    def get_int(self, section, option, fallback=None):
+        return self.recorder_config.getint(section, option, fallback=fallback)
+
+    def get_float(self, section, option, fallback=None):
+        return self.recorder_config.getfloat(section, option, fallback=fallback)
+
+    def get_bool(self, section, option, fallback=None):
+        return self.recorder_config.getboolean(section, option, fallback=fallback)
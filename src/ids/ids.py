@@ -1,3 +1,5 @@
+import os
+
 team_ids = {}
 driver_ids = {}
 track_ids = {}
@@ -9,8 +11,9 @@ def load_ids():
 	Loads the ids and corresponding names of tracks, teams, drivers and nationalities into their corresponding dicts.
 	:return:
 	"""
-	for d, f in zip([team_ids, driver_ids, track_ids, nationalities_ids], ['ids/teams.id', 'ids/drivers.id', 'ids/tracks.id', 'ids/nationalities.id']):
-		with open(f, encoding='UTF-8') as d_file:
+	for d, f in zip([team_ids, driver_ids, track_ids, nationalities_ids], ['teams.id', 'drivers.id', 'tracks.id', 'nationalities.id']):
+		# The id files are next to this module, independent of the working directory
+		with open(os.path.join(os.path.dirname(__file__), f), encoding='UTF-8') as d_file:
 			for line in d_file:
 				id, name = line.split(',')
 				d[int(id)] = name.strip()
@@ -1 +1,9 @@
-from .packet_saver import PacketSaver
\ No newline at end of file
+from .packet_saver import PacketSaver
+from .packet_recorder import PacketRecorder
+from .capture import CaptureWriter, CaptureReader
+from .replay import Replayer
+from .packet_writer_thread import PacketWriterThread
+from .numpy_packets import unpack_udp_packet_numpy
+from .metrics import FrameGapTracker, RecorderMetrics
+from .udp_listener import UdpListener
+from .live_recorder import LiveRecorder
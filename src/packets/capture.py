@@ -0,0 +1,113 @@
+import mmap
+import os
+import struct
+import time
+
+# A capture file starts with CAPTURE_MAGIC, followed by records. Each record is a little endian float64 receive
+# timestamp (seconds since epoch) and a uint16 length, followed by the raw datagram of that length.
+CAPTURE_MAGIC = b'F1CAP\x00\x00\x01'
+RECORD_HEADER = struct.Struct('<dH')
+
+
+class CaptureWriter:
+	"""
+	CaptureWriter appends raw UDP datagrams together with their receive timestamp to a capture file.
+	"""
+
+	def __init__(self, path):
+		"""
+		Opens the capture file at path, creates it if it does not exist yet.
+		:param path: Path of the capture file
+		"""
+		self.path = path
+		os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+		self._file = open(path, 'ab')
+		if self._file.tell() == 0:
+			self._file.write(CAPTURE_MAGIC)
+
+	def write(self, datagram, timestamp=None):
+		"""
+		Appends datagram to the capture file.
+		:param datagram: Raw bytes as received from the socket
+		:param timestamp: Receive time in seconds since epoch, defaults to now
+		:return:
+		"""
+		if timestamp is None:
+			timestamp = time.time()
+		self._file.write(RECORD_HEADER.pack(timestamp, len(datagram)))
+		self._file.write(datagram)
+
+	def flush(self):
+		self._file.flush()
+
+	def close(self):
+		self._file.close()
+
+
+class CaptureReader:
+	"""
+	CaptureReader memory-maps a capture file and iterates over its records as (timestamp, datagram) tuples.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+
+		self._file = open(path, 'rb')
+		if os.path.getsize(path) < len(CAPTURE_MAGIC):
+			raise ValueError(f'{path} is not a capture file.')
+		self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		if self._mm[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+			self.close()
+			raise ValueError(f'{path} is not a capture file.')
+
+		# Offsets of the records, built on first use
+		self._offsets = None
+
+	def __iter__(self):
+		mm = self._mm
+		offset = len(CAPTURE_MAGIC)
+		end = len(mm) - RECORD_HEADER.size
+		while offset <= end:
+			timestamp, length = RECORD_HEADER.unpack_from(mm, offset)
+			offset += RECORD_HEADER.size
+			if offset + length > len(mm):
+				# Last record was only partially written
+				break
+			yield timestamp, mm[offset:offset + length]
+			offset += length
+
+	def __len__(self):
+		return len(self.offsets())
+
+	def __getitem__(self, index):
+		timestamp, length = RECORD_HEADER.unpack_from(self._mm, self.offsets()[index])
+		start = self.offsets()[index] + RECORD_HEADER.size
+		return timestamp, self._mm[start:start + length]
+
+	def offsets(self):
+		"""
+		:return: List of the byte offsets of all complete records in the file.
+		"""
+		if self._offsets is None:
+			self._offsets = []
+			mm = self._mm
+			offset = len(CAPTURE_MAGIC)
+			end = len(mm) - RECORD_HEADER.size
+			while offset <= end:
+				_, length = RECORD_HEADER.unpack_from(mm, offset)
+				if offset + RECORD_HEADER.size + length > len(mm):
+					break
+				self._offsets.append(offset)
+				offset += RECORD_HEADER.size + length
+		return self._offsets
+
+	def close(self):
+		self._mm.close()
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.close()
@@ -0,0 +1,185 @@
+import logging
+import os
+import time
+
+
+class BufferedFileWriter:
+	"""
+	BufferedFileWriter keeps a single file handle open and buffers the data written to it in memory.
+	The buffer is written to disk once it exceeds buffer_size bytes or once flush_interval seconds have passed since the
+	last flush, whichever comes first.
+	"""
+
+	def __init__(self, path, first_line_if_not_exists=None, buffer_size=65536, flush_interval=1.0):
+		"""
+		Opens the file at path in append mode. If the file is empty, first_line_if_not_exists is written to it first.
+		:param path: Path of the file
+		:param first_line_if_not_exists: The first line of the file that will be written only if the file does not exist
+		or is empty.
+		:param buffer_size: Number of bytes to buffer before writing to disk
+		:param flush_interval: Maximum number of seconds data is kept in the buffer
+		"""
+		self.path = path
+		self._buffer_size = buffer_size
+		self._flush_interval = flush_interval
+
+		self._buffer = []
+		self._buffered_bytes = 0
+		self._last_flush = time.monotonic()
+
+		self._file = open(path, 'a')
+		if first_line_if_not_exists is not None and self._file.tell() == 0:
+			self.write(first_line_if_not_exists)
+
+	def write(self, data):
+		"""
+		Adds data to the buffer, flushes the buffer to disk if one of the thresholds is reached.
+		:param data: String to write
+		:return:
+		"""
+		self._buffer.append(data)
+		self._buffered_bytes += len(data)
+
+		if self._buffered_bytes >= self._buffer_size or time.monotonic() - self._last_flush >= self._flush_interval:
+			self.flush()
+
+	def flush(self):
+		"""
+		Writes the buffered data to disk.
+		:return:
+		"""
+		if self._buffer:
+			self._file.write(''.join(self._buffer))
+			self._file.flush()
+			self._buffer = []
+			self._buffered_bytes = 0
+		self._last_flush = time.monotonic()
+
+	def flush_if_due(self):
+		"""
+		Flushes the buffer if flush_interval has passed since the last flush. Useful when no new data is being written.
+		:return:
+		"""
+		if time.monotonic() - self._last_flush >= self._flush_interval:
+			self.flush()
+
+	def close(self):
+		self.flush()
+		self._file.close()
+
+
+class WriterPool:
+	"""
+	WriterPool keeps one writer, by default a BufferedFileWriter, per file. Writers can be assigned to a group, e.g. a lap number, so that all
+	files belonging to that group can be closed at once.
+	"""
+
+	def __init__(self, buffer_size=65536, flush_interval=1.0):
+		self._buffer_size = buffer_size
+		self.flush_interval = flush_interval
+
+		# path -> writer
+		self._writers = {}
+		# group -> set of paths
+		self._groups = {}
+
+		self._last_flush = time.monotonic()
+
+	def write(self, path, data, first_line_if_not_exists=None, group=None):
+		"""
+		Writes data to the file at path, opening a writer for it if there is none yet.
+		:param path: Path of the file
+		:param data: String to write
+		:param first_line_if_not_exists: The first line of the file, only written if the file does not exist yet
+		:param group: Group the file belongs to, see close_group()
+		:return:
+		"""
+		writer = self._writers.get(path)
+		if writer is None:
+			writer = self.open(path, lambda: BufferedFileWriter(path, first_line_if_not_exists, self._buffer_size,
+																  self.flush_interval), group)
+
+		writer.write(data)
+
+	def write_and_close(self, path, data, first_line_if_not_exists=None):
+		"""
+		Writes data to the file at path and closes it right away, for files that are written once or rarely, so that their
+		data is on disk as soon as it is written and they do not keep a file handle open.
+		:param path: Path of the file
+		:param data: String to write
+		:param first_line_if_not_exists: The first line of the file, only written if the file does not exist yet
+		:return:
+		"""
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		writer = BufferedFileWriter(path, first_line_if_not_exists, self._buffer_size, self.flush_interval)
+		writer.write(data)
+		writer.close()
+
+	def get(self, path):
+		"""
+		:return: The writer of the file at path, None if it is not open.
+		"""
+		return self._writers.get(path)
+
+	def open(self, path, create_writer, group=None):
+		"""
+		Adds a writer created by create_writer for path to the pool. Writers other than BufferedFileWriter must implement
+		flush(), flush_if_due() and close().
+		:param path: Path of the file or folder the writer writes to
+		:param create_writer: Callable without arguments that returns the writer
+		:param group: Group the file belongs to, see close_group()
+		:return: The created writer
+		"""
+		logging.info(f'Opening writer for {path}')
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		writer = create_writer()
+		self._writers[path] = writer
+		self._groups.setdefault(group, set()).add(path)
+
+		return writer
+
+	def flush_if_due(self):
+		"""
+		Flushes all writers whose flush interval has passed. The writers are only checked once every flush interval, so
+		this is cheap enough to call for every packet.
+		:return:
+		"""
+		if time.monotonic() - self._last_flush >= self.flush_interval:
+			for writer in self._writers.values():
+				writer.flush_if_due()
+			self._last_flush = time.monotonic()
+
+	def flush(self):
+		"""
+		Flushes all writers.
+		:return:
+		"""
+		for writer in self._writers.values():
+			writer.flush()
+		self._last_flush = time.monotonic()
+
+	def close_group(self, group):
+		"""
+		Flushes and closes all writers in group.
+		:param group:
+		:return: Paths of the closed files
+		"""
+		paths = sorted(self._groups.pop(group, set()))
+		for path in paths:
+			logging.info(f'Closing writer for {path}')
+			self._writers.pop(path).close()
+		return paths
+
+	def groups(self):
+		"""
+		:return: List of the groups that have open writers
+		"""
+		return list(self._groups)
+
+	def close(self):
+		"""
+		Flushes and closes all writers.
+		:return:
+		"""
+		for group in list(self._groups):
+			self.close_group(group)
@@ -0,0 +1,76 @@
+class FrameAssembler:
+	"""
+	FrameAssembler groups the rows of the lap streams that share a frameIdentifier into one wide row per car, so that a lap
+	can be saved as a single aligned table, lap[N]_frames.csv, which can be loaded without merging.
+	A frame is finished as soon as a packet of a newer frame arrives. Streams that were not received for a frame are
+	marked in the missingStreams column, a bitmask with bit i set when STREAMS[i] is missing, and depending on the
+	partial frame policy their values are either forward-filled from the previous frame or left empty.
+	"""
+
+	STREAMS = ('telemetry', 'motion', 'status', 'data')
+	PARTIAL_FRAME_POLICIES = ('forward_fill', 'flag')
+
+	def __init__(self, write_frame, num_fields, partial_frames='forward_fill'):
+		"""
+		:param write_frame: Callable that is called with (car index, lap number, row) for every finished frame of every car
+		:param num_fields: Dictionary of stream to the number of fields in its rows
+		:param partial_frames: One of PARTIAL_FRAME_POLICIES
+		"""
+		if partial_frames not in self.PARTIAL_FRAME_POLICIES:
+			raise ValueError(f'Unknown partial frame policy {partial_frames}, must be one of {self.PARTIAL_FRAME_POLICIES}.')
+
+		self._write_frame = write_frame
+		self._forward_fill = partial_frames == 'forward_fill'
+		self._empty_rows = [','.join([''] * num_fields[stream]) for stream in self.STREAMS]
+		self._stream_indices = {stream: i for i, stream in enumerate(self.STREAMS)}
+
+		# Frame that is being assembled, its sessionTime and per car the lap number and the row of each stream
+		self._frame_identifier = None
+		self._session_time = None
+		self._pending = {}
+
+		# Last received row of each stream per car, used to forward-fill
+		self._last_rows = {}
+
+	def add(self, frame_identifier, session_time, stream, car_index, lap_number, row):
+		"""
+		Adds the row of one stream of one car to its frame, finishes the previous frame if this row belongs to a new one.
+		:param frame_identifier: frameIdentifier from the packet header
+		:param session_time: sessionTime from the packet header
+		:param stream: One of STREAMS
+		:param car_index: Index of the car in the packet arrays
+		:param lap_number: Current lap number of the car
+		:param row: Values of the stream fields, separated by commas, without newline
+		:return:
+		"""
+		if frame_identifier != self._frame_identifier:
+			self.flush()
+			self._frame_identifier = frame_identifier
+			self._session_time = session_time
+
+		pending = self._pending.get(car_index)
+		if pending is None:
+			# The lap number at the start of the frame decides in which lap the frame is saved
+			pending = self._pending[car_index] = (lap_number, [None] * len(self.STREAMS))
+		pending[1][self._stream_indices[stream]] = row
+
+	def flush(self):
+		"""
+		Finishes the frame that is being assembled and writes it.
+		:return:
+		"""
+		for car_index, (lap_number, rows) in self._pending.items():
+			last_rows = self._last_rows.setdefault(car_index, [None] * len(self.STREAMS))
+
+			missing = 0
+			for i, row in enumerate(rows):
+				if row is not None:
+					last_rows[i] = row
+				else:
+					missing |= 1 << i
+					rows[i] = last_rows[i] if self._forward_fill and last_rows[i] is not None else self._empty_rows[i]
+
+			self._write_frame(car_index, lap_number,
+							  f'{self._session_time},{self._frame_identifier},{",".join(rows)},{missing}\n')
+
+		self._pending = {}
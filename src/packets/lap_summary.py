@@ -0,0 +1,131 @@
+import numpy as np
+
+# Tyre arrays in the packets are ordered rear left, rear right, front left, front right
+TYRES = ('RL', 'RR', 'FL', 'FR')
+
+# Columns of laps.csv, times are in seconds, speeds in km/h, fuel in kg and tyre wear in percent
+LAP_SUMMARY_COLUMNS = ['lapNumber', 'lapTime', 'sector1Time', 'sector2Time', 'sector3Time', 'valid', 'pitStatus',
+					   'topSpeed', 'minSpeedSector1', 'minSpeedSector2', 'minSpeedSector3', 'fuelUsed'] + \
+					  [f'tyreWear{tyre}' for tyre in TYRES] + ['visualTyreCompound', 'tyresAgeLaps']
+
+
+class LapSummaries:
+	"""
+	LapSummaries keeps running aggregates of the current lap of every car, updated with the lap data, car telemetry and
+	car status of every packet, so that a summary row can be written as soon as a lap has been completed, without
+	reading back its lap files. A row holds the lap and sector times, validity, the highest pitStatus of the lap, the top
+	speed and the lowest speed per sector, usually the slowest corner of the sector, and the fuel used and tyre wear
+	gained during the lap.
+	"""
+
+	def __init__(self, num_cars=22):
+		"""
+		:param num_cars: Number of cars in the packet arrays
+		"""
+		self.num_cars = num_cars
+
+		# Sector the car is in, from the last lap data, the speeds of telemetry packets are assigned to it
+		self._sector = np.zeros(num_cars, dtype=np.int64)
+
+		self._sector_times = np.zeros((num_cars, 2))
+		self._pit_status = np.zeros(num_cars, dtype=np.int64)
+		self._top_speed = np.full(num_cars, np.nan)
+		self._min_speed = np.full((num_cars, 3), np.nan)
+		# Fuel and tyre wear at the first and the last car status of the lap
+		self._fuel_start = np.full(num_cars, np.nan)
+		self._fuel = np.full(num_cars, np.nan)
+		self._wear_start = np.full((num_cars, len(TYRES)), np.nan)
+		self._wear = np.full((num_cars, len(TYRES)), np.nan)
+		self._compound = np.zeros(num_cars, dtype=np.int64)
+		self._tyres_age = np.zeros(num_cars, dtype=np.int64)
+
+	def reset(self, car_index):
+		"""
+		Starts a new lap for a car.
+		:param car_index: Index of the car in the packet arrays
+		:return:
+		"""
+		self._sector_times[car_index] = 0.
+		self._pit_status[car_index] = 0
+		self._top_speed[car_index] = np.nan
+		self._min_speed[car_index] = np.nan
+		# The next lap starts with the fuel and tyre wear the previous lap ended with
+		self._fuel_start[car_index] = self._fuel[car_index]
+		self._wear_start[car_index] = self._wear[car_index]
+
+	def add_lap_data(self, car_indices, sector1_times, sector2_times, sectors, pit_status):
+		"""
+		:param car_indices: Indices of the cars the values are of
+		:param sector1_times: sector1TimeInMS of the cars
+		:param sector2_times: sector2TimeInMS of the cars
+		:param sectors: sector of the cars
+		:param pit_status: pitStatus of the cars
+		:return:
+		"""
+		car_indices = np.asarray(car_indices)
+		self._sector_times[car_indices, 0] = sector1_times
+		self._sector_times[car_indices, 1] = sector2_times
+		self._sector[car_indices] = np.clip(sectors, 0, 2)
+		self._pit_status[car_indices] = np.maximum(self._pit_status[car_indices], pit_status)
+
+	def add_telemetry(self, car_indices, speeds):
+		"""
+		:param car_indices: Indices of the cars the values are of
+		:param speeds: speed of the cars
+		:return:
+		"""
+		car_indices = np.asarray(car_indices)
+		speeds = np.asarray(speeds, dtype=float)
+		self._top_speed[car_indices] = np.fmax(self._top_speed[car_indices], speeds)
+		sectors = self._sector[car_indices]
+		self._min_speed[car_indices, sectors] = np.fmin(self._min_speed[car_indices, sectors], speeds)
+
+	def add_status(self, car_indices, fuel, tyres_wear, compounds, tyres_age):
+		"""
+		:param car_indices: Indices of the cars the values are of
+		:param fuel: fuelInTank of the cars
+		:param tyres_wear: tyresWear of the cars, one row of four tyres per car
+		:param compounds: visualTyreCompound of the cars
+		:param tyres_age: tyresAgeLaps of the cars
+		:return:
+		"""
+		car_indices = np.asarray(car_indices)
+		self._fuel[car_indices] = fuel
+		self._wear[car_indices] = np.asarray(tyres_wear, dtype=float).reshape(len(car_indices), len(TYRES))
+		self._compound[car_indices] = compounds
+		self._tyres_age[car_indices] = tyres_age
+
+		first = car_indices[np.isnan(self._fuel_start[car_indices])]
+		self._fuel_start[first] = self._fuel[first]
+		self._wear_start[first] = self._wear[first]
+
+	def finish(self, car_index, lap_number, lap_time, valid):
+		"""
+		Completes the lap of a car and starts its next lap.
+		:param car_index: Index of the car in the packet arrays
+		:param lap_number: Number of the completed lap
+		:param lap_time: Lap time in seconds, lastLapTime of the first lap data of the next lap
+		:param valid: Whether the lap was valid
+		:return: Row of laps.csv for the lap, ending with a newline
+		"""
+		sector1, sector2 = self._sector_times[car_index] / 1000.
+		# The third sector has no time of its own in the packets
+		sector3 = lap_time - sector1 - sector2 if sector1 > 0 and sector2 > 0 else np.nan
+
+		values = [lap_number, lap_time, sector1 or np.nan, sector2 or np.nan, sector3, int(valid),
+				  self._pit_status[car_index], self._top_speed[car_index], *self._min_speed[car_index],
+				  self._fuel_start[car_index] - self._fuel[car_index],
+				  *(self._wear[car_index] - self._wear_start[car_index]),
+				  self._compound[car_index], self._tyres_age[car_index]]
+
+		self.reset(car_index)
+		return ','.join(_format(value) for value in values) + '\n'
+
+
+def _format(value):
+	"""
+	:return: value as it is saved in laps.csv, NaN is saved as an empty value
+	"""
+	if isinstance(value, (float, np.floating)):
+		return '' if np.isnan(value) else str(round(float(value), 4))
+	return str(int(value)) if isinstance(value, np.integer) else str(value)
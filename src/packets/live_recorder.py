@@ -0,0 +1,83 @@
+import datetime
+import os
+
+from src.config import RecorderConfig
+from src.packets.metrics import RecorderMetrics
+from src.packets.packet_writer_thread import PacketWriterThread
+from src.packets.udp_listener import UdpListener
+
+
+class LiveRecorder:
+	"""
+	LiveRecorder receives the packets of one or more games on the ports configured in the [listener] section of
+	cfg/recorder.ini and saves them, with the capture file, queue, decoder and metrics as configured there. It does not
+	depend on Qt: the GUI runs it on a QThread through PacketListener, main.py --record --headless runs it on its own.
+	"""
+
+	def __init__(self, data_root, on_packet=None):
+		"""
+		:param data_root: Points to the base folder which contains the folders data, cfg and logs.
+		:param on_packet: Callable that is called with every unpacked packet, e.g. to show it in the GUI, None to only
+		save packets
+		"""
+		self.data_root = data_root
+		self.on_packet = on_packet
+		self.quit_flag = False
+
+		self.udp_listener = None
+		self.writer_thread = None
+
+	def run(self):
+		"""
+		Receives and saves packets until quit() is called. Blocks the calling thread.
+		:return:
+		"""
+		recorder_config = RecorderConfig(self.data_root)
+
+		# Optionally append every raw datagram to a capture file, so the session can be replayed later
+		capture_path = None
+		if recorder_config.get_bool('capture', 'enabled', fallback=False):
+			capture_path = os.path.join(self.data_root, recorder_config.get('capture', 'folder', fallback='captures'),
+										f'{datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.f1cap')
+
+		# Datagrams are unpacked, passed on and saved on a separate thread, this thread only receives them
+		self.writer_thread = PacketWriterThread(self.data_root,
+												max_size=recorder_config.get_int('queue', 'max_size', fallback=4096),
+												overflow_policy=recorder_config.get('queue', 'overflow', fallback='drop_oldest'),
+												on_packet=self.on_packet, capture_path=capture_path,
+												decoder=recorder_config.get('decoder', 'type', fallback='ctypes'),
+												metrics=RecorderMetrics(
+													recorder_config.get_float('metrics', 'summary_interval', fallback=60.)))
+		self.writer_thread.start()
+
+		# Packets of every game are saved in their own session, told apart by their source
+		ports = [int(port) for port in recorder_config.get('listener', 'ports', fallback='20777').split(',')]
+		self.udp_listener = UdpListener(ports, lambda datagram, source: self.writer_thread.put(datagram, source=source),
+										host=recorder_config.get('listener', 'host', fallback=''),
+										receive_buffer_size=recorder_config.get_int('listener', 'receive_buffer_size',
+																					fallback=UdpListener.RECEIVE_BUFFER_SIZE),
+										max_burst=recorder_config.get_int('listener', 'max_burst',
+																		  fallback=UdpListener.MAX_BURST))
+		# quit() may have been called before the listener existed
+		if not self.quit_flag:
+			self.udp_listener.run()
+
+		# Make sure everything that is still queued or buffered ends up on disk
+		self.writer_thread.close()
+
+	def stats(self):
+		"""
+		:return: Packet counters, latencies, queue depth and frame gaps of the writer thread, see PacketWriterThread.stats()
+		"""
+		if self.writer_thread is None:
+			return {}
+		return self.writer_thread.stats()
+
+	def quit(self):
+		"""
+		Stops receiving packets, can be called from any thread and from signal handlers.
+		:return:
+		"""
+		self.quit_flag = True
+		if self.udp_listener is not None:
+			self.udp_listener.quit()
@@ -0,0 +1,214 @@
+import logging
+import time
+
+from f1_2020_telemetry.packets import PacketID
+
+# Names of the packet types, indexed by packetId
+PACKET_NAMES = [packet_id.name.lower() for packet_id in PacketID]
+
+# Packet types that are sent at the send rate set in the game, only these are checked for frame gaps. The other types
+# are sent at a fixed rate or only when something happens.
+FRAME_GAP_PACKET_IDS = frozenset((PacketID.MOTION, PacketID.LAP_DATA, PacketID.CAR_TELEMETRY, PacketID.CAR_STATUS))
+
+
+class LatencyHistogram:
+	"""
+	LatencyHistogram counts latencies in power of two buckets of microseconds, bucket i holds the latencies of
+	[2^(i-1), 2^i) µs. Recording is a few integer operations, so it can be done for every packet.
+	"""
+
+	NUM_BUCKETS = 32
+
+	def __init__(self):
+		self.buckets = [0] * self.NUM_BUCKETS
+		self.count = 0
+		self.total = 0.
+		self.max = 0.
+
+	def record(self, seconds):
+		"""
+		:param seconds: Latency in seconds, e.g. the difference of two time.perf_counter() calls
+		:return:
+		"""
+		self.buckets[min(int(seconds * 1e6).bit_length(), self.NUM_BUCKETS - 1)] += 1
+		self.count += 1
+		self.total += seconds
+		if seconds > self.max:
+			self.max = seconds
+
+	def percentile(self, percentile):
+		"""
+		:param percentile: Percentile between 0 and 100
+		:return: Upper bound in µs of the bucket that contains the percentile, 0 if nothing was recorded
+		"""
+		if self.count == 0:
+			return 0
+		rank = percentile / 100 * self.count
+		cumulative = 0
+		for i, bucket in enumerate(self.buckets):
+			cumulative += bucket
+			if cumulative >= rank:
+				return 1 << i
+		return 1 << (self.NUM_BUCKETS - 1)
+
+	def stats(self):
+		"""
+		:return: Dictionary with the count, mean and max in µs and the p50, p90 and p99 bucket bounds in µs
+		"""
+		return {
+			'count': self.count,
+			'mean_us': self.total / self.count * 1e6 if self.count else 0.,
+			'p50_us': self.percentile(50),
+			'p90_us': self.percentile(90),
+			'p99_us': self.percentile(99),
+			'max_us': self.max * 1e6
+		}
+
+
+class FrameGapTracker:
+	"""
+	FrameGapTracker detects missed frames in a stream of packets of one type, e.g. motion packets, from their
+	frameIdentifiers. Packets are not sent every frame but at the send rate set in the game, so the smallest step seen
+	between two consecutive frameIdentifiers is taken as the expected step, any larger step is a gap.
+	The send rate can change during a session, e.g. in the menus or after a change of the settings. A larger step that
+	repeats REBASE_STEPS times in a row is therefore taken as the new expected step rather than as gaps. The frames
+	missed in a gap are only counted once a step that is not part of such a run follows, so they are returned by a later
+	call of record().
+	"""
+
+	REBASE_STEPS = 3
+
+	def __init__(self):
+		# Per key the last frameIdentifier and the expected step between frameIdentifiers
+		self._last_frames = {}
+		self._frame_steps = {}
+		# Per key the run of equal steps larger than the expected step: (step, number of steps, frames missed if they are
+		# gaps)
+		self._runs = {}
+
+	def record(self, key, frame_identifier):
+		"""
+		:param key: Key of the stream of packets, e.g. the packetId
+		:param frame_identifier: frameIdentifier from the packet header
+		:return: Number of packets of the stream missed since the previous call that returned them, 0 if there is no gap
+		"""
+		last = self._last_frames.get(key)
+		self._last_frames[key] = frame_identifier
+		if last is None or frame_identifier <= last:
+			# First packet of this stream, or a restart, e.g. a new session or a flashback
+			self._runs.pop(key, None)
+			return 0
+
+		step = frame_identifier - last
+		expected = self._frame_steps.get(key)
+		run_step, run_length, run_missing = self._runs.pop(key, (None, 0, 0))
+		if expected is None or step < expected:
+			# A higher send rate, the steps of the run were gaps of the previous rate
+			self._frame_steps[key] = step
+			return run_missing
+		if step == expected:
+			return run_missing
+
+		if step != run_step:
+			# A new run, the steps of the previous run were gaps
+			missing, run_step, run_length, run_missing = run_missing, step, 0, 0
+		else:
+			missing = 0
+		run_length += 1
+		run_missing += step // expected - 1
+
+		if run_length == self.REBASE_STEPS:
+			logging.info(f'Send rate of {key} changed, expecting a frameIdentifier every {step} frames instead of {expected}.')
+			self._frame_steps[key] = step
+		else:
+			self._runs[key] = (run_step, run_length, run_missing)
+		return missing
+
+
+class RecorderMetrics:
+	"""
+	RecorderMetrics collects counters and latencies of the recorder pipeline: packets per packet type, decode, save and
+	emit latency histograms, the depth of the writer queue and gaps in the frameIdentifiers of the packet types in
+	FRAME_GAP_PACKET_IDS, see FrameGapTracker.
+	"""
+
+	STAGES = ('decode', 'emit', 'save')
+
+	def __init__(self, summary_interval=60.):
+		"""
+		:param summary_interval: Seconds between summaries logged by log_summary_if_due, 0 disables them
+		"""
+		self.summary_interval = summary_interval
+
+		self.packets = [0] * len(PACKET_NAMES)
+		self.latencies = {stage: LatencyHistogram() for stage in self.STAGES}
+
+		self.queue_depth = 0
+		self.max_queue_depth = 0
+
+		# Frames are tracked per stream and packet type, the gaps and frames missing in them are counted per packet type
+		self._frame_gap_tracker = FrameGapTracker()
+		self.frame_gaps = [0] * len(PACKET_NAMES)
+		self.missing_frames = [0] * len(PACKET_NAMES)
+
+		self._last_summary = time.monotonic()
+
+	def record_packet(self, packet_id, frame_identifier, source=None):
+		"""
+		Counts a packet and checks whether frames of its type have been missed since the previous one of its stream.
+		:param packet_id: packetId from the packet header
+		:param frame_identifier: frameIdentifier from the packet header
+		:param source: Key of the stream the packet is part of, e.g. its source and sessionUID when packets of several games
+		are received, frames are counted per stream
+		:return:
+		"""
+		self.packets[packet_id] += 1
+		if packet_id not in FRAME_GAP_PACKET_IDS:
+			return
+
+		missing = self._frame_gap_tracker.record((source, packet_id), frame_identifier)
+		if missing:
+			self.frame_gaps[packet_id] += 1
+			self.missing_frames[packet_id] += missing
+
+	def record_latency(self, stage, seconds):
+		self.latencies[stage].record(seconds)
+
+	def record_queue_depth(self, depth):
+		self.queue_depth = depth
+		if depth > self.max_queue_depth:
+			self.max_queue_depth = depth
+
+	def stats(self):
+		"""
+		:return: Dictionary with the packets per packet type, the latency stats per stage, the queue depth and the frame
+		gaps per packet type
+		"""
+		return {
+			'packets': {name: count for name, count in zip(PACKET_NAMES, self.packets) if count},
+			'latency': {stage: histogram.stats() for stage, histogram in self.latencies.items()},
+			'queue_depth': self.queue_depth,
+			'max_queue_depth': self.max_queue_depth,
+			'frame_gaps': {name: {'gaps': gaps, 'missing_frames': missing}
+						   for name, gaps, missing in zip(PACKET_NAMES, self.frame_gaps, self.missing_frames) if gaps}
+		}
+
+	def summary(self):
+		"""
+		:return: One line summary of stats()
+		"""
+		packets = ', '.join(f'{name}={count}' for name, count in zip(PACKET_NAMES, self.packets) if count)
+		latencies = ', '.join(f'{stage} mean={h.stats()["mean_us"]:.1f}us p99<{h.percentile(99)}us'
+							  for stage, h in self.latencies.items() if h.count)
+		gaps = sum(self.frame_gaps)
+		return f'packets: {packets or "none"}; latency: {latencies or "none"}; queue depth {self.queue_depth} ' \
+			   f'(max {self.max_queue_depth}); {gaps} frame gaps, {sum(self.missing_frames)} frames missed'
+
+	def log_summary_if_due(self):
+		"""
+		Logs summary() at most once every summary_interval seconds.
+		:return:
+		"""
+		if self.summary_interval and time.monotonic() - self._last_summary >= self.summary_interval:
+			logging.info(f'Recorder metrics: {self.summary()}')
+			self._last_summary = time.monotonic()
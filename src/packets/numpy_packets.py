@@ -0,0 +1,82 @@
+import ctypes
+import functools
+
+import numpy as np
+from f1_2020_telemetry.packets import HeaderFieldsToPacketType, PacketHeader, UnpackError, unpack_udp_packet
+
+
+@functools.lru_cache(maxsize=None)
+def dtype_from_ctypes(ctype):
+	"""
+	Creates a numpy dtype with the same memory layout as a ctypes type from f1_2020_telemetry.packets.
+	Nested structures become nested structured dtypes, fixed size arrays become subarrays and char arrays become byte
+	strings, so their values are the same as those returned by ctypes.
+	:param ctype: ctypes structure, union, array or simple type
+	:return: numpy.dtype object
+	"""
+	if issubclass(ctype, (ctypes.Structure, ctypes.Union)):
+		names = [f[0] for f in ctype._fields_]
+		return np.dtype({
+			'names': names,
+			'formats': [dtype_from_ctypes(f[1]) for f in ctype._fields_],
+			'offsets': [getattr(ctype, name).offset for name in names],
+			'itemsize': ctypes.sizeof(ctype)
+		})
+	elif issubclass(ctype, ctypes.Array):
+		if ctype._type_ is ctypes.c_char:
+			return np.dtype(f'S{ctype._length_}')
+		return np.dtype((dtype_from_ctypes(ctype._type_), (ctype._length_,)))
+	else:
+		# The game sends little endian data
+		return np.dtype(ctype).newbyteorder('<')
+
+
+HEADER_DTYPE = dtype_from_ctypes(PacketHeader)
+
+# packetId -> dtype of that packet, as np.record so that fields can be accessed as attributes
+PACKET_DTYPES = {key[2]: np.dtype((np.record, dtype_from_ctypes(packet_type)))
+				 for key, packet_type in HeaderFieldsToPacketType.items()}
+
+
+def unpack_udp_packet_numpy(packet):
+	"""
+	Alternative to f1_2020_telemetry.packets.unpack_udp_packet that views the packet bytes as a numpy record instead of
+	copying them into ctypes structures. Fields can be accessed the same way, e.g. packet.carTelemetryData[i].speed, but
+	whole grid columns can also be sliced at once, e.g. packet['carTelemetryData']['speed']. Attribute access on numpy
+	records is slower than on ctypes structures, indexing by field name is the fast path.
+	Values are numpy scalars and arrays with the same values as the ctypes ones. The exception are char arrays, ctypes cuts
+	them off at the first null byte while numpy only strips trailing null bytes.
+	:param packet: the contents of the UDP packet to be unpacked.
+	:return: numpy.record of the packet, a read-only view of packet
+	"""
+	if len(packet) < HEADER_DTYPE.itemsize:
+		raise UnpackError(f'Bad telemetry packet: too short ({len(packet)} bytes).')
+
+	# packetFormat is the uint16 at offset 0, packetVersion and packetId are the uint8s at offsets 4 and 5
+	key = (packet[0] | packet[1] << 8, packet[4], packet[5])
+	if key not in HeaderFieldsToPacketType:
+		raise UnpackError(f'Bad telemetry packet: no match for key fields {key!r}.')
+
+	packet_dtype = PACKET_DTYPES[key[2]]
+	if len(packet) != packet_dtype.itemsize:
+		raise UnpackError(f'Bad telemetry packet: bad size for {HeaderFieldsToPacketType[key].__name__} packet; '
+						  f'expected {packet_dtype.itemsize} bytes but received {len(packet)} bytes.')
+
+	return np.frombuffer(packet, dtype=packet_dtype)[0]
+
+
+# Decoders that can be chosen in the [decoder] section of cfg/recorder.ini
+DECODERS = {
+	'ctypes': unpack_udp_packet,
+	'numpy': unpack_udp_packet_numpy
+}
+
+
+def get_decoder(name):
+	"""
+	:param name: 'ctypes' or 'numpy'
+	:return: Function that unpacks a UDP packet
+	"""
+	if name not in DECODERS:
+		raise ValueError(f'Unknown decoder {name}, must be one of {list(DECODERS)}.')
+	return DECODERS[name]
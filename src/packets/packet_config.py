@@ -1,4 +1,9 @@
 import configparser
+import operator
+
+import numpy as np
+
+from src.packets.numpy_packets import dtype_from_ctypes
 
 
 class PacketConfig:
@@ -12,6 +17,8 @@ class PacketConfig:
 		:param file_path:
 		"""
 		self._packet_config = {}
+		# (name, structure type) -> ExtractionPlan
+		self._extraction_plans = {}
 
 		# Loads config of what fields to save
 		cfg_parser = configparser.ConfigParser()
@@ -38,3 +45,126 @@ class PacketConfig:
 			return self._packet_config[name]['list']
 		else:
 			return self._packet_config[name]['string']
+
+	def get_extraction_plan(self, name, structure_type):
+		"""
+		Returns the ExtractionPlan of the fields of data structure 'name' for structures of type structure_type.
+		The plan is compiled on first use and reused for every structure of that type after that.
+		:param name: Name of data structure, one of the keys in packet_keys.ini
+		:param structure_type: ctypes structure type of the data structure, e.g. CarTelemetryData_V1, or its numpy dtype
+		:return: ExtractionPlan object
+		"""
+		plan = self._extraction_plans.get((name, structure_type))
+		if plan is None:
+			plan = ExtractionPlan(structure_type, self.get_fields(name))
+			self._extraction_plans[(name, structure_type)] = plan
+
+		return plan
+
+
+def _format_array(value):
+	# Arrays are saved as follows:
+	# Let array to be saved be [0.1, 2., 3., 0.6]
+	# Then the string corresponding to the value of the field that is being saved will be
+	# 0.1 2.0 3.0 0.6
+	# This can be read and decoded back to arrays using pandas DataFrames and numpy as follows
+	# data = pandas.read_csv('data.csv')
+	# data['a1'] = data['a1'].apply(np.fromstring, dtype=float, sep=' ')
+	# where 'a1' is the field that has arrays as data values
+	# Files recorded before extraction plans have the values as formatted by numpy, padded to the same width and without
+	# trailing zeros, e.g. '0.1 2.  3.  0.6'. Both are parsed the same way, see schema._split_arrays
+	return ' '.join(map(str, value))
+
+
+def _format_bytes(value):
+	# ctypes cuts char arrays off at the first null byte, numpy only strips trailing null bytes
+	value = value.split(b'\x00', 1)[0]
+	try:  # Attempts to decode a byte string
+		return value.decode('utf-8')
+	except UnicodeDecodeError:  # If it can't be decoded, save its representation
+		return str(value)
+
+
+class ExtractionPlan:
+	"""
+	ExtractionPlan turns the configured fields of a ctypes structure into a comma separated string.
+	The type of each field is looked up once, when the plan is created, to choose a formatter for it: scalars are
+	formatted with str, fixed size arrays as their values separated by spaces and byte strings are decoded.
+	Plans work on ctypes structures as well as on numpy records from unpack_udp_packet_numpy.
+	"""
+
+	def __init__(self, structure_type, fields):
+		"""
+		:param structure_type: ctypes structure type, or the numpy dtype of the structure
+		:param fields: Fields of the structure to extract
+		"""
+		# numpy view of structure_type for formatting many structures at once
+		self._dtype = structure_type if isinstance(structure_type, np.dtype) else dtype_from_ctypes(structure_type)
+
+		self.fields = list(fields)
+		formatters = []
+		for f in self.fields:
+			if f not in self._dtype.names:
+				raise ValueError(f'{f} is not a field of {structure_type}, check packet_keys.ini.')
+
+			field_dtype = self._dtype.fields[f][0]
+			if field_dtype.kind == 'S':
+				# Char arrays are byte strings
+				formatters.append(_format_bytes)
+			elif field_dtype.subdtype is not None:
+				formatters.append(_format_array)
+			else:
+				formatters.append(str)
+
+		self._formatters = formatters
+		self._all_scalars = all(f is str for f in formatters)
+
+		# attrgetter with multiple fields gets all values in one call and returns them as a tuple
+		getter = operator.attrgetter(*self.fields)
+		self._getter = getter if len(self.fields) > 1 else lambda structure: (getter(structure),)
+
+	def values(self, structure):
+		"""
+		:param structure: ctypes structure of the type this plan was made for
+		:return: Tuple of the raw values of the fields
+		"""
+		return self._getter(structure)
+
+	def format(self, structure, newline=True):
+		"""
+		:param structure: ctypes structure of the type this plan was made for, or a numpy record of it
+		:param newline: Whether to end the string with a newline
+		:return: A single string with the values of the fields separated by commas
+		"""
+		if isinstance(structure, np.void):
+			# numpy scalars are formatted differently than Python values, so let numpy convert them first
+			return self.format_rows(np.asarray(structure)[None], [0], newline)[0]
+
+		values = self._getter(structure)
+		if self._all_scalars:
+			save_string = ','.join(map(str, values))
+		else:
+			save_string = ','.join([formatter(value) for formatter, value in zip(self._formatters, values)])
+
+		if newline:
+			return save_string + '\n'
+		else:
+			return save_string
+
+	def format_rows(self, structures, indices, newline=True):
+		"""
+		Formats several structures of a ctypes array at once, e.g. the cars of packet.carTelemetryData.
+		The array is viewed with numpy and the values of all rows are retrieved in one call, instead of field by field.
+		:param structures: ctypes array of structures of the type this plan was made for, or a numpy array of them
+		:param indices: Indices of the structures in the array to format
+		:param newline: Whether to end the strings with a newline
+		:return: List of strings, one per index, with the values of the fields separated by commas
+		"""
+		if not isinstance(structures, np.ndarray):
+			structures = np.frombuffer(structures, dtype=self._dtype)
+		rows = structures[indices][self.fields].tolist()
+
+		end = '\n' if newline else ''
+		if self._all_scalars:
+			return [','.join(map(str, row)) + end for row in rows]
+		return [','.join([formatter(value) for formatter, value in zip(self._formatters, row)]) + end for row in rows]
@@ -0,0 +1,119 @@
+import logging
+import os
+import time
+
+from src.config import RecorderConfig
+from src.packets.packet_saver import PacketSaver
+
+
+class PacketRecorder:
+	"""
+	PacketRecorder passes packets to the PacketSaver of their session. A session is identified by the source of its
+	packets, e.g. the address of the game that sent them, and its sessionUID, so that packets of several games, or of a
+	finished and a new session, that arrive interleaved are each saved with their own PacketSaver instead of replacing
+	the PacketSaver on every switch. A PacketSaver is closed once its session has not received packets for idle_timeout
+	seconds, configured in the [sessions] section of cfg/recorder.ini.
+	"""
+
+	# Seconds between checks for idle sessions
+	IDLE_CHECK_INTERVAL = 1.
+
+	def __init__(self, data_root):
+		"""
+		:param data_root: Points to the base folder which contains the folders data, cfg and logs.
+		"""
+		self.data_root = data_root
+		recorder_config = RecorderConfig(data_root)
+		self.log_level = recorder_config.get('logging', 'level', fallback='INFO').upper()
+		self.idle_timeout = recorder_config.get_float('sessions', 'idle_timeout', fallback=300.)
+
+		# (source, sessionUID) -> PacketSaver, and the timestamp of the last packet of that session
+		self.packet_savers = {}
+		self._last_packet = {}
+		self._last_idle_check = None
+		# (source, sessionUID) -> logging.FileHandler of the log file of that session
+		self._log_handlers = {}
+
+	def save(self, packet, source=None, timestamp=None):
+		"""
+		Saves the packet with the PacketSaver of the packet's session.
+		:param packet:
+		:param source: Source of the packet, e.g. the address of the game that sent it, None if there is only one
+		:param timestamp: Time the packet was received in seconds since epoch, defaults to now
+		:return:
+		"""
+		key = (source, packet.header.sessionUID)
+		packet_saver = self.packet_savers.get(key)
+		if packet_saver is None:
+			packet_saver = self._start_session(key)
+
+		packet_saver.save(packet)
+
+		timestamp = time.time() if timestamp is None else timestamp
+		self._last_packet[key] = timestamp
+		if self._last_idle_check is None or timestamp - self._last_idle_check >= self.IDLE_CHECK_INTERVAL:
+			self.close_idle(timestamp)
+
+	def _start_session(self, key):
+		source, session_uid = key
+		print(f'Creating new session stuff with sessionUID {session_uid}' + (f' from {source}' if source is not None else ''))
+
+		self._add_log_handler(key)
+		if self.packet_savers:
+			logging.info(f'Recording session {session_uid} next to {len(self.packet_savers)} other sessions.')
+
+		packet_saver = PacketSaver(session_uid, self.data_root, source=source)
+		self.packet_savers[key] = packet_saver
+		return packet_saver
+
+	def _add_log_handler(self, key):
+		"""
+		Points logging to save_path/logs/[sessionUID].log while the session is recorded. The handler is added to the root
+		logger explicitly, logging.basicConfig would do nothing if anything had logged before, e.g. UdpListener. While
+		several sessions are recorded, messages are written to the log of each of them.
+		:param key: (source, sessionUID) of the session
+		:return:
+		"""
+		handler = logging.FileHandler(os.path.join(self.data_root, 'logs', f'{key[1]}.log'))
+		handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-8s %(module)-8s %(message)s',
+											   datefmt='%Y-%m-%d %H:%M:%S'))
+		root = logging.getLogger()
+		root.addHandler(handler)
+		root.setLevel(self.log_level)
+		self._log_handlers[key] = handler
+
+	def close_idle(self, timestamp=None):
+		"""
+		Closes the PacketSavers of the sessions that have not received packets for idle_timeout seconds.
+		:param timestamp: Current time in seconds since epoch, in the same clock as the timestamps passed to save(),
+		defaults to now
+		:return:
+		"""
+		timestamp = time.time() if timestamp is None else timestamp
+		self._last_idle_check = timestamp
+
+		for key, last_packet in list(self._last_packet.items()):
+			if timestamp - last_packet >= self.idle_timeout:
+				logging.info(f'Session {key[1]} has not received packets for {self.idle_timeout} s, closing it.')
+				self._close_session(key)
+
+	def _close_session(self, key):
+		self.packet_savers.pop(key).close()
+		self._last_packet.pop(key, None)
+
+		handler = self._log_handlers.pop(key, None)
+		if handler is not None:
+			logging.getLogger().removeHandler(handler)
+			handler.close()
+
+	def flush(self):
+		for packet_saver in self.packet_savers.values():
+			packet_saver.flush()
+
+	def close(self):
+		"""
+		Writes everything that is still buffered to disk and closes all PacketSavers.
+		:return:
+		"""
+		for key in list(self.packet_savers):
+			self._close_session(key)
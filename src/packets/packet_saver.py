@@ -1,15 +1,32 @@
-import datetime
 import logging
 import os
+import time
 
 import numpy as np
 
+from src.config import RecorderConfig
+from src.packets.file_writer import WriterPool
+from src.packets.frame_assembler import FrameAssembler
+from src.packets.lap_summary import LAP_SUMMARY_COLUMNS, LapSummaries
+from src.packets.metrics import FrameGapTracker
+from src.packets.numpy_packets import dtype_from_ctypes
 from src.packets.packet_config import PacketConfig
+from src.storage import MISSING_FRAMES_COLUMNS, MISSING_FRAMES_FILE, ColumnarWriter, LapCompressor, SessionCatalog, \
+	SessionEntry, columnar_path, reopen_lap_file
+
+
+# Key in packet_keys.ini of the structures saved in each lap stream
+LAP_STREAM_CONFIG_KEYS = {
+	'telemetry': 'car_telemetry_data',
+	'motion': 'car_motion_data',
+	'status': 'car_status_data',
+	'data': 'lap_data'
+}
 
 
 class PacketSaver:
 
-	def __init__(self, session_uid, data_root):
+	def __init__(self, session_uid, data_root, source=None):
 		"""
 		PacketSaver handles the saving of packets. The following folder structure is created by PacketSaver:
 
@@ -29,7 +46,12 @@ class PacketSaver:
 						driver.data
 							(name, setup)
 						laps.csv
-							(lap_number, s1_time, s2_time, s3_time, tyre, invalid, pitting)  TODO: pit status?
+							One row per completed lap, see LAP_SUMMARY_COLUMNS
+							(lapNumber, lapTime, sector1Time, sector2Time, sector3Time, valid, pitStatus, topSpeed,
+							minSpeedSector1-3, fuelUsed, tyreWearRL/RR/FL/FR, visualTyreCompound, tyresAgeLaps)
+						missing_frames.csv
+							Packets the game sent but that were never received, one row per gap, see MISSING_FRAMES_COLUMNS
+							(lapNumber, stream, missingFrames)
 						lap1_telemetry.csv
 							From CarTelemetry
 							(session_time, frame_identifier, speed, throttle, steer, brake, clutch, gear, engine_rpm, drs,
@@ -56,6 +78,7 @@ class PacketSaver:
 						lapN.csv
 		:param session_uid:
 		:param data_root: Path where session data will be saved. Preferably an absolute path.
+		:param source: Source of the packets, e.g. the address of the game that sent them, saved in the catalog
 		"""
 
 		# Dictionary to match packet ids to saving methods
@@ -101,6 +124,13 @@ class PacketSaver:
 
 		# Save the lap number of current lap
 		self._lap_number = 0
+		# Lap numbers of all cars, only used in full grid mode
+		self._car_lap_numbers = [0] * 22
+		# Folder per car index, named after the driverId, None until the participants are known
+		self._driver_folders = [None] * 22
+		self._num_active_cars = 0
+		# Last received currentLapInvalid of all cars, the validity of a lap is known when the next lap starts
+		self._lap_invalid = [0] * 22
 		# Save array of drivers
 		self._drivers = []
 		self._player_driver_index = -1  # Indicates what index of self._drivers is the player
@@ -114,99 +144,357 @@ class PacketSaver:
 		# Loads config of what fields to save
 		self._packet_config = PacketConfig(os.path.join(data_root, 'cfg', 'packet_keys.ini'))
 
+		# Keeps one buffered file handle open per file that is written to
+		recorder_config = RecorderConfig(data_root)
+		self._writers = WriterPool(buffer_size=recorder_config.get_int('writer', 'buffer_size', fallback=65536),
+								   flush_interval=recorder_config.get_float('writer', 'flush_interval', fallback=1.))
+
+		# Logging every packet is expensive, it is off unless enabled in cfg/recorder.ini, see RecorderMetrics instead
+		self._log_packets = recorder_config.get_bool('logging', 'log_packets', fallback=False)
+
+		# Lap files are saved either as text, 'csv', or as typed binary columns, 'columnar'
+		self._storage_format = recorder_config.get('storage', 'format', fallback='csv')
+		# Whether to save the lap files of all cars, or only those of the player
+		self._full_grid = recorder_config.get_bool('storage', 'full_grid', fallback=False)
+
+		# Optionally the lap streams are also saved aligned per frame, in lap[N]_frames.csv
+		self._frame_assembler = None
+		if recorder_config.get_bool('storage', 'frames', fallback=False):
+			self._frame_assembler = FrameAssembler(
+				self._write_frame,
+				{stream: len(self._packet_config.get_fields(key)) for stream, key in LAP_STREAM_CONFIG_KEYS.items()},
+				partial_frames=recorder_config.get('storage', 'partial_frames', fallback='forward_fill'))
+			self._frames_first_line = ','.join(['sessionTime,frameIdentifier'] +
+											   [self._packet_config.get_fields(LAP_STREAM_CONFIG_KEYS[stream], list_format=False)
+												for stream in FrameAssembler.STREAMS] +
+											   ['missingStreams']) + '\n'
+
+		# Optionally the files of finished laps are compressed in the background
+		self._compressor = None
+		if recorder_config.get_bool('compression', 'enabled', fallback=False):
+			level = recorder_config.get('compression', 'level', fallback='')
+			self._compressor = LapCompressor(recorder_config.get('compression', 'codec', fallback='gzip'),
+											 int(level) if level else None)
+
+		# Running aggregates of the current lap of every car, saved as a row of laps.csv when the lap is completed
+		self._lap_summaries = LapSummaries()
+
+		# Packets the game sent but that were never received are counted per lap file in the catalog
+		self._frame_gaps = FrameGapTracker()
+
+		# Catalog entry of this session, continues an existing entry if this session was recorded before
+		self._catalog = SessionCatalog(os.path.join(data_root, 'data'))
+		self._catalog_entry = SessionEntry(self._catalog.session(session_uid))
+		if source is not None:
+			self._catalog_entry.set_source(str(source))
+		# Saving the catalog rewrites it with all sessions, finished laps are saved at most once per save_interval
+		self._catalog_save_interval = recorder_config.get_float('catalog', 'save_interval', fallback=30.)
+		self._catalog_changed = False
+		self._last_catalog_save = time.monotonic()
+
 	def save(self, packet):
 		"""
 		Saves the data from the packet.
 		:param packet:
 		:return:
 		"""
+		# Until the first session packet arrives it is unknown in which session type folder to save packets
+		if self._session_type == -1 and packet.header.packetId != 1:
+			return
+
 		self._player_driver_index = packet.header.playerCarIndex
 		self._PACKET_ID_MATCH[packet.header.packetId](packet)
-		logging.info(f'Received packet with packetId {packet.header.packetId} at sessionTime {packet.header.sessionTime}'
-					 f' and frameIdentifier {packet.header.frameIdentifier}.')
+		if self._log_packets:
+			logging.debug(f'Received packet with packetId {packet.header.packetId} at sessionTime {packet.header.sessionTime}'
+						  f' and frameIdentifier {packet.header.frameIdentifier}.')
+
+		# Make sure data does not stay buffered for too long when a file is not written to anymore
+		self._writers.flush_if_due()
+		self._save_catalog_if_due()
+
+	def flush(self):
+		"""
+		Writes all buffered data to disk.
+		:return:
+		"""
+		self._writers.flush()
+		self._save_catalog_if_due()
+
+	def close(self):
+		"""
+		Writes all buffered data to disk and closes all open files. Must be called when the session ends.
+		:return:
+		"""
+		logging.info(f'Closing PacketSaver of session {self._session_uid}.')
+		if self._frame_assembler is not None:
+			self._frame_assembler.flush()
+		self._close_writers()
+		self._save_catalog()
+
+		if self._compressor is not None:
+			self._compressor.close()
+
+	def _close_writers(self):
+		"""
+		Closes all open files. The lap files among them are not compressed, the laps may not have finished and may be
+		continued when the session resumes, see _reopen_lap_file().
+		:return:
+		"""
+		self._writers.close()
+
+	def _close_lap(self, group, frames_finished=True):
+		"""
+		Closes the files of a lap that finished because the car started its next lap, and queues them for compression if
+		it is enabled.
+		:param group: (folder, lap number) of the lap
+		:param frames_finished: False if the FrameAssembler may still write the last frame of the lap, its frames file is
+		then compressed once that frame has been written
+		:return:
+		"""
+		paths = self._writers.close_group(group)
+		if self._compressor is not None:
+			if not frames_finished:
+				paths = [path for path in paths if not path.endswith('_frames.csv')]
+			self._compressor.submit(paths)
+
+	def _reopen_lap_file(self, path):
+		"""
+		Called before a lap file that is not open is opened, to append to it. The lap file may have been compressed when
+		its lap finished, e.g. before a flashback to the previous lap, it is then decompressed so that the lap stays in one
+		file.
+		:param path: Path of a csv lap file or columnar lap folder
+		:return:
+		"""
+		if self._compressor is not None:
+			self._compressor.cancel(path)
+		reopen_lap_file(path)
 
 	def _register_session(self):
 		if self._session_registered:
 			return
 
-		# Update sessions.csv with current datetime and sessionUID, create sessions.csv if not exists
-		sessions_file_path = os.path.join(self._data_root, 'data', 'sessions.csv')
-		if not os.path.exists(sessions_file_path):
-			with open(sessions_file_path, 'w') as sessions_file:
-				logging.info(f'Creating sessions.csv at {sessions_file_path}')
-				logging.info(f'Adding sessionUID {self._session_uid} and current datetime to sessions.csv')
-				sessions_file.write('datetime,sessionUID\n')
-		else:
-			with open(sessions_file_path, 'a') as sessions_file:
-				logging.info(f'Adding sessionUID {self._session_uid} and current datetime to sessions.csv')
-				sessions_file.write(f'{datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")},{self._session_uid}\n')
-
 		# Create the sessionUID folder
 		try:
-			os.mkdir(self._save_path)
+			os.makedirs(self._save_path)
 		except FileExistsError:
 			logging.warning(f'{self._save_path} already exists.')
 
+		# Add the session to the catalog, with the current datetime
+		logging.info(f'Adding sessionUID {self._session_uid} to the catalog')
 		self._session_registered = True
+		self._save_catalog()
+
+	def _save_catalog(self):
+		"""
+		Saves the catalog entry of this session to data/catalog.json.
+		:return:
+		"""
+		if self._session_registered:
+			self._catalog.update_session(self._session_uid, self._catalog_entry.entry)
+		self._catalog_changed = False
+		self._last_catalog_save = time.monotonic()
+
+	def _save_catalog_if_due(self):
+		"""
+		Saves the catalog entry if laps have been finished since it was last saved, at most once per save_interval.
+		:return:
+		"""
+		if self._catalog_changed and time.monotonic() - self._last_catalog_save >= self._catalog_save_interval:
+			self._save_catalog()
 
-	def _write_to_file(self, file, data, first_line_if_not_exists=None):
+	def _write_to_file(self, file, data, first_line_if_not_exists=None, group=None, keep_open=True):
 		"""
 		Saves the data to the file. File path must be relative path starting from sessionUID/sessionType.
 		E.g., if file = 'player/lap4_telemetry.csv', it will be stored in '[sessionUID]/[sessionType]/player/lap4_telemetry.csv'.
 		If there already exists a file at the location, the data will be appended to the existing file. If no file exists,
 		the file is created, after which the data is written to it.
+		Data is buffered, the file is kept open until the lap it belongs to has finished or the session type changes, unless
+		keep_open is False.
 		:param file: Relative path
 		:param data: String to store in file
 		:param first_line_if_not_exists: The first line of the file that will be written only if the file does not exist
 		prior to calling this method.
+		:param group: (folder, lap number) of the lap the file belongs to, the file is closed when this lap has finished.
+		None for files that belong to the whole session type.
+		:param keep_open: False for files that are written once or rarely, e.g. session.csv, they are written to disk and
+		closed right away
 		:return:
 		"""
 		self._register_session()
 
-		logging.info(f'Saving data to file {file}, data = {data[0:10]} ... {data[-10:-1]}')
+		if self._log_packets:
+			logging.debug(f'Saving data to file {file}, data = {data[0:10]} ... {data[-10:-1]}')
 		path = os.path.join(self._save_path, self.SESSION_TYPE_ID_MATCH[self._session_type], file)
 
-		if os.path.exists(path):
-			# Append if file exists
-			with open(path, 'a') as f:
-				f.write(data)
+		if not keep_open:
+			self._writers.write_and_close(path, data, first_line_if_not_exists=first_line_if_not_exists)
+			return
+		if group is not None and self._writers.get(path) is None:
+			self._reopen_lap_file(path)
+		self._writers.write(path, data, first_line_if_not_exists=first_line_if_not_exists, group=group)
+
+	def _save_lap_stream(self, packet, structures, packet_config_key, stream):
+		"""
+		Saves the configured fields of the player's structure as a row in the player's lap file of stream, e.g.
+		'telemetry' is saved to player/lap[N]_telemetry.csv, or player/lap[N]_telemetry.col when the columnar storage
+		format is used. In full grid mode, the rows of the other cars are saved to [driver_id]/lap[N]_telemetry.csv.
+		:param packet: Packet that structures is part of
+		:param structures: Array of nested data structures, one per car, e.g. packet.carTelemetryData
+		:param packet_config_key: Key of the structures in packet_keys.ini
+		:param stream: Name of the lap file
+		:return:
+		"""
+		car_indices = self._saved_car_indices()
+
+		# ctypes arrays come from unpack_udp_packet, numpy arrays from unpack_udp_packet_numpy
+		structure_type = structures.dtype if isinstance(structures, np.ndarray) else structures._type_
+
+		session_time = packet.header.sessionTime
+		frame_identifier = packet.header.frameIdentifier
+		session_type_name = self.SESSION_TYPE_ID_MATCH[self._session_type]
+
+		# Frames missed since the previous packet of this stream are holes in the current lap of every saved car, they are
+		# saved next to the lap files, from which the catalog can be rebuilt
+		missing_frames = self._frame_gaps.record(stream, frame_identifier)
+		if missing_frames:
+			for i in car_indices:
+				folder, lap_number = self._car_folder_and_lap(i)
+				self._catalog_entry.add_missing_frames(session_type_name, folder, lap_number, stream, missing_frames)
+				self._write_to_file(os.path.join(folder, MISSING_FRAMES_FILE), f'{lap_number},{stream},{missing_frames}\n',
+									first_line_if_not_exists=','.join(MISSING_FRAMES_COLUMNS) + '\n', keep_open=False)
+
+		if self._storage_format == 'columnar':
+			self._register_session()
+			structure_dtype = structure_type if isinstance(structure_type, np.dtype) else dtype_from_ctypes(structure_type)
+			for i in car_indices:
+				folder, lap_number = self._car_folder_and_lap(i)
+				path = columnar_path(os.path.join(self._save_path, session_type_name, folder, f'lap{lap_number}_{stream}'))
+
+				writer = self._writers.get(path)
+				if writer is None:
+					self._reopen_lap_file(path)
+					writer = self._writers.open(path, lambda: ColumnarWriter(path, structure_dtype,
+																			 self._packet_config.get_fields(packet_config_key),
+																			 packet_config_key,
+																			 flush_interval=self._writers.flush_interval),
+												group=(folder, lap_number))
+
+				writer.write(session_time, frame_identifier, structures[i])
+				self._catalog_entry.add_rows(session_type_name, folder, lap_number, stream)
+
+			if self._frame_assembler is not None:
+				rows = self._packet_config.get_extraction_plan(packet_config_key, structure_type).format_rows(
+					structures, car_indices, newline=False)
+				for i, row in zip(car_indices, rows):
+					self._frame_assembler.add(frame_identifier, float(session_time), stream, i, self._car_folder_and_lap(i)[1], row)
 		else:
-			# Create file if not exists
-			with open(path, 'w') as f:
-				if first_line_if_not_exists is not None:
-					f.write(first_line_if_not_exists)
-				f.write(data)
+			# First line of file has all field/column names
+			first_line = 'sessionTime,frameIdentifier,' + self._packet_config.get_fields(packet_config_key, list_format=False) + '\n'
+			# float() makes numpy's float32 sessionTime print the same as the ctypes one
+			header_string = f'{float(session_time)},{frame_identifier},'
 
-	def motion_packet(self, packet):
-		logging.info(f'Processing motion packet.')
-		# First line of file has all field/column names
-		first_line = 'sessionTime,frameIdentifier,' + self._packet_config.get_fields('car_motion_data', list_format=False) + '\n'
+			# All cars are formatted in one go
+			rows = self._packet_config.get_extraction_plan(packet_config_key, structure_type).format_rows(
+				structures, car_indices, newline=False)
+
+			for i, row in zip(car_indices, rows):
+				folder, lap_number = self._car_folder_and_lap(i)
+				self._write_to_file(os.path.join(folder, f'lap{lap_number}_{stream}.csv'), header_string + row + '\n',
+									first_line_if_not_exists=first_line, group=(folder, lap_number))
+				self._catalog_entry.add_rows(session_type_name, folder, lap_number, stream)
 
-		fields_to_save = self._packet_config.get_fields('car_motion_data')
-		save_string = f'{packet.header.sessionTime},{packet.header.frameIdentifier},'
+				if self._frame_assembler is not None:
+					self._frame_assembler.add(frame_identifier, float(session_time), stream, i, lap_number, row)
 
-		save_string += self._retrieve_attr(packet.carMotionData[self._player_driver_index], fields_to_save)
+	def _write_frame(self, car_index, lap_number, row):
+		"""
+		Saves a frame assembled by the FrameAssembler to lap[N]_frames.csv of the car.
+		:param car_index: Index of the car in the packet arrays
+		:param lap_number: Lap number of the car at the start of the frame
+		:param row: Row of the frame, ending with a newline
+		:return:
+		"""
+		folder, current_lap_number = self._car_folder_and_lap(car_index)
+		self._write_to_file(os.path.join(folder, f'lap{lap_number}_frames.csv'), row,
+							first_line_if_not_exists=self._frames_first_line, group=(folder, lap_number))
+		self._catalog_entry.add_rows(self.SESSION_TYPE_ID_MATCH[self._session_type], folder, lap_number, 'frames')
 
-		self._write_to_file(os.path.join('player', f'lap{self._lap_number}_motion.csv'), save_string,
-							first_line_if_not_exists=first_line)
+		# The last frame of a lap is finished after the car has started its next lap, whose files are already closed
+		if lap_number != current_lap_number:
+			self._close_lap((folder, lap_number))
+
+	def _saved_car_indices(self):
+		"""
+		:return: Indices of the cars whose lap files are saved, the player's first
+		"""
+		car_indices = [self._player_driver_index]
+		if self._full_grid:
+			# Cars are saved once their driver is known from the participants packet
+			car_indices += [i for i in range(self._num_active_cars)
+							if i != self._player_driver_index and self._driver_folders[i] is not None]
+		return car_indices
+
+	@staticmethod
+	def _values(structures, field, car_indices):
+		"""
+		:param structures: ctypes array of structures, or a numpy array of them
+		:param field: Name of the field
+		:param car_indices: Indices of the structures
+		:return: Values of field of the structures at car_indices
+		"""
+		if isinstance(structures, np.ndarray):
+			return structures[field][car_indices]
+		return [getattr(structures[i], field) for i in car_indices]
+
+	@staticmethod
+	def _column(structures, field):
+		"""
+		:param structures: ctypes array of structures, or a numpy array of them
+		:param field: Name of the field
+		:return: List of the values of field for all structures
+		"""
+		if isinstance(structures, np.ndarray):
+			return structures[field].tolist()
+		return [getattr(structure, field) for structure in structures]
+
+	def _car_folder_and_lap(self, car_index):
+		"""
+		:param car_index: Index of the car in the packet arrays
+		:return: Folder in which the lap files of the car are saved and the current lap number of the car
+		"""
+		if car_index == self._player_driver_index:
+			return 'player', self._lap_number
+		return self._driver_folders[car_index], self._car_lap_numbers[car_index]
+
+	def motion_packet(self, packet):
+		self._save_lap_stream(packet, packet.carMotionData, 'car_motion_data', 'motion')
 
 	def session_packet(self, packet):
-		logging.info(f'Processing session packet.')
 		# If sessionType has changed, create a new folder and update current session_type,
 		if packet.sessionType != self._session_type:
 			logging.info(f'Session type changed from {self._session_type} to {packet.sessionType}.')
+			# All files of the previous session type are finished
+			if self._frame_assembler is not None:
+				self._frame_assembler.flush()
+			self._close_writers()
 			new_path = os.path.join(self._save_path, self.SESSION_TYPE_ID_MATCH[packet.sessionType], 'player')
 			# Creates [save_path]/[sessionType]/player, since player will always exist
 			os.makedirs(new_path, exist_ok=True)
 			self._session_type = packet.sessionType
+			self._frame_gaps = FrameGapTracker()
+			self._lap_summaries = LapSummaries()
+
+			self._catalog_entry.set_session_type(self.SESSION_TYPE_ID_MATCH[packet.sessionType], int(packet.sessionType),
+												 int(packet.trackId))
+			self._save_catalog()
 
 			# New session type needs its participants and info saved again
 			self._session_info_saved = False
 			self._participants_data_saved = False
 
 		# Save session evolution data
-		fields_to_save = self._packet_config.get_fields('session_evolution_packet')
-		save_string = f'{packet.header.sessionTime},{packet.header.frameIdentifier},{self._retrieve_attr(packet, fields_to_save)}'
+		save_string = f'{float(packet.header.sessionTime)},{packet.header.frameIdentifier},' \
+					  f'{self._retrieve_attr(packet, "session_evolution_packet")}'
 
 		self._write_to_file('session_evolution.csv', save_string,
 							first_line_if_not_exists=f'sessionTime,frameIdentifier,'
@@ -215,37 +503,77 @@ class PacketSaver:
 		# Save one time session info
 		if not self._session_info_saved:
 			# Create string with all data that needs to be saved based on self._packet_config
-			fields_to_save = self._packet_config.get_fields('session_packet')
 			# First line is field names preceded by a #
 			save_string = f'{self._packet_config.get_fields("session_packet", list_format=False)}\n'
-			save_string += self._retrieve_attr(packet, fields_to_save)
+			save_string += self._retrieve_attr(packet, 'session_packet')
 
-			self._write_to_file('session.csv', save_string[:-1])
+			self._write_to_file('session.csv', save_string[:-1], keep_open=False)
 
 			# Session info has been saved
 			self._session_info_saved = True
 
 	def lap_data_packet(self, packet):
-		logging.info(f'Processing lap data packet.')
-		# First line of file has all field/column names
-		first_line = 'sessionTime,frameIdentifier,' + self._packet_config.get_fields('lap_data', list_format=False) + '\n'
+		self._save_lap_stream(packet, packet.lapData, 'lap_data', 'data')
+
+		session_type_name = self.SESSION_TYPE_ID_MATCH[self._session_type]
+
+		if self._full_grid:
+			lap_numbers = self._column(packet.lapData, 'currentLapNum')
+			last_lap_times = self._column(packet.lapData, 'lastLapTime')
+			lap_invalid = self._column(packet.lapData, 'currentLapInvalid')
+			for i in range(self._num_active_cars):
+				if i == self._player_driver_index:
+					continue
+				if lap_numbers[i] != self._car_lap_numbers[i]:
+					if self._driver_folders[i] is not None:
+						self._close_lap((self._driver_folders[i], self._car_lap_numbers[i]), frames_finished=False)
+						if self._car_lap_numbers[i] > 0:
+							self._catalog_entry.finish_lap(session_type_name, self._driver_folders[i],
+														   self._car_lap_numbers[i], float(last_lap_times[i]),
+														   not self._lap_invalid[i])
+							self._save_lap_summary(i, self._driver_folders[i], self._car_lap_numbers[i],
+												   float(last_lap_times[i]))
+							self._catalog_changed = True
+					self._lap_summaries.reset(i)
+					self._car_lap_numbers[i] = lap_numbers[i]
+				self._lap_invalid[i] = lap_invalid[i]
+
+		lap_data = packet.lapData[self._player_driver_index]
+		if lap_data.currentLapNum != self._lap_number:
+			# The files of the previous lap are finished
+			self._close_lap(('player', self._lap_number), frames_finished=False)
+
+			if self._lap_number > 0:
+				self._catalog_entry.finish_lap(session_type_name, 'player', self._lap_number, float(lap_data.lastLapTime),
+											   not self._lap_invalid[self._player_driver_index])
+				self._save_lap_summary(self._player_driver_index, 'player', self._lap_number, float(lap_data.lastLapTime))
+				self._catalog_changed = True
+			self._lap_summaries.reset(self._player_driver_index)
 
-		fields_to_save = self._packet_config.get_fields('lap_data')
-		save_string = f'{packet.header.sessionTime},{packet.header.frameIdentifier},'
-
-		save_string += self._retrieve_attr(packet.lapData[self._player_driver_index], fields_to_save)
+			# Update current lap number
+			self._lap_number = lap_data.currentLapNum
 
-		self._write_to_file(os.path.join('player', f'lap{self._lap_number}_data.csv'), save_string,
-							first_line_if_not_exists=first_line)
+		self._lap_invalid[self._player_driver_index] = lap_data.currentLapInvalid
 
-		if packet.lapData[self._player_driver_index].currentLapNum != self._lap_number:
-			# Update current lap number
-			self._lap_number = packet.lapData[self._player_driver_index].currentLapNum
+		# This lap data belongs to the current laps, the completed laps have been summarized above
+		car_indices = self._saved_car_indices()
+		self._lap_summaries.add_lap_data(car_indices, *(self._values(packet.lapData, field, car_indices) for field in
+														('sector1TimeInMS', 'sector2TimeInMS', 'sector', 'pitStatus')))
 
-			# TODO: save last lap data to laps.csv
+	def _save_lap_summary(self, car_index, folder, lap_number, lap_time):
+		"""
+		Saves the summary of a completed lap as a row of laps.csv in the folder of the car.
+		:param car_index: Index of the car in the packet arrays
+		:param folder: Folder of the car
+		:param lap_number: Number of the completed lap
+		:param lap_time: Lap time in seconds
+		:return:
+		"""
+		row = self._lap_summaries.finish(car_index, lap_number, lap_time, not self._lap_invalid[car_index])
+		self._write_to_file(os.path.join(folder, 'laps.csv'), row,
+							first_line_if_not_exists=','.join(LAP_SUMMARY_COLUMNS) + '\n', keep_open=False)
 
 	def event_packet(self, packet):
-		logging.info(f'Processing event packet.')
 		# TODO: save event to events.csv, how to handle different types of events in packet_keys.ini?
 		pass
 
@@ -255,102 +583,67 @@ class PacketSaver:
 		:param packet:
 		:return:
 		"""
-		logging.info(f'Processing participants packet.')
 		if packet.numActiveCars != len(self._drivers):
 			# TODO: participants is always filled with 22 drivers, need to check valid entries
 			#  len(self._drivers) is always 1 as packet.participants is an object (I think)
 			logging.warning(f'Number of active drivers changed from {len(self._drivers)} to {packet.numActiveCars}.')
 			self._drivers = packet.participants
 
+		# Only the first numActiveCars entries of the arrays in packets are valid
+		self._num_active_cars = packet.numActiveCars
+		# Human players in online sessions all have driverId 255, their folder is named after their car index instead
+		self._driver_folders = [(str(p.driverId) if p.driverId != 255 else f'car{i}') if i < packet.numActiveCars else None
+								for i, p in enumerate(packet.participants)]
+
 		if not self._participants_data_saved:
-			fields_to_save = self._packet_config.get_fields('participant_data')
 			save_string = f'{self._packet_config.get_fields("participant_data", list_format=False)}\n'
 
 			for pd in packet.participants:
-				save_string += self._retrieve_attr(pd, fields_to_save)
+				save_string += self._retrieve_attr(pd, 'participant_data')
 
-			self._write_to_file('participants.csv', save_string)
+			self._write_to_file('participants.csv', save_string, keep_open=False)
 
 			self._participants_data_saved = True
 
 	def car_setups_packet(self, packet):
-		logging.info(f'Processing car setups packet.')
 		# TODO: maybe save just player setup?
 		pass
 
 	def car_telemetry_packet(self, packet):
-		logging.info(f'Processing car telemetry packet.')
-		# First line of file has all field/column names
-		first_line = 'sessionTime,frameIdentifier,' + self._packet_config.get_fields('car_telemetry_data', list_format=False) + '\n'
-
-		fields_to_save = self._packet_config.get_fields('car_telemetry_data')
-		save_string = f'{packet.header.sessionTime},{packet.header.frameIdentifier},'
-
-		save_string += self._retrieve_attr(packet.carTelemetryData[self._player_driver_index], fields_to_save)
+		self._save_lap_stream(packet, packet.carTelemetryData, 'car_telemetry_data', 'telemetry')
 
-		self._write_to_file(os.path.join('player', f'lap{self._lap_number}_telemetry.csv'), save_string,
-							first_line_if_not_exists=first_line)
+		car_indices = self._saved_car_indices()
+		self._lap_summaries.add_telemetry(car_indices, self._values(packet.carTelemetryData, 'speed', car_indices))
 
 	def car_status_packet(self, packet):
-		logging.info(f'Processing car status packet.')
-		# First line of file has all field/column names
-		first_line = 'sessionTime,frameIdentifier,' + self._packet_config.get_fields('car_status_data', list_format=False) + '\n'
+		self._save_lap_stream(packet, packet.carStatusData, 'car_status_data', 'status')
 
-		fields_to_save = self._packet_config.get_fields('car_status_data')
-		save_string = f'{packet.header.sessionTime},{packet.header.frameIdentifier},'
-
-		save_string += self._retrieve_attr(packet.carStatusData[self._player_driver_index], fields_to_save)
-
-		self._write_to_file(os.path.join('player', f'lap{self._lap_number}_status.csv'), save_string,
-							first_line_if_not_exists=first_line)
+		car_indices = self._saved_car_indices()
+		self._lap_summaries.add_status(car_indices, *(self._values(packet.carStatusData, field, car_indices) for field in
+													  ('fuelInTank', 'tyresWear', 'visualTyreCompound', 'tyresAgeLaps')))
 
 	def final_classification_packet(self, packet):
-		logging.info(f'Processing final classification packet.')
-		fields_to_save = self._packet_config.get_fields('final_classification_data')
 		save_string = ''
 		for i, d in enumerate(packet.classificationData):
 			save_string += f'{self._drivers[i].driverId},{self._drivers[i].name},{self._drivers[i].raceNumber},'
 
-			save_string += self._retrieve_attr(d, fields_to_save)
+			save_string += self._retrieve_attr(d, 'final_classification_data')
 
 		field_names = 'driverId,name,raceNumber,' + self._packet_config.get_fields('final_classification_data', False)
 		save_string = field_names + '\n' + save_string
 
-		self._write_to_file('final_classification.csv', save_string)
+		self._write_to_file('final_classification.csv', save_string, keep_open=False)
 
 	def lobby_info_packet(self, packet):
-		logging.info(f'Processing lobby info packet.')
 		pass
 
-	def _retrieve_attr(self, structure, fields, newline=True):
+	def _retrieve_attr(self, structure, packet_config_key, newline=True):
 		"""
-		Retrieves all fields in fields from the data structure. Returns their values in a comma separated string.
+		Retrieves all fields of data structure packet_config_key from the structure. Returns their values in a comma
+		separated string.
 		:param structure: Structure containing key value pairs
-		:param fields: Keys for which the value to retrieve
+		:param packet_config_key: Name of the data structure in packet_keys.ini, determines the keys to retrieve
 		:return: A single string with the values of the keys separated by commas
 		"""
-		save_string = ''
-		for f in fields:
-			# If it's an array, decode it into an array
-			if 'Array' in type(getattr(structure, f)).__name__:
-				# Arrays are saved as follows:
-				# Let array to be saved be [0.1, 2., 3., 0.6]
-				# Then the string corresponding to the value of the field that is being saved will be
-				# 0.1 2. 3. 0.6
-				# This can be read and decoded back to arrays using pandas DataFrames and numpy as follows
-				# data = pandas.read_csv('data.csv')
-				# data['a1'] = data['a1'].apply(np.fromstring, dtype=float, sep=' ')
-				# where 'a1' is the field that has arrays as data values
-				save_string += str(np.ctypeslib.as_array(getattr(structure, f)))[1:-1] + ','
-				# [1:-1] is to remove the brackets []
-			else:  # Otherwise, it's either a byte string or some other type, like int, float, ...
-				try:  # Attempts to decode a byte string
-					save_string += str(getattr(structure, f).decode('utf-8')) + ','
-				except (UnicodeDecodeError, AttributeError):  # If it's not a string, just get the value
-					save_string += str(getattr(structure, f)) + ','
-
-		# Return save_string save the last comma
-		if newline:
-			return save_string[:-1] + '\n'
-		else:
-			return save_string[:-1]
+		structure_type = structure.dtype if isinstance(structure, np.void) else type(structure)
+		return self._packet_config.get_extraction_plan(packet_config_key, structure_type).format(structure, newline)
@@ -0,0 +1,174 @@
+import logging
+import queue
+import threading
+import time
+
+from src.packets.capture import CaptureWriter
+from src.packets.metrics import RecorderMetrics
+from src.packets.numpy_packets import get_decoder
+from src.packets.packet_recorder import PacketRecorder
+
+
+class PacketWriterThread(threading.Thread):
+	"""
+	PacketWriterThread unpacks and saves received datagrams on its own thread, so that slow disk I/O does not delay the
+	thread that receives them. Datagrams are passed through a bounded queue, what happens when that queue is full is
+	determined by the overflow policy:
+		drop_newest: the received datagram is dropped
+		drop_oldest: the oldest datagram in the queue is dropped to make room for the received one
+		block: the receiving thread waits until there is room, the socket buffer then has to absorb the delay
+	"""
+
+	OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+	# Seconds the thread waits for a datagram before flushing buffered data to disk
+	IDLE_TIMEOUT = 1.
+
+	def __init__(self, data_root, max_size=4096, overflow_policy='drop_oldest', on_packet=None, capture_path=None,
+				 decoder='ctypes', metrics=None):
+		"""
+		:param data_root: Points to the base folder which contains the folders data, cfg and logs.
+		:param max_size: Maximum number of datagrams in the queue
+		:param overflow_policy: One of OVERFLOW_POLICIES
+		:param on_packet: Callable that is called with every unpacked packet, before it is saved
+		:param capture_path: If not None, every datagram is also appended to the capture file at this path
+		:param decoder: Decoder that unpacks the datagrams, 'ctypes' or 'numpy'
+		:param metrics: RecorderMetrics in which packet counts, latencies, queue depth and frame gaps are collected
+		"""
+		super().__init__(name='PacketWriterThread', daemon=True)
+
+		if overflow_policy not in self.OVERFLOW_POLICIES:
+			raise ValueError(f'Unknown overflow policy {overflow_policy}, must be one of {self.OVERFLOW_POLICIES}.')
+
+		self._queue = queue.Queue(maxsize=max_size)
+		self._overflow_policy = overflow_policy
+		self._on_packet = on_packet
+		self._unpack = get_decoder(decoder)
+
+		self._packet_recorder = PacketRecorder(data_root)
+		self._capture_writer = CaptureWriter(capture_path) if capture_path is not None else None
+
+		# Counters, see stats()
+		self.metrics = metrics if metrics is not None else RecorderMetrics()
+		self._received = 0
+		self._dropped = 0
+		self._saved = 0
+		self._errors = 0
+		self._last_drop_warning = 0.
+		self._last_error_log = 0.
+
+	def put(self, datagram, timestamp=None, source=None):
+		"""
+		Adds a received datagram to the queue. Called from the receiving thread.
+		:param datagram: Raw bytes as received from the socket
+		:param timestamp: Receive time in seconds since epoch, defaults to now
+		:param source: Source of the datagram when datagrams of several games are received, e.g. the address of the game
+		:return:
+		"""
+		self._received += 1
+		item = (time.time() if timestamp is None else timestamp, source, datagram)
+
+		if self._overflow_policy == 'block':
+			self._queue.put(item)
+		else:
+			try:
+				self._queue.put_nowait(item)
+			except queue.Full:
+				if self._overflow_policy == 'drop_oldest':
+					try:
+						self._queue.get_nowait()
+					except queue.Empty:
+						pass
+					self._queue.put_nowait(item)
+				self._drop()
+
+		self.metrics.record_queue_depth(self._queue.qsize())
+
+	def _drop(self):
+		self._dropped += 1
+		# Warn at most once per second to not make things worse by logging every dropped packet
+		if time.monotonic() - self._last_drop_warning > 1.:
+			logging.warning(f'Writer queue is full, {self._dropped} packets dropped so far.')
+			self._last_drop_warning = time.monotonic()
+
+	def stats(self):
+		"""
+		:return: Dictionary with the number of received, dropped, saved and failed packets, and the metrics, see
+		RecorderMetrics.stats()
+		"""
+		stats = self.metrics.stats()
+		stats.update({
+			'queue_depth': self._queue.qsize(),
+			'received': self._received,
+			'dropped': self._dropped,
+			'saved': self._saved,
+			'errors': self._errors
+		})
+		return stats
+
+	def run(self):
+		while True:
+			try:
+				item = self._queue.get(timeout=self.IDLE_TIMEOUT)
+			except queue.Empty:
+				# Nothing is coming in, make sure buffered data ends up on disk and finished sessions are closed
+				self._packet_recorder.flush()
+				self._packet_recorder.close_idle()
+				if self._capture_writer is not None:
+					self._capture_writer.flush()
+				self.metrics.record_queue_depth(0)
+				self.metrics.log_summary_if_due()
+				continue
+
+			if item is None:
+				break
+
+			timestamp, source, datagram = item
+			if self._capture_writer is not None:
+				self._capture_writer.write(datagram, timestamp)
+
+			try:
+				start = time.perf_counter()
+				packet = self._unpack(datagram)
+				decoded = time.perf_counter()
+				self.metrics.record_latency('decode', decoded - start)
+				# Frames are counted per session, sessions of different games can arrive interleaved
+				self.metrics.record_packet(packet.header.packetId, packet.header.frameIdentifier,
+										   (source, packet.header.sessionUID))
+
+				if self._on_packet is not None:
+					self._on_packet(packet)
+					emitted = time.perf_counter()
+					self.metrics.record_latency('emit', emitted - decoded)
+				else:
+					emitted = decoded
+
+				self._packet_recorder.save(packet, source, timestamp)
+				self.metrics.record_latency('save', time.perf_counter() - emitted)
+				self._saved += 1
+			except Exception:
+				# A single bad packet must not stop the thread, that would stop all saving
+				self._errors += 1
+				if time.monotonic() - self._last_error_log > 1.:
+					logging.exception(f'Failed to process packet, {self._errors} packets failed so far.')
+					self._last_error_log = time.monotonic()
+
+			self.metrics.log_summary_if_due()
+
+		# Logged before the recorder is closed, which removes the handlers of the session log files
+		self.metrics.record_queue_depth(self._queue.qsize())
+		logging.info(f'PacketWriterThread closed, stats: {self.stats()}')
+		logging.info(f'Recorder metrics: {self.metrics.summary()}')
+
+		self._packet_recorder.close()
+		if self._capture_writer is not None:
+			self._capture_writer.close()
+
+	def close(self):
+		"""
+		Saves the datagrams that are still in the queue, closes all files and waits for the thread to finish.
+		:return:
+		"""
+		# The stop sentinel must not be dropped, so wait for room regardless of the overflow policy
+		self._queue.put(None)
+		self.join()
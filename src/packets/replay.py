@@ -0,0 +1,109 @@
+import logging
+import os
+import time
+
+from f1_2020_telemetry.packets import UnpackError
+
+from src.packets.capture import CaptureReader
+from src.packets.numpy_packets import get_decoder
+from src.packets.packet_recorder import PacketRecorder
+
+# Longest single sleep while waiting for the next packet, so that quit() takes effect during long gaps in a capture, e.g.
+# while the game was paused
+MAX_SLEEP = 0.1
+
+
+class Replayer:
+	"""
+	Replayer feeds the datagrams of a capture file through the same path as live packets: they are unpacked, saved by a
+	PacketRecorder and passed to on_packet, e.g. TabsWidget.update_data.
+	Sessions that already have data in data_root, e.g. because the capture has been replayed before, are not saved
+	again, their packets would be appended to the existing lap files. Their packets are still passed to on_packet.
+	"""
+
+	def __init__(self, capture_path, data_root=None, speed=1., decoder='ctypes'):
+		"""
+		:param capture_path: Path of the capture file to replay
+		:param data_root: Points to the base folder which contains the folders data, cfg and logs. If None, packets are
+		not saved.
+		:param speed: Replay speed relative to the recorded timestamps, e.g. 2 replays twice as fast. None replays as fast
+		as possible.
+		:param decoder: Decoder that unpacks the datagrams, 'ctypes' or 'numpy'
+		"""
+		self.capture_path = capture_path
+		self.data_root = data_root
+		self.speed = speed
+		self._unpack = get_decoder(decoder)
+
+		self.quit_flag = False
+
+	def run(self, on_packet=None):
+		"""
+		Replays the capture file.
+		:param on_packet: Callable that is called with every unpacked packet
+		:return: Dictionary with the number of packets replayed, the number of datagrams that could not be unpacked and were
+		skipped, the elapsed wall time in seconds and the sessionUIDs that were not saved because they already existed
+		"""
+		recorder = PacketRecorder(self.data_root) if self.data_root is not None else None
+		# sessionUID -> whether the packets of that session are saved
+		save_session = {}
+
+		count = 0
+		bad_datagrams = 0
+		start_wall = time.perf_counter()
+		start_timestamp = None
+
+		with CaptureReader(self.capture_path) as capture:
+			for timestamp, datagram in capture:
+				if self.quit_flag:
+					break
+
+				if self.speed:
+					# Wait until the packet is due, relative to the first packet
+					if start_timestamp is None:
+						start_timestamp = timestamp
+					due = (timestamp - start_timestamp) / self.speed
+					while not self.quit_flag:
+						delay = due - (time.perf_counter() - start_wall)
+						if delay <= 0:
+							break
+						time.sleep(min(delay, MAX_SLEEP))
+					if self.quit_flag:
+						break
+
+				try:
+					packet = self._unpack(datagram)
+				except UnpackError as e:
+					# A truncated or corrupt datagram, e.g. at the end of a capture that was not closed properly
+					bad_datagrams += 1
+					logging.warning(f'Skipping datagram {count + bad_datagrams} of {self.capture_path}: {e}')
+					continue
+				if recorder is not None:
+					session_uid = packet.header.sessionUID
+					if session_uid not in save_session:
+						save_session[session_uid] = self._check_new_session(session_uid)
+					if save_session[session_uid]:
+						recorder.save(packet, timestamp=timestamp)
+				if on_packet is not None:
+					on_packet(packet)
+				count += 1
+
+		if recorder is not None:
+			recorder.close()
+
+		return {'packets': count, 'bad_datagrams': bad_datagrams, 'elapsed': time.perf_counter() - start_wall,
+				'skipped_sessions': [session_uid for session_uid, save in save_session.items() if not save]}
+
+	def _check_new_session(self, session_uid):
+		"""
+		:return: Whether the session has no data in data_root yet
+		"""
+		session_path = os.path.join(self.data_root, 'data', str(session_uid))
+		if os.path.exists(session_path):
+			logging.warning(f'Session {session_uid} already exists in {session_path}, its packets are replayed without '
+							f'saving them. Remove the folder to save the replay.')
+			return False
+		return True
+
+	def quit(self):
+		self.quit_flag = True
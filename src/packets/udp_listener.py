@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import socket
+
+# Messages are logged before any session has started, logging.info() would install a stderr handler on the root logger
+# then, see PacketRecorder._add_log_handler
+logger = logging.getLogger(__name__)
+
+
+class UdpListener:
+	"""
+	UdpListener receives the datagrams of one or more games on one or more UDP ports in a single thread, with an asyncio
+	event loop that waits on all sockets at once. Whenever a socket has datagrams waiting, it reads up to max_burst of
+	them before moving on to the other sockets, so that one busy game cannot starve the others, and without waking up
+	again for every datagram. The receive buffers of the sockets are enlarged, so that the operating system does not drop
+	datagrams when the recorder falls behind for a moment, e.g. while a lap is written to disk.
+	Every datagram is passed to on_datagram together with its source, '[sender host]:[local port]', which tells the games
+	apart both when they send to their own port and when they send to the same port from different machines.
+	"""
+
+	# Larger than any F1 2020 packet, the largest is the final classification packet of 839 bytes
+	MAX_DATAGRAM_SIZE = 2048
+	# Default maximum number of datagrams read from one socket per wake up
+	MAX_BURST = 64
+	# Default size in bytes of the receive buffer of each socket, about 1.5 s of packets of one game at 60 Hz
+	RECEIVE_BUFFER_SIZE = 1 << 20
+
+	def __init__(self, ports, on_datagram, host='', receive_buffer_size=RECEIVE_BUFFER_SIZE, max_burst=MAX_BURST):
+		"""
+		:param ports: List of UDP ports to listen on
+		:param on_datagram: Callable that is called with (datagram, source) for every received datagram
+		:param host: Address to bind to, '' for all interfaces
+		:param receive_buffer_size: Requested SO_RCVBUF of each socket in bytes, None to keep the operating system's default
+		:param max_burst: Maximum number of datagrams read from one socket per wake up
+		"""
+		self.ports = list(ports)
+		self.host = host
+		self.receive_buffer_size = receive_buffer_size
+		self.max_burst = max(int(max_burst), 1)
+		self._on_datagram = on_datagram
+
+		self._loop = None
+		self._stopped = None
+		self.quit_flag = False
+
+		# Counters, see stats()
+		self._received = {}
+		self._wake_ups = 0
+
+	def run(self):
+		"""
+		Listens until quit() is called. Blocks the calling thread.
+		:return:
+		"""
+		# Selector event loops support add_reader on all platforms, the proactor event loop of Windows does not
+		loop = asyncio.SelectorEventLoop()
+		try:
+			loop.run_until_complete(self._serve(loop))
+		finally:
+			loop.close()
+
+	async def _serve(self, loop):
+		self._stopped = asyncio.Event()
+		self._loop = loop
+
+		sockets = [self._open_socket(port) for port in self.ports]
+		for udp_socket, port in zip(sockets, self.ports):
+			loop.add_reader(udp_socket.fileno(), self._drain, udp_socket, port)
+		logger.info(f'Listening for packets on port(s) {", ".join(str(p) for p in self.ports)}.')
+
+		try:
+			if not self.quit_flag:
+				await self._stopped.wait()
+		finally:
+			for udp_socket in sockets:
+				loop.remove_reader(udp_socket.fileno())
+				udp_socket.close()
+
+	def _open_socket(self, port):
+		udp_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+		udp_socket.setblocking(False)
+		if self.receive_buffer_size:
+			udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer_size)
+			# The operating system may cap the size, e.g. at net.core.rmem_max on Linux, which doubles the size it reports
+			actual_size = udp_socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+			if actual_size < self.receive_buffer_size:
+				logger.warning(f'Receive buffer of port {port} is {actual_size} bytes instead of the requested '
+								f'{self.receive_buffer_size} bytes, raise the operating system limit to avoid dropped packets.')
+		udp_socket.bind((self.host, port))
+		return udp_socket
+
+	def _drain(self, udp_socket, port):
+		"""
+		Reads the datagrams waiting on a socket, called by the event loop when the socket is readable.
+		:return:
+		"""
+		self._wake_ups += 1
+		for _ in range(self.max_burst):
+			try:
+				datagram, address = udp_socket.recvfrom(self.MAX_DATAGRAM_SIZE)
+			except (BlockingIOError, InterruptedError):
+				return
+			except ConnectionResetError:
+				# Windows reports ICMP port unreachable messages of earlier sends on the next receive, harmless here
+				continue
+
+			source = f'{address[0]}:{port}'
+			self._received[source] = self._received.get(source, 0) + 1
+			self._on_datagram(datagram, source)
+
+	def stats(self):
+		"""
+		:return: Dictionary with the number of datagrams received per source and the number of wake ups
+		"""
+		return {'received': dict(self._received), 'wake_ups': self._wake_ups}
+
+	def quit(self):
+		"""
+		Stops listening, can be called from any thread.
+		:return:
+		"""
+		self.quit_flag = True
+		if self._loop is not None and self._stopped is not None:
+			try:
+				self._loop.call_soon_threadsafe(self._stopped.set)
+			except RuntimeError:
+				# The loop has already been closed
+				pass
@@ -1,8 +1,34 @@
-import os
+import importlib
 
-import pandas as pd
+from src.storage import SessionCatalog
 
-from .session_data import SessionData
+# Most submodules import pandas, which takes longer to import than the rest of the recorder together. They are imported
+# when one of their names is first used, so that e.g. the headless recorder or reading the catalog does not pay for it
+_LAZY_NAMES = {
+	'LAP_CACHE': 'lap_cache',
+	'LapCache': 'lap_cache',
+	'configure_lap_cache': 'lap_cache',
+	'catalog_laps': 'bulk_loader',
+	'iter_laps': 'bulk_loader',
+	'load_laps': 'bulk_loader',
+	'LapComparison': 'lap_comparison',
+	'ReferenceLap': 'reference_lap',
+	'SessionData': 'session_data',
+	'TrackGeometry': 'track_geometry',
+	'TrackGeometryCache': 'track_geometry'
+}
+
+__all__ = ['SessionCatalog', 'most_recent_session', 'all_sessions', 'rebuild_catalog', *_LAZY_NAMES]
+
+
+def __getattr__(name):
+	module_name = _LAZY_NAMES.get(name)
+	if module_name is None:
+		raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+	value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+	globals()[name] = value
+	return value
 
 
 def most_recent_session(data_path):
@@ -15,8 +41,24 @@ def most_recent_session(data_path):
 def all_sessions(data_path):
 	"""
 	Returns a pandas.DataFrame object of datetimes and sessionsUIDs, sorted by date ascending.
+	The sessions are read from the catalog, which is built from the data folder first if it does not exist yet.
 	:return: pandas.DataFrame object
 	"""
-	session_list = pd.read_csv(os.path.join(data_path, 'sessions.csv'))
+	import pandas as pd
+
+	catalog = SessionCatalog(data_path)
+	if not catalog.exists():
+		catalog.rebuild()
 
-	return session_list
+	session_list = pd.DataFrame([(entry['created'], int(session_uid)) for session_uid, entry in catalog.sessions().items()],
+								columns=['datetime', 'sessionUID'])
+
+	return session_list.sort_values('datetime', kind='stable', ignore_index=True)
+
+
+def rebuild_catalog(data_path):
+	"""
+	Rebuilds the session catalog from the files in the data folder.
+	:return: Number of sessions in the catalog
+	"""
+	return len(SessionCatalog(data_path).rebuild()['sessions'])
@@ -0,0 +1,124 @@
+import concurrent.futures
+import logging
+import os
+
+import pandas as pd
+
+from src.sessions.session_data import SessionData
+from src.storage import SessionCatalog
+
+# Index levels of the concatenated DataFrame returned by load_laps, a lap is identified by these values
+LAP_KEY_NAMES = ['sessionUID', 'sessionType', 'driver', 'lapNumber']
+
+
+def catalog_laps(data_path, session_uids=None, session_type=None, driver='player', min_rows=1):
+	"""
+	Lists the laps in the catalog, to be loaded with load_laps or iter_laps.
+	:param data_path: Path of the data folder, e.g. [data_root]/data
+	:param session_uids: sessionUIDs of the sessions to list the laps of, None for all sessions
+	:param session_type: Session type to list the laps of, e.g. 'race', None for all session types
+	:param driver: 'player', a driverId, or None for all drivers
+	:param min_rows: Minimum number of rows of the lap's lap data file, filters out laps that were barely recorded
+	:return: List of (sessionUID, session type, driver, lap number) tuples
+	"""
+	catalog = SessionCatalog(data_path)
+	if not catalog.exists():
+		catalog.rebuild()
+
+	if session_uids is not None:
+		session_uids = {str(s) for s in session_uids}
+
+	laps = []
+	for session_uid, entry in catalog.sessions().items():
+		if session_uids is not None and session_uid not in session_uids:
+			continue
+		for session_type_name, session_type_entry in entry['session_types'].items():
+			if session_type is not None and session_type_name != session_type:
+				continue
+			for driver_name, driver_laps in session_type_entry['drivers'].items():
+				if driver is not None and driver_name != str(driver):
+					continue
+				for lap_number, lap in driver_laps.items():
+					if lap['rows'].get('data', 0) >= min_rows:
+						laps.append((int(session_uid), session_type_name, driver_name, int(lap_number)))
+
+	return sorted(laps)
+
+
+def _load_lap(data_path, lap_key, columns, compact):
+	"""
+	Loads one lap, runs in a worker process.
+	:return: lap_key and its pandas.DataFrame object, None if the lap files do not exist
+	"""
+	session_uid, session_type, driver, lap_number = lap_key
+	try:
+		data = SessionData(session_uid, data_path).load_telemetry(lap_number, session_type=session_type, driver=driver,
+																	 columns=columns, use_cache=False,
+																	 compact=compact)
+	except FileNotFoundError:
+		return lap_key, None
+	return lap_key, data
+
+
+def iter_laps(data_path, lap_keys, columns=None, max_workers=None, compact=False):
+	"""
+	Loads laps in parallel with a pool of processes and yields each lap as soon as its worker has finished, so that
+	results can be processed while the other laps are still loading. Laps are therefore not yielded in order.
+	Laps whose files do not exist are skipped.
+	:param data_path: Path of the data folder, e.g. [data_root]/data
+	:param lap_keys: List of (sessionUID, session type, driver, lap number) tuples, e.g. from catalog_laps
+	:param columns: Names of the columns to load, None for all columns
+	:param max_workers: Number of worker processes, defaults to the number of CPUs. With 1 the laps are loaded in this
+	process.
+	:param compact: Whether to convert the columns to the dtypes the game sends them in, see SessionData.load_telemetry
+	:return: Generator of (lap key, pandas.DataFrame) tuples
+	"""
+	lap_keys = [tuple(k) for k in lap_keys]
+	if max_workers is None:
+		max_workers = os.cpu_count() or 1
+
+	if max_workers == 1 or len(lap_keys) <= 1:
+		results = (_load_lap(data_path, lap_key, columns, compact) for lap_key in lap_keys)
+		for lap_key, data in results:
+			if data is None:
+				logging.warning(f'Lap {lap_key} not found in {data_path}, skipping it.')
+				continue
+			yield lap_key, data
+		return
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+		futures = [executor.submit(_load_lap, data_path, lap_key, columns, compact) for lap_key in lap_keys]
+		try:
+			for future in concurrent.futures.as_completed(futures):
+				lap_key, data = future.result()
+				if data is None:
+					logging.warning(f'Lap {lap_key} not found in {data_path}, skipping it.')
+					continue
+				yield lap_key, data
+		finally:
+			# The consumer may stop early, laps that have not started loading are not needed anymore
+			for future in futures:
+				future.cancel()
+
+
+def load_laps(data_path, lap_keys, columns=None, max_workers=None, compact=False):
+	"""
+	Loads laps in parallel and concatenates them into one DataFrame, indexed by LAP_KEY_NAMES and the row number within
+	the lap. Laps are in the order of lap_keys, laps whose files do not exist are left out.
+	E.g. all laps of all races of the player:
+		load_laps(data_path, catalog_laps(data_path, session_type='race'), columns=['speed', 'lapDistance'])
+	:param data_path: Path of the data folder, e.g. [data_root]/data
+	:param lap_keys: List of (sessionUID, session type, driver, lap number) tuples, e.g. from catalog_laps
+	:param columns: Names of the columns to load, None for all columns
+	:param max_workers: Number of worker processes, defaults to the number of CPUs
+	:param compact: Whether to convert the columns to the dtypes the game sends them in, see SessionData.load_telemetry
+	:return: pandas.DataFrame object
+	"""
+	lap_keys = [tuple(k) for k in lap_keys]
+	laps = dict(iter_laps(data_path, lap_keys, columns=columns, max_workers=max_workers, compact=compact))
+
+	ordered = [lap_key for lap_key in lap_keys if lap_key in laps]
+	if not ordered:
+		return pd.DataFrame(index=pd.MultiIndex.from_tuples([], names=LAP_KEY_NAMES + [None]))
+
+	return pd.concat([laps[lap_key] for lap_key in ordered], keys=ordered, names=LAP_KEY_NAMES + [None])
@@ -0,0 +1,147 @@
+import collections
+import configparser
+import os
+import threading
+
+
+class LapCache:
+	"""
+	LapCache keeps loaded laps in memory, so that loading the same lap again does not read and merge its files again.
+	Entries are evicted least recently used first when the memory budget is exceeded, and are invalidated when one of the
+	files they were loaded from has changed.
+	"""
+
+	def __init__(self, max_bytes=512 * 1024 ** 2):
+		"""
+		:param max_bytes: Memory budget in bytes, 0 disables the cache
+		"""
+		self.max_bytes = max_bytes
+
+		# key -> (file_states, DataFrame, size in bytes), ordered from least to most recently used
+		self._entries = collections.OrderedDict()
+		self._bytes = 0
+		self._lock = threading.Lock()
+
+		# Counters, see stats()
+		self._hits = 0
+		self._misses = 0
+		self._evictions = 0
+		self._invalidations = 0
+
+	def get(self, key, file_states):
+		"""
+		:param key: Key of the lap, e.g. (sessionUID, session type, lap number, driver, columns)
+		:param file_states: The current file_states() of the files the lap is loaded from
+		:return: The cached DataFrame, None if it is not cached or the files have changed since it was cached
+		"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None and entry[0] != file_states:
+				self._remove(key)
+				self._invalidations += 1
+				entry = None
+
+			if entry is None:
+				self._misses += 1
+				return None
+
+			self._entries.move_to_end(key)
+			self._hits += 1
+			return entry[1]
+
+	def put(self, key, file_states, data):
+		"""
+		Adds a loaded lap to the cache and evicts least recently used laps until the cache fits its memory budget again.
+		A lap that is larger than the whole budget is not cached.
+		:param key: Key of the lap
+		:param file_states: file_states() of the files the lap was loaded from, before they were read
+		:param data: pandas.DataFrame object
+		:return:
+		"""
+		size = int(data.memory_usage(index=True, deep=True).sum())
+
+		with self._lock:
+			if key in self._entries:
+				self._remove(key)
+			if size > self.max_bytes:
+				return
+
+			self._entries[key] = (file_states, data, size)
+			self._bytes += size
+			self._evict()
+
+	def set_max_bytes(self, max_bytes):
+		"""
+		Changes the memory budget, evicts laps if the cache no longer fits.
+		:param max_bytes: Memory budget in bytes, 0 disables the cache
+		:return:
+		"""
+		with self._lock:
+			self.max_bytes = max_bytes
+			self._evict()
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self._bytes = 0
+
+	def stats(self):
+		"""
+		:return: Dictionary with the number of cached laps, their total size in bytes, the memory budget and the number
+		of hits, misses, evictions and invalidations.
+		"""
+		with self._lock:
+			return {
+				'entries': len(self._entries),
+				'bytes': self._bytes,
+				'max_bytes': self.max_bytes,
+				'hits': self._hits,
+				'misses': self._misses,
+				'evictions': self._evictions,
+				'invalidations': self._invalidations
+			}
+
+	def _remove(self, key):
+		_, _, size = self._entries.pop(key)
+		self._bytes -= size
+
+	def _evict(self):
+		while self._bytes > self.max_bytes and self._entries:
+			self._remove(next(iter(self._entries)))
+			self._evictions += 1
+
+
+def file_states(paths):
+	"""
+	:param paths: Paths of lap files, csv files or columnar folders
+	:return: Tuple of (path, mtime, size) of every file, for columnar folders of every file in the folder. Missing files
+	are included with mtime and size None.
+	"""
+	states = []
+	for path in paths:
+		if os.path.isdir(path):
+			for entry in sorted(os.scandir(path), key=lambda e: e.name):
+				stat = entry.stat()
+				states.append((entry.path, stat.st_mtime_ns, stat.st_size))
+		else:
+			try:
+				stat = os.stat(path)
+				states.append((path, stat.st_mtime_ns, stat.st_size))
+			except FileNotFoundError:
+				states.append((path, None, None))
+	return tuple(states)
+
+
+# Cache shared by all SessionData objects in this process
+LAP_CACHE = LapCache()
+
+
+def configure_lap_cache(data_root):
+	"""
+	Sets the memory budget of LAP_CACHE to lap_cache_size in the [cache] section of cfg/ui.ini.
+	:param data_root: Points to the base folder which contains the folders data, cfg and logs.
+	:return:
+	"""
+	ui_config = configparser.ConfigParser()
+	ui_config.read(os.path.join(data_root, 'cfg', 'ui.ini'))
+	LAP_CACHE.set_max_bytes(ui_config.getint('cache', 'lap_cache_size', fallback=512) * 1024 ** 2)
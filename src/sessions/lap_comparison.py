@@ -0,0 +1,218 @@
+import warnings
+
+import numpy as np
+
+# Channel that holds the time into the lap, used for delta times
+TIME_CHANNEL = 'currentLapTime'
+DISTANCE_CHANNEL = 'lapDistance'
+
+
+def resample(distances, values, grid):
+	"""
+	Resamples the values of several laps onto a common distance grid in one pass. The samples of all laps are
+	concatenated, each lap shifted by its own distance offset, so that a single np.interp call interpolates every lap.
+	Grid points before the first or after the last sample of a lap are NaN, as are laps without samples.
+	:param distances: List of 1D arrays, the lap distance of every sample of each lap
+	:param values: List of 1D arrays, the value of every sample of each lap
+	:param grid: 1D array of distances to resample onto
+	:return: 2D array of shape (number of laps, len(grid))
+	"""
+	result = np.full((len(distances), len(grid)), np.nan)
+
+	# Samples without a distance or a value cannot be interpolated
+	cleaned = []
+	for d, v in zip(distances, values):
+		d, v = np.asarray(d, dtype=float), np.asarray(v, dtype=float)
+		valid = np.isfinite(d) & np.isfinite(v)
+		cleaned.append((d[valid], v[valid]))
+
+	laps = np.array([i for i, (d, _) in enumerate(cleaned) if len(d) > 0], dtype=int)
+	if len(laps) == 0:
+		return result
+
+	x = np.concatenate([cleaned[i][0] for i in laps])
+	y = np.concatenate([cleaned[i][1] for i in laps])
+	lengths = np.array([len(cleaned[i][0]) for i in laps])
+	starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+	# Shift every lap by more than the distance covered by all laps and the grid, so that laps do not overlap
+	span = max(x.max(), grid[-1]) - min(x.min(), grid[0]) + 1.
+	offsets = np.arange(len(laps)) * span
+	x_shifted = x + np.repeat(offsets, lengths)
+
+	# Samples are not guaranteed to be ordered by distance, e.g. around the start/finish line
+	order = np.argsort(x_shifted, kind='stable')
+	interpolated = np.interp((grid[np.newaxis, :] + offsets[:, np.newaxis]).ravel(), x_shifted[order], y[order])
+	interpolated = interpolated.reshape(len(laps), len(grid))
+
+	# np.interp would connect the last sample of a lap to the first sample of the next lap
+	lap_min = np.minimum.reduceat(x, starts)[:, np.newaxis]
+	lap_max = np.maximum.reduceat(x, starts)[:, np.newaxis]
+	interpolated[(grid < lap_min) | (grid > lap_max)] = np.nan
+
+	result[laps] = interpolated
+	return result
+
+
+class LapComparison:
+	"""
+	LapComparison holds any number of laps resampled onto a common distance grid, as one 2D array per channel with a row
+	per lap, so that laps can be compared with vectorized numpy operations instead of loops over laps.
+	"""
+
+	def __init__(self, grid, laps, channels):
+		"""
+		:param grid: 1D array of lap distances
+		:param laps: List with a key per lap, e.g. the lap number, in the order of the rows
+		:param channels: Dictionary of channel name to 2D array of shape (len(laps), len(grid))
+		"""
+		self.grid = grid
+		self.laps = laps
+		self.channels = channels
+
+	@classmethod
+	def from_frames(cls, frames, laps, channels, step=1., track_length=None):
+		"""
+		Resamples laps that have already been loaded.
+		:param frames: List of pandas.DataFrame objects, one per lap, with a lapDistance column and the channels
+		:param laps: List with a key per lap
+		:param channels: Names of the columns to resample, currentLapTime is always included for delta times
+		:param step: Distance between grid points in metres
+		:param track_length: Length of the grid, defaults to the largest lap distance in the laps
+		:return: LapComparison object
+		"""
+		channels = list(dict.fromkeys([*channels, TIME_CHANNEL]))
+		distances = [frame[DISTANCE_CHANNEL].to_numpy(dtype=float) for frame in frames]
+
+		if track_length is None:
+			track_length = max((np.nanmax(d) for d in distances if np.isfinite(d).any()), default=0.)
+		grid = np.arange(0., track_length + step / 2, step)
+
+		return cls(grid, list(laps), {channel: resample(distances, [frame[channel] for frame in frames], grid)
+									  for channel in channels})
+
+	@classmethod
+	def from_session(cls, session_data, lap_numbers, channels, session_type='timetrial', driver='player', step=1.,
+					 track_length=None):
+		"""
+		Loads laps of a session and resamples them. Only the needed columns are loaded.
+		:param session_data: SessionData object
+		:param lap_numbers: Lap numbers to load
+		:param channels: Names of the columns to resample, e.g. ['speed', 'throttle']
+		:param session_type: Session type containing the laps
+		:param driver: 'player', or the driverId of another car when the session was recorded in full grid mode
+		:param step: Distance between grid points in metres
+		:param track_length: Length of the grid, defaults to the largest lap distance in the laps
+		:return: LapComparison object
+		"""
+		columns = [*channels, DISTANCE_CHANNEL, TIME_CHANNEL]
+		frames = [session_data.load_telemetry(lap_number, session_type=session_type, driver=driver, columns=columns)
+				  for lap_number in lap_numbers]
+		return cls.from_frames(frames, lap_numbers, channels, step=step, track_length=track_length)
+
+	def channel(self, name):
+		"""
+		:return: 2D array of the channel, a row per lap
+		"""
+		return self.channels[name]
+
+	def lap_times(self):
+		"""
+		:return: 1D array with the time of each lap at the furthest grid point any lap reaches, NaN for laps that do not
+		reach it
+		"""
+		times = self.channels[TIME_CHANNEL]
+		finite = np.isfinite(times)
+		if not finite.any():
+			return np.full(len(times), np.nan)
+
+		last = np.flatnonzero(finite.any(axis=0))[-1]
+		return times[:, last]
+
+	def delta_time(self, reference=None):
+		"""
+		Time difference to a reference lap at every grid point, positive where a lap is slower than the reference.
+		:param reference: Row index of the reference lap, defaults to the fastest complete lap
+		:return: 2D array of shape (number of laps, len(grid))
+		"""
+		times = self.channels[TIME_CHANNEL]
+		if reference is None:
+			lap_times = self.lap_times()
+			if not np.isfinite(lap_times).any():
+				raise ValueError('No lap has a time, a reference lap has to be given.')
+			reference = int(np.nanargmin(lap_times))
+
+		return times - times[reference]
+
+	def envelope(self, name):
+		"""
+		:param name: Name of the channel
+		:return: Dictionary with the 'min', 'max' and 'mean' over all laps at every grid point, NaN where no lap has a value
+		"""
+		values = self.channels[name]
+		# Grid points that no lap reaches are NaN, numpy warns about those
+		with warnings.catch_warnings():
+			warnings.simplefilter('ignore', category=RuntimeWarning)
+			return {
+				'min': np.nanmin(values, axis=0),
+				'max': np.nanmax(values, axis=0),
+				'mean': np.nanmean(values, axis=0)
+			}
+
+	def detect_corners(self, channel='speed', min_spacing=100.):
+		"""
+		Finds corners as the local minima of the mean of a channel over all laps. A corner reaches from the local maximum
+		before its minimum to the local maximum after it.
+		:param channel: Channel whose minima are the corners, usually speed
+		:param min_spacing: Minimum distance in metres between two corners
+		:return: List of (start distance, apex distance, end distance) tuples
+		"""
+		mean = self.envelope(channel)['mean']
+		half_window = max(int(min_spacing / (self.grid[1] - self.grid[0]) / 2), 1)
+
+		padded = np.pad(np.nan_to_num(mean, nan=np.inf), half_window, constant_values=np.inf)
+		window_min = np.lib.stride_tricks.sliding_window_view(padded, 2 * half_window + 1).min(axis=1)
+		apexes = np.flatnonzero((mean == window_min) & np.isfinite(mean))
+
+		# Plateaus give several minima next to each other, keep the first of them
+		apexes = apexes[np.concatenate(([True], np.diff(apexes) > half_window))] if len(apexes) else apexes
+
+		corners = []
+		boundaries = np.concatenate(([0], apexes, [len(mean) - 1]))
+		for i, apex in enumerate(apexes):
+			before = boundaries[i] + np.nanargmax(mean[boundaries[i]:apex + 1])
+			after = apex + np.nanargmax(mean[apex:boundaries[i + 2] + 1])
+			corners.append((self.grid[before], self.grid[apex], self.grid[after]))
+		return corners
+
+	def corner_stats(self, name, corners):
+		"""
+		Minimum, maximum and mean of a channel within each corner, for every lap at once.
+		:param name: Name of the channel
+		:param corners: List of corners, each a tuple of which the first and last element are the start and end distance,
+		e.g. as returned by detect_corners
+		:return: Dictionary with the 'min', 'max' and 'mean' as 2D arrays of shape (number of laps, number of corners)
+		"""
+		values = self.channels[name]
+		# detect_corners finds no corners on a channel without minima, e.g. a section of straights
+		if len(corners) == 0:
+			return {stat: np.empty((len(values), 0)) for stat in ('min', 'max', 'mean')}
+
+		starts = np.searchsorted(self.grid, [c[0] for c in corners], side='left')
+		ends = np.maximum(np.searchsorted(self.grid, [c[-1] for c in corners], side='right'), starts + 1)
+
+		# reduceat reduces between consecutive indices, the values between corners are dropped with [:, ::2]
+		indices = np.stack((starts, np.minimum(ends, len(self.grid)))).T.ravel()
+		if indices[-1] == len(self.grid):
+			values = np.concatenate((values, np.full((len(values), 1), np.nan)), axis=1)
+
+		finite = np.isfinite(values)
+		counts = np.add.reduceat(finite, indices, axis=1)[:, ::2]
+		sums = np.add.reduceat(np.where(finite, values, 0.), indices, axis=1)[:, ::2]
+
+		with np.errstate(invalid='ignore', divide='ignore'):
+			return {
+				'min': np.fmin.reduceat(values, indices, axis=1)[:, ::2],
+				'max': np.fmax.reduceat(values, indices, axis=1)[:, ::2],
+				'mean': np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+			}
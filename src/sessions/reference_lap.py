@@ -0,0 +1,99 @@
+import bisect
+
+import numpy as np
+
+from src.sessions.lap_comparison import DISTANCE_CHANNEL, TIME_CHANNEL
+
+LAP_NUMBER_CHANNEL = 'currentLapNum'
+
+
+class ReferenceLap:
+	"""
+	ReferenceLap is a lap that a lap being driven is compared against, as a table of lap distance to the time into the
+	lap, sorted by distance. Looking up the time at a distance is a binary search and a linear interpolation between the
+	two samples around it, cheap enough to compute a delta time for every lap data packet.
+	"""
+
+	def __init__(self, distances, times, lap_time=None, label='', track_id=None):
+		"""
+		:param distances: 1D array, the lap distance of every sample of the lap
+		:param times: 1D array, the time into the lap of every sample
+		:param lap_time: Time of the complete lap in seconds, None if unknown
+		:param label: Name of the lap shown next to delta times
+		:param track_id: trackId of the track the lap was driven on, None if unknown
+		"""
+		distances = np.asarray(distances, dtype=float)
+		times = np.asarray(times, dtype=float)
+
+		# Rows before the start line have a negative lap distance, they belong to the end of the previous lap
+		valid = np.isfinite(distances) & np.isfinite(times) & (distances >= 0)
+		distances, times = distances[valid], times[valid]
+
+		# After a flashback the lap distance runs backwards, only the samples of the final attempt are kept, those that
+		# lie before every later sample, which leaves the distances strictly increasing
+		later_min = np.append(np.minimum.accumulate(distances[::-1])[::-1][1:], np.inf)
+		keep = distances < later_min
+
+		# Python lists, bisect on them is faster than numpy for a single lookup
+		self.distances = distances[keep].tolist()
+		self.times = times[keep].tolist()
+		self.lap_time = lap_time
+		self.label = label
+		self.track_id = track_id
+
+	@classmethod
+	def from_session(cls, session_data, lap_number, session_type='timetrial', driver='player'):
+		"""
+		Loads a recorded lap as reference lap.
+		:param session_data: SessionData object of the session the lap was driven in
+		:param lap_number: Lap number
+		:param session_type: Session type
+		:param driver: 'player' or a driverId
+		:return: ReferenceLap object
+		"""
+		frame = session_data.load_telemetry(lap_number, session_type=session_type, driver=driver,
+											columns=[DISTANCE_CHANNEL, TIME_CHANNEL, LAP_NUMBER_CHANNEL], compact=True)
+		# The last row of a finished lap already belongs to the next lap
+		if LAP_NUMBER_CHANNEL in frame:
+			frame = frame[frame[LAP_NUMBER_CHANNEL] == lap_number]
+
+		session_type_entry = session_data.session_info(session_type) or {'drivers': {}}
+		lap_time = session_type_entry['drivers'].get(str(driver), {}).get(str(lap_number), {}).get('lap_time')
+
+		return cls(frame[DISTANCE_CHANNEL], frame[TIME_CHANNEL], lap_time=lap_time,
+				   label=f'Lap {lap_number} of {session_data.session_uid}', track_id=session_type_entry.get('track_id'))
+
+	def __len__(self):
+		return len(self.distances)
+
+	def time_at(self, distance):
+		"""
+		:param distance: Lap distance in metres
+		:return: Time into the reference lap at distance, the time of the first or last sample outside the range of the
+		samples. None if the lap has no samples.
+		"""
+		distances = self.distances
+		if not distances:
+			return None
+
+		i = bisect.bisect_right(distances, distance)
+		if i == 0:
+			return self.times[0]
+		if i == len(distances):
+			return self.times[-1]
+
+		d0, d1 = distances[i - 1], distances[i]
+		t0, t1 = self.times[i - 1], self.times[i]
+		return t0 + (t1 - t0) * (distance - d0) / (d1 - d0)
+
+	def delta(self, distance, lap_time):
+		"""
+		:param distance: Lap distance in metres of the lap being driven
+		:param lap_time: Time into the lap being driven
+		:return: Time difference to the reference lap at distance, positive when the lap being driven is slower. None if
+		the lap has no samples or distance lies before the start line.
+		"""
+		if distance < 0:
+			return None
+		reference_time = self.time_at(distance)
+		return None if reference_time is None else lap_time - reference_time
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+from f1_2020_telemetry.packets import CarMotionData_V1, CarStatusData_V1, CarTelemetryData_V1, LapData_V1, \
+	PacketSessionData_V1, ParticipantData_V1
+
+from src.ids.ids import driver_ids, nationalities_ids, team_ids, track_ids
+from src.packets.lap_summary import TYRES
+from src.packets.numpy_packets import HEADER_DTYPE, dtype_from_ctypes
+
+# Structure the fields of each data structure in packet_keys.ini are saved from
+STRUCTURES = {
+	'car_telemetry_data': CarTelemetryData_V1,
+	'car_motion_data': CarMotionData_V1,
+	'car_status_data': CarStatusData_V1,
+	'lap_data': LapData_V1,
+	'participant_data': ParticipantData_V1,
+	'session_packet': PacketSessionData_V1
+}
+
+# Data structures the lap files are saved from, see LAP_STREAM_CONFIG_KEYS of PacketSaver
+LAP_STRUCTURES = ('car_telemetry_data', 'car_motion_data', 'car_status_data', 'lap_data')
+
+# ID fields that are looked up in src.ids, with the name of the categorical column of their names
+ID_NAMES = {
+	'driverId': ('driverName', driver_ids),
+	'teamId': ('teamName', team_ids),
+	'nationality': ('nationalityName', nationalities_ids),
+	'trackId': ('trackName', track_ids)
+}
+
+
+class ColumnSchema:
+	"""
+	ColumnSchema holds the dtype of every column of the saved files, as sent by the game in the packet structures the
+	columns are saved from: e.g. gear and pitStatus are uint8 and speeds float32, where pandas would infer int64 and
+	float64. The structures are those of the data structures in packet_keys.ini, see PacketConfig. All their fields are
+	included, not only the configured ones, so that files recorded with another packet_keys.ini load the same.
+	compact() converts a loaded DataFrame to these dtypes.
+	"""
+
+	def __init__(self, structure_keys, extra_columns=None):
+		"""
+		:param structure_keys: Keys of the data structures in STRUCTURES whose fields are columns
+		:param extra_columns: Dictionary of other column names to their numpy dtype
+		"""
+		# Column name -> (numpy dtype of a value, number of values for array fields or None)
+		self.columns = {}
+
+		# Every lap file starts with these fields of the packet header
+		for name in ('sessionTime', 'frameIdentifier'):
+			self.columns[name] = (HEADER_DTYPE.fields[name][0], None)
+
+		for key in structure_keys:
+			structure_dtype = dtype_from_ctypes(STRUCTURES[key])
+			for name in structure_dtype.names:
+				field_dtype = structure_dtype.fields[name][0]
+				if field_dtype.subdtype is not None:
+					base, shape = field_dtype.subdtype
+					# Arrays of nested structures, e.g. the marshal zones of the session packet, are never saved
+					if base.names is None:
+						self.columns[name] = (base, int(np.prod(shape)))
+				elif field_dtype.names is None and field_dtype.kind != 'S':
+					# Byte strings, e.g. names, are left as strings
+					self.columns[name] = (field_dtype, None)
+
+		for name, dtype in (extra_columns or {}).items():
+			self.columns[name] = (np.dtype(dtype), None)
+
+	@classmethod
+	def for_laps(cls):
+		"""
+		:return: ColumnSchema of the lap files and of lap[N]_frames.csv
+		"""
+		# missingStreams of the frames files is a bitmask of the four lap streams
+		return cls(LAP_STRUCTURES, extra_columns={'missingStreams': np.uint8})
+
+	@staticmethod
+	def array_columns(name, length):
+		"""
+		:return: Names of the columns an array field is split into, named after the tyres for arrays of four tyres
+		"""
+		if length == len(TYRES):
+			return [f'{name}{tyre}' for tyre in TYRES]
+		return [f'{name}{i}' for i in range(length)]
+
+	def compact(self, frame):
+		"""
+		Converts the columns of frame that are in this schema to their dtypes. Integer columns with missing values, e.g.
+		the rows of an outer merge that a lap file has no sample for, become float32 so the missing values stay NaN.
+		Array fields, saved as their values separated by spaces or loaded as one array per row, are split into a column
+		per value, see array_columns(). ID fields in ID_NAMES get a categorical column with their names next to them.
+		:param frame: pandas.DataFrame object
+		:return: New pandas.DataFrame object, the columns that are not in the schema are not copied
+		"""
+		data = {}
+		for name, series in frame.items():
+			spec = self.columns.get(name)
+			if spec is None:
+				data[name] = series
+				continue
+
+			dtype, length = spec
+			if length is None:
+				data[name] = _narrow(series.to_numpy(), dtype)
+			else:
+				values = _split_arrays(series, length)
+				for i, column in enumerate(self.array_columns(name, length)):
+					data[column] = _narrow(values[:, i], dtype)
+
+			if name in ID_NAMES:
+				name_column, names = ID_NAMES[name]
+				data[name_column] = series.map(names).astype(_names_dtype(names))
+
+		return pd.DataFrame(data, index=frame.index, copy=False)
+
+
+def _narrow(values, dtype):
+	"""
+	:return: values as dtype, as float32 if dtype is an integer dtype and values has missing values
+	"""
+	if values.dtype == object:
+		values = pd.to_numeric(values, errors='coerce')
+	if dtype.kind in 'iub' and values.dtype.kind == 'f' and np.isnan(values).any():
+		return values.astype(np.float32)
+	return values.astype(dtype, copy=False)
+
+
+def _split_arrays(series, length):
+	"""
+	:param series: pandas.Series of arrays, as strings of values separated by spaces or as numpy arrays. The values may be
+	separated by several spaces, as in files recorded before extraction plans, which saved arrays as formatted by numpy,
+	e.g. '22.5 23.1 24.  21. '
+	:param length: Number of values of every array
+	:return: 2D float array of shape (len(series), length), rows of missing arrays are NaN
+	"""
+	values = np.full((len(series), length), np.nan)
+	present = series.notna().to_numpy()
+	if present.any():
+		arrays = series.to_numpy()[present]
+		# One parse or concatenation of all rows at once is much faster than handling every row on its own
+		if isinstance(arrays[0], str):
+			parsed = np.fromstring(' '.join(arrays), sep=' ')
+			if len(parsed) != len(arrays) * length:
+				raise ValueError(f'Column {series.name} does not have {length} values in every row.')
+			values[present] = parsed.reshape(-1, length)
+		else:
+			values[present] = np.concatenate(arrays).reshape(-1, length)
+	return values
+
+
+_names_dtypes = {}
+
+
+def _names_dtype(names):
+	"""
+	:return: CategoricalDtype of the names of an ID field, shared by all DataFrames so that they concatenate as categorical
+	"""
+	dtype = _names_dtypes.get(id(names))
+	if dtype is None:
+		dtype = _names_dtypes[id(names)] = pd.CategoricalDtype(sorted(set(names.values())))
+	return dtype
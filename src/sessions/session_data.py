@@ -3,6 +3,19 @@ import os
 import pandas as pd
 import numpy as np
 
+from src.sessions.lap_cache import LAP_CACHE, file_states
+from src.sessions.schema import ColumnSchema
+from src.storage import ColumnarReader, SessionCatalog, columnar_path, find_compressed
+from src.storage.columnar import COLUMNAR_SUFFIX
+
+# Lap files that are merged into the telemetry of a lap
+LAP_STREAMS = ('telemetry', 'motion', 'status', 'data')
+
+# dtypes of the columns of the lap files, and of participants.csv and session.csv
+LAP_SCHEMA = ColumnSchema.for_laps()
+PARTICIPANTS_SCHEMA = ColumnSchema(['participant_data'])
+SESSION_SCHEMA = ColumnSchema(['session_packet'])
+
 
 class SessionData:
 	"""
@@ -13,43 +26,205 @@ class SessionData:
 		self.telemetry_data = None
 		self.data_path = data_path
 		self.session_uid = session_uid
+		self.catalog = SessionCatalog(data_path)
 
-	def load_telemetry(self, lap_number, session_type='timetrial'):
+	def load_telemetry(self, lap_number, session_type='timetrial', driver='player', columns=None, use_cache=True,
+					   compact=False):
 		"""
 		Loads the telemetry data for specified lap number and session type.
 		Return object is a DataFrame containing all telemetry data.
+		If the lap was recorded with frames enabled, its aligned lap[N]_frames.csv is loaded instead of merging the lap
+		files. It has a row for every frame and an extra missingStreams column, see FrameAssembler.
+		Loaded laps are kept in the process wide LAP_CACHE, loading the same lap and columns again returns the cached
+		data as long as the lap files have not changed.
 		:param lap_number: Lap number for which to load telemetry data
 		:param session_type: Session type containing that lap number
+		:param driver: 'player', or the driverId of another car when the session was recorded in full grid mode
+		:param columns: Names of the columns to load, None for all columns. sessionTime and frameIdentifier are always
+		loaded.
+		:param use_cache: Whether to use LAP_CACHE
+		:param compact: Whether to convert the columns to the dtypes the game sends them in, see ColumnSchema: uint8 for
+		e.g. gear and pitStatus, float32 for floats, and array fields split into a column per value, e.g. tyresWearRL.
+		Otherwise, the default, the dtypes are inferred by pandas and array fields are left as saved.
 		:return: pandas.DataFrame object
 		"""
-		# Read all four types of telemetry data
-		telemetry = pd.read_csv(os.path.join(self.data_path, str(self.session_uid), str(session_type), 'player', f'lap{lap_number}_telemetry.csv'))
-		motion = pd.read_csv(os.path.join(self.data_path, str(self.session_uid), str(session_type), 'player', f'lap{lap_number}_motion.csv'))
-		status = pd.read_csv(os.path.join(self.data_path, str(self.session_uid), str(session_type), 'player', f'lap{lap_number}_status.csv'))
-		lap_data = pd.read_csv(os.path.join(self.data_path, str(self.session_uid), str(session_type), 'player', f'lap{lap_number}_data.csv'))
-
-		# Merge the DataFrames on sessionTime
-		t_data = telemetry.merge(motion, how='inner', on=['sessionTime', 'frameIdentifier'])
-		tt_data = t_data.merge(status, how='inner', on=['sessionTime', 'frameIdentifier'])
-		# Final result should be sorted
-		self.telemetry_data = tt_data.merge(lap_data, how='outer', on=['sessionTime', 'frameIdentifier'], sort=True)
-
-		# TODO: columns containing strings should be converted to np arrays
-		# # Convert the string of values to array of floats, per column
-		# data['a1'] = data['a1'].apply(np.fromstring, dtype=float, sep=' ')
-		# data['a2'] = data['a2'].apply(np.fromstring, dtype=float, sep=' ')
-		# data['a3'] = data['a3'].apply(np.fromstring, dtype=float, sep=' ')
-		#
-		# print(data)
+		key = (str(self.session_uid), str(session_type), lap_number, str(driver),
+			   tuple(sorted(columns)) if columns is not None else None, compact)
+
+		# Laps recorded with frames enabled in cfg/recorder.ini are already aligned, no merging needed
+		frames_path = self._lap_file_source(lap_number, session_type, 'frames', driver)
+		use_frames = os.path.exists(frames_path)
+		states = file_states([frames_path] if use_frames else
+							 [self._lap_file_source(lap_number, session_type, stream, driver) for stream in LAP_STREAMS])
+
+		if use_cache:
+			cached = LAP_CACHE.get(key, states)
+			if cached is not None:
+				# Deep copy, a shallow copy shares the values, in place changes such as df['speed'] *= 3.6 would
+				# change the cached DataFrame
+				self.telemetry_data = cached.copy(deep=True)
+				return self.telemetry_data
+
+		if use_frames:
+			self.telemetry_data = self._load_lap_file(lap_number, session_type, 'frames', driver, columns)
+		else:
+			# Read all four types of telemetry data
+			telemetry = self._load_lap_file(lap_number, session_type, 'telemetry', driver, columns)
+			motion = self._load_lap_file(lap_number, session_type, 'motion', driver, columns)
+			status = self._load_lap_file(lap_number, session_type, 'status', driver, columns)
+			lap_data = self._load_lap_file(lap_number, session_type, 'data', driver, columns)
+
+			# Merge the DataFrames on sessionTime
+			t_data = telemetry.merge(motion, how='inner', on=['sessionTime', 'frameIdentifier'])
+			tt_data = t_data.merge(status, how='inner', on=['sessionTime', 'frameIdentifier'])
+			# Final result should be sorted
+			self.telemetry_data = tt_data.merge(lap_data, how='outer', on=['sessionTime', 'frameIdentifier'], sort=True)
+
+		if compact:
+			self.telemetry_data = LAP_SCHEMA.compact(self.telemetry_data)
+
+		if use_cache:
+			LAP_CACHE.put(key, states, self.telemetry_data)
+			self.telemetry_data = self.telemetry_data.copy(deep=True)
 
 		return self.telemetry_data
 
-	def session_info(self, session_type):
-		pass
+	def load_lap_arrays(self, lap_number, stream, session_type='timetrial', columns=None, driver='player'):
+		"""
+		Memory-maps the columns of a lap file saved in the columnar storage format, without copying any data.
+		:param lap_number: Lap number for which to load the data
+		:param stream: Lap file to load, one of 'telemetry', 'motion', 'status' or 'data'
+		:param session_type: Session type containing that lap number
+		:param columns: Names of the columns to load, None for all columns
+		:param driver: 'player', or the driverId of another car when the session was recorded in full grid mode
+		:return: Dictionary of column name to read-only numpy array
+		"""
+		return ColumnarReader(columnar_path(self._lap_file_path(lap_number, session_type, stream, driver))).columns(columns)
+
+	def load_laps(self, session_type='timetrial', driver=None):
+		"""
+		Loads the lap summaries saved while recording, one row per completed lap with lap and sector times, validity,
+		pitStatus, top speed, lowest speed per sector, fuel used and tyre wear, see LAP_SUMMARY_COLUMNS. This only reads
+		laps.csv, not the lap files.
+		:param session_type: Session type
+		:param driver: 'player' or a driverId, None for all drivers, which adds a driver column
+		:return: pandas.DataFrame object, empty if no laps were completed
+		"""
+		drivers = self.drivers(session_type) if driver is None else [driver]
+		laps = []
+		for d in drivers:
+			path = os.path.join(self.data_path, str(self.session_uid), str(session_type), str(d), 'laps.csv')
+			if os.path.exists(path):
+				driver_laps = pd.read_csv(path)
+				if driver is None:
+					driver_laps.insert(0, 'driver', str(d))
+				laps.append(driver_laps)
+
+		return pd.concat(laps, ignore_index=True) if laps else pd.DataFrame()
+
+	def load_participants(self, session_type='timetrial'):
+		"""
+		Loads participants.csv, one row per car in the order of the car indices, with the driverName, teamName and
+		nationalityName of their IDs as categorical columns.
+		:param session_type: Session type
+		:return: pandas.DataFrame object
+		"""
+		return PARTICIPANTS_SCHEMA.compact(pd.read_csv(self._session_file_path(session_type, 'participants.csv')))
+
+	def load_session(self, session_type='timetrial'):
+		"""
+		Loads session.csv, the session info saved at the start of the session type, with the trackName of its trackId as
+		categorical column.
+		:param session_type: Session type
+		:return: pandas.DataFrame object
+		"""
+		return SESSION_SCHEMA.compact(pd.read_csv(self._session_file_path(session_type, 'session.csv')))
+
+	def drivers(self, session_type='timetrial'):
+		"""
+		:param session_type: Session type
+		:return: List of the drivers that have lap files in session_type, 'player' and driverIds in full grid mode
+		"""
+		session_type_path = os.path.join(self.data_path, str(self.session_uid), str(session_type))
+		return sorted(d for d in os.listdir(session_type_path) if os.path.isdir(os.path.join(session_type_path, d)))
+
+	def _session_file_path(self, session_type, file):
+		"""
+		:return: Path of a file that belongs to the whole session type, e.g. participants.csv
+		"""
+		return os.path.join(self.data_path, str(self.session_uid), str(session_type), file)
+
+	def _lap_file_path(self, lap_number, session_type, stream, driver='player'):
+		"""
+		:return: Path of the lap file without extension.
+		"""
+		return os.path.join(self.data_path, str(self.session_uid), str(session_type), str(driver), f'lap{lap_number}_{stream}')
+
+	def _lap_file_source(self, lap_number, session_type, stream, driver='player'):
+		"""
+		:return: Path of the columnar folder of the lap file if it exists, otherwise the path of the csv file, or of the
+		compressed csv file if the lap has been compressed after it was finished
+		"""
+		path = self._lap_file_path(lap_number, session_type, stream, driver)
+		if os.path.isdir(columnar_path(path)):
+			return columnar_path(path)
+		if not os.path.exists(path + '.csv'):
+			_, compressed_path = find_compressed(path + '.csv')
+			if compressed_path is not None:
+				return compressed_path
+		return path + '.csv'
+
+	def _load_lap_file(self, lap_number, session_type, stream, driver='player', columns=None):
+		"""
+		Loads a lap file as DataFrame, from the columnar storage format if it exists, otherwise from csv. pandas
+		decompresses compressed csv files based on their extension.
+		:param columns: Names of the columns to load, None for all columns. Columns that are not in this lap file are
+		ignored, sessionTime and frameIdentifier are always loaded.
+		:return: pandas.DataFrame object
+		"""
+		path = self._lap_file_source(lap_number, session_type, stream, driver)
+		wanted = None if columns is None else {'sessionTime', 'frameIdentifier', *columns}
+
+		if path.endswith(COLUMNAR_SUFFIX):
+			reader = ColumnarReader(path)
+			return reader.to_dataframe(None if wanted is None else [c for c in reader.column_names() if c in wanted])
+
+		return pd.read_csv(path, usecols=None if wanted is None else lambda c: c in wanted)
+
+	def session_info(self, session_type='timetrial'):
+		"""
+		:param session_type: Session type
+		:return: Catalog entry of the session type: session_type, track_id and per driver the laps with lap time, validity
+		and row counts. None if the session type was not recorded.
+		"""
+		return self._catalog_session()['session_types'].get(str(session_type))
+
+	def missing_frames(self, lap_number, session_type='timetrial', driver='player'):
+		"""
+		:param lap_number: Lap number
+		:param session_type: Session type
+		:param driver: 'player' or a driverId
+		:return: Dictionary of lap file to the number of packets the game sent during the lap that were not received, e.g.
+		{'telemetry': 3}. Empty if no packets were missed, or if the lap was recorded before missed packets were counted.
+		"""
+		session_type_entry = self.session_info(session_type) or {'drivers': {}}
+		lap = session_type_entry['drivers'].get(str(driver), {}).get(str(lap_number), {})
+		return dict(lap.get('missing_frames', {}))
 
 	def session_types(self):
 		"""
 		:return: List of all session types for this sessionUID
 		"""
-		pass
+		return list(self._catalog_session()['session_types'])
 
+	def _catalog_session(self):
+		"""
+		:return: Catalog entry of this session, the catalog is rebuilt if it does not contain this session yet
+		"""
+		entry = self.catalog.session(self.session_uid)
+		if entry is None:
+			self.catalog.rebuild()
+			entry = self.catalog.session(self.session_uid)
+			if entry is None:
+				raise FileNotFoundError(f'No data found for session {self.session_uid} in {self.data_path}.')
+		return entry
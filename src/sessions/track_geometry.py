@@ -0,0 +1,214 @@
+import logging
+import os
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from src.sessions.lap_comparison import DISTANCE_CHANNEL, resample
+from src.sessions.session_data import SessionData
+from src.storage import SessionCatalog
+
+# Track geometries are saved in the data folder, next to the sessionUID folders, as tracks/track[trackId].csv
+TRACKS_FOLDER = 'tracks'
+# Columns of the saved geometries, also the columns that are loaded of a lap to build a geometry from
+GEOMETRY_COLUMNS = [DISTANCE_CHANNEL, 'worldPositionX', 'worldPositionZ']
+
+
+class TrackGeometry:
+	"""
+	TrackGeometry is the centerline of a track as world positions at evenly spaced lap distances, averaged over a few
+	recorded laps. Any lap on the track can be drawn on it by looking up its lap distances, so the lap's own, noisy,
+	world positions are not needed to draw a map.
+	"""
+
+	def __init__(self, track_id, distance, x, z):
+		"""
+		:param track_id: trackId of the session packets
+		:param distance: 1D array of evenly spaced lap distances, starting at 0
+		:param x: 1D array of worldPositionX at each lap distance
+		:param z: 1D array of worldPositionZ at each lap distance
+		"""
+		self.track_id = track_id
+		self.distance = np.asarray(distance, dtype=float)
+		self.x = np.asarray(x, dtype=float)
+		self.z = np.asarray(z, dtype=float)
+		self.spacing = self.distance[1] - self.distance[0] if len(self.distance) > 1 else 1.
+
+		# Segments per number of segments, see segments()
+		self._segments = {}
+
+	@classmethod
+	def from_laps(cls, track_id, frames, spacing=5.):
+		"""
+		Builds the centerline from recorded laps, by resampling their world positions onto a grid of lap distances and
+		averaging them over the laps.
+		:param track_id: trackId of the session packets
+		:param frames: List of pandas.DataFrame objects, one per lap, with lapDistance, worldPositionX and worldPositionZ
+		:param spacing: Distance in metres between the points of the centerline
+		:return: TrackGeometry object
+		"""
+		# Rows before the start line have a negative lap distance, they belong to the end of the previous lap
+		frames = [frame[frame[DISTANCE_CHANNEL] >= 0] for frame in frames]
+		distances = [frame[DISTANCE_CHANNEL].to_numpy(dtype=float) for frame in frames]
+		track_length = max((d.max() for d in distances if len(d)), default=0.)
+		if track_length <= spacing:
+			raise ValueError(f'Laps of track {track_id} do not have enough samples to build its geometry.')
+
+		grid = np.arange(0., track_length, spacing)
+		# Grid points that no lap reaches are NaN, numpy warns about those
+		with warnings.catch_warnings():
+			warnings.simplefilter('ignore', category=RuntimeWarning)
+			x = np.nanmean(resample(distances, [frame['worldPositionX'] for frame in frames], grid), axis=0)
+			z = np.nanmean(resample(distances, [frame['worldPositionZ'] for frame in frames], grid), axis=0)
+
+		# Grid points that no lap reached, e.g. when the laps end before the line, are left out
+		covered = np.isfinite(x) & np.isfinite(z)
+		return cls(track_id, grid[covered], x[covered], z[covered])
+
+	@classmethod
+	def load(cls, path, track_id):
+		geometry = pd.read_csv(path)
+		return cls(track_id, *(geometry[c].to_numpy() for c in GEOMETRY_COLUMNS))
+
+	def save(self, path):
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp_path = path + '.tmp'
+		pd.DataFrame(dict(zip(GEOMETRY_COLUMNS, (self.distance, self.x, self.z)))).to_csv(tmp_path, index=False)
+		os.replace(tmp_path, path)
+
+	def _stride(self, max_segments):
+		"""
+		:return: Number of centerline points per segment so that there are at most max_segments segments
+		"""
+		return max(-(-len(self.distance) // max_segments), 1) if max_segments else 1
+
+	def segments(self, max_segments=None):
+		"""
+		The centerline as line segments, for a matplotlib LineCollection. The last segment closes the loop back to the
+		start line.
+		:param max_segments: Maximum number of segments, None for one segment per centerline point
+		:return: Array of shape (number of segments, 2, 2)
+		"""
+		stride = self._stride(max_segments)
+		if stride not in self._segments:
+			points = np.column_stack((self.x, self.z))[::stride]
+			points = np.concatenate((points, points[:1]))
+			self._segments[stride] = np.stack((points[:-1], points[1:]), axis=1)
+		return self._segments[stride]
+
+	def segment_values(self, distances, values, max_segments=None):
+		"""
+		Projects a channel of a lap onto the segments of segments(max_segments): the value of a segment is the mean of the
+		values of the samples whose lap distance falls within it.
+		:param distances: 1D array, the lap distance of every sample
+		:param values: 1D array, the value of the channel of every sample
+		:param max_segments: Maximum number of segments, must be the same as for segments()
+		:return: 1D array with a value per segment, NaN for segments without samples
+		"""
+		distances = np.asarray(distances, dtype=float)
+		values = np.asarray(values, dtype=float)
+		num_segments = len(self.segments(max_segments))
+
+		segment = np.floor(distances / (self.spacing * self._stride(max_segments))).astype(np.int64)
+		valid = (segment >= 0) & (segment < num_segments) & np.isfinite(values)
+
+		sums = np.bincount(segment[valid], weights=values[valid], minlength=num_segments)
+		counts = np.bincount(segment[valid], minlength=num_segments)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			return np.where(counts > 0, sums / counts, np.nan)
+
+
+class TrackGeometryCache:
+	"""
+	TrackGeometryCache keeps the TrackGeometry of every track, keyed by trackId, in memory and in data/tracks. A missing
+	geometry is built from the laps in the catalog that were driven on the track.
+	"""
+
+	def __init__(self, data_path, spacing=5., max_laps=5):
+		"""
+		:param data_path: Path of the data folder, e.g. [data_root]/data
+		:param spacing: Distance in metres between the points of built centerlines
+		:param max_laps: Maximum number of laps a centerline is built from
+		"""
+		self.data_path = data_path
+		self.spacing = spacing
+		self.max_laps = max_laps
+
+		self._geometries = {}
+		self._lock = threading.Lock()
+
+	def _path(self, track_id):
+		return os.path.join(self.data_path, TRACKS_FOLDER, f'track{track_id}.csv')
+
+	def get(self, track_id):
+		"""
+		:param track_id: trackId of the session packets
+		:return: TrackGeometry of the track, built from the recorded laps if it is not cached yet. None if there are no
+		recorded laps on the track.
+		"""
+		track_id = int(track_id)
+		with self._lock:
+			geometry = self._geometries.get(track_id)
+			if geometry is None:
+				path = self._path(track_id)
+				if os.path.exists(path):
+					geometry = TrackGeometry.load(path, track_id)
+				else:
+					geometry = self._build(track_id)
+					if geometry is None:
+						return None
+					geometry.save(path)
+				self._geometries[track_id] = geometry
+			return geometry
+
+	def put(self, geometry):
+		"""
+		Replaces the cached geometry of its track, e.g. with one built from better laps.
+		:param geometry: TrackGeometry object
+		:return:
+		"""
+		with self._lock:
+			geometry.save(self._path(geometry.track_id))
+			self._geometries[geometry.track_id] = geometry
+
+	def _track_laps(self, track_id):
+		"""
+		:return: List of (sessionUID, session type, driver, lap number) of finished laps on the track, valid laps first
+		"""
+		catalog = SessionCatalog(self.data_path)
+		if not catalog.exists():
+			catalog.rebuild()
+
+		laps = []
+		for session_uid, entry in catalog.sessions().items():
+			for session_type_name, session_type_entry in entry['session_types'].items():
+				if session_type_entry.get('track_id') != track_id:
+					continue
+				for driver, driver_laps in session_type_entry['drivers'].items():
+					for lap_number, lap in driver_laps.items():
+						if lap['lap_time'] is not None:
+							laps.append((not lap['valid'], driver != 'player', session_uid, session_type_name, driver,
+										 int(lap_number)))
+
+		return [lap[2:] for lap in sorted(laps)]
+
+	def _build(self, track_id):
+		frames = []
+		for session_uid, session_type_name, driver, lap_number in self._track_laps(track_id):
+			try:
+				frames.append(SessionData(session_uid, self.data_path).load_telemetry(
+					lap_number, session_type=session_type_name, driver=driver, columns=GEOMETRY_COLUMNS,
+					compact=True))
+			except (FileNotFoundError, ValueError):
+				continue
+			if len(frames) == self.max_laps:
+				break
+
+		if not frames:
+			logging.warning(f'No finished laps on track {track_id} to build its geometry from.')
+			return None
+
+		logging.info(f'Building the geometry of track {track_id} from {len(frames)} laps.')
+		return TrackGeometry.from_laps(track_id, frames, spacing=self.spacing)
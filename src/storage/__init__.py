@@ -0,0 +1,4 @@
+from .columnar import ColumnarWriter, ColumnarReader, columnar_path
+from .compression import CODEC_SUFFIXES, LapCompressor, compress_columnar, compress_file, decompress_columnar, \
+	decompress_file, find_compressed, reopen_lap_file
+from .catalog import MISSING_FRAMES_COLUMNS, MISSING_FRAMES_FILE, SessionCatalog, SessionEntry
@@ -0,0 +1,358 @@
+import contextlib
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+
+try:
+	import fcntl
+except ImportError:
+	# Windows
+	fcntl = None
+	import msvcrt
+
+from src.storage.columnar import COLUMNAR_SUFFIX, ColumnarReader
+from src.storage.compression import CODEC_SUFFIXES, open_file
+
+# The catalog is saved in the data folder, next to the sessionUID folders
+CATALOG_FILE = 'catalog.json'
+CATALOG_VERSION = 1
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Lap files are named lap[N]_[stream].csv, or lap[N]_[stream].col in the columnar storage format. Compressed csv lap
+# files have the suffix of their codec appended, e.g. lap[N]_[stream].csv.gz
+LAP_FILE_PATTERN = re.compile(r'^lap(\d+)_(\w+?)(\.csv|' + re.escape(COLUMNAR_SUFFIX) + r')(' +
+							  '|'.join(re.escape(suffix) for suffix in CODEC_SUFFIXES.values()) + r')?$')
+
+# Packets that the game sent but that were never received are saved per driver folder in this file, one row per gap
+MISSING_FRAMES_FILE = 'missing_frames.csv'
+MISSING_FRAMES_COLUMNS = ('lapNumber', 'stream', 'missingFrames')
+
+# Columns of the lap data files the lap time and validity are derived from when rebuilding
+LAP_COLUMNS = ('currentLapNum', 'currentLapTime', 'currentLapInvalid')
+
+# Serializes updates of catalog files by PacketSavers in this process, SessionCatalog._lock also serializes them
+# between processes
+_catalog_lock = threading.Lock()
+
+
+class SessionEntry:
+	"""
+	SessionEntry is the catalog entry of one session, which PacketSaver keeps up to date while it saves packets.
+	The entry is a dictionary of the following form:
+
+	{
+		'created': '2020-08-01 12:00:00',
+		'source': '192.168.1.10:20777',  (only when the session was recorded by a listener on several ports or games)
+		'session_types': {
+			'timetrial': {
+				'session_type': 12,
+				'track_id': 3,
+				'drivers': {
+					'player': {
+						'1': {'lap_time': 81.234, 'valid': True, 'rows': {'telemetry': 4812, 'motion': 4810, ...},
+							  'missing_frames': {'motion': 3, ...}},
+						...
+					},
+					driver_id: {...}
+				}
+			}
+		}
+	}
+
+	lap_time and valid are None as long as the lap has not been finished. missing_frames counts per lap file the packets
+	that were sent by the game during the lap but never received, it is only present for laps with missed packets. It is
+	restored from missing_frames.csv in the folder of the driver when the catalog is rebuilt.
+	"""
+
+	def __init__(self, entry=None):
+		"""
+		:param entry: Existing entry dictionary, None to start a new entry created now
+		"""
+		self.entry = entry if entry is not None else {
+			'created': datetime.datetime.now().strftime(DATETIME_FORMAT),
+			'session_types': {}
+		}
+
+	def set_source(self, source):
+		self.entry['source'] = source
+
+	def set_session_type(self, name, session_type, track_id=None):
+		session_type_entry = self.entry['session_types'].setdefault(name, {'drivers': {}})
+		session_type_entry['session_type'] = session_type
+		session_type_entry['track_id'] = track_id
+
+	def lap(self, session_type_name, driver, lap_number):
+		"""
+		:return: Entry of the lap, created if it does not exist yet
+		"""
+		laps = self.entry['session_types'][session_type_name]['drivers'].setdefault(str(driver), {})
+		lap = laps.get(str(lap_number))
+		if lap is None:
+			lap = laps[str(lap_number)] = {'lap_time': None, 'valid': None, 'rows': {}}
+		return lap
+
+	def add_rows(self, session_type_name, driver, lap_number, stream, rows=1):
+		lap_rows = self.lap(session_type_name, driver, lap_number)['rows']
+		lap_rows[stream] = lap_rows.get(stream, 0) + rows
+
+	def add_missing_frames(self, session_type_name, driver, lap_number, stream, frames):
+		missing_frames = self.lap(session_type_name, driver, lap_number).setdefault('missing_frames', {})
+		missing_frames[stream] = missing_frames.get(stream, 0) + frames
+
+	def finish_lap(self, session_type_name, driver, lap_number, lap_time, valid):
+		lap = self.lap(session_type_name, driver, lap_number)
+		lap['lap_time'] = lap_time
+		lap['valid'] = valid
+
+
+class SessionCatalog:
+	"""
+	SessionCatalog is an index of all recorded sessions: their session types, and per driver the laps with lap time,
+	validity and the number of rows in each lap file. It is saved as data/catalog.json, so that sessions can be listed
+	without walking the data folder and opening lap files.
+	"""
+
+	def __init__(self, data_path):
+		"""
+		:param data_path: Path of the data folder, e.g. [data_root]/data
+		"""
+		self.data_path = data_path
+		self.path = os.path.join(data_path, CATALOG_FILE)
+
+		# Catalog as last read from disk, with the (mtime, size) of the file at that moment
+		self._catalog = None
+		self._file_state = None
+
+	def exists(self):
+		return os.path.exists(self.path)
+
+	def load(self):
+		"""
+		:return: Catalog dictionary, {'version': ..., 'sessions': {sessionUID: entry}}. Read from disk only when the file
+		has changed since the previous call.
+		"""
+		try:
+			stat = os.stat(self.path)
+		except FileNotFoundError:
+			return {'version': CATALOG_VERSION, 'sessions': {}}
+
+		if self._file_state != (stat.st_mtime_ns, stat.st_size):
+			with open(self.path) as catalog_file:
+				self._catalog = json.load(catalog_file)
+			self._file_state = (stat.st_mtime_ns, stat.st_size)
+
+		return self._catalog
+
+	def sessions(self):
+		"""
+		:return: Dictionary of sessionUID to the entry of that session, see SessionEntry
+		"""
+		return self.load()['sessions']
+
+	def session(self, session_uid):
+		"""
+		:return: Entry of the session, see SessionEntry, None if the session is not in the catalog
+		"""
+		return self.sessions().get(str(session_uid))
+
+	def update_session(self, session_uid, entry):
+		"""
+		Replaces the entry of a session and saves the catalog. The other sessions are re-read from disk first, so that
+		entries saved in the meantime are kept, also by recorders in other processes, which wait for each other.
+		If the catalog does not exist yet, it is first built from the data folder, so that the sessions recorded before
+		the catalog existed are not left out of it.
+		:param session_uid: sessionUID
+		:param entry: Entry dictionary of the session
+		:return:
+		"""
+		with self._lock():
+			catalog = self.load() if self.exists() else self._scan()
+			catalog['sessions'][str(session_uid)] = entry
+			self._save(catalog)
+
+	def rebuild(self):
+		"""
+		Rebuilds the catalog from the files in the data folder, e.g. for data recorded before the catalog existed.
+		Lap times and validity are derived from the saved lap data: the last currentLapTime of the lap and whether
+		currentLapInvalid was set at any point in the lap. They are None when lap data was not saved, or when the lap was
+		not finished.
+		The rebuilt entries are merged with the entries saved in the meantime: their source is kept, as are sessions and
+		session types that have no files yet, e.g. of a recorder that is saving a session while the catalog is rebuilt.
+		:return: The rebuilt catalog dictionary
+		"""
+		catalog = self._scan()
+
+		with self._lock():
+			live_sessions = self.load()['sessions']
+			for session_uid, live_entry in live_sessions.items():
+				entry = catalog['sessions'].setdefault(session_uid, live_entry)
+				if entry is live_entry:
+					continue
+				entry['created'] = live_entry.get('created', entry['created'])
+				if 'source' in live_entry:
+					entry['source'] = live_entry['source']
+				for session_type_name, session_type_entry in live_entry.get('session_types', {}).items():
+					entry['session_types'].setdefault(session_type_name, session_type_entry)
+			self._save(catalog)
+		return catalog
+
+	def _scan(self):
+		"""
+		:return: Catalog dictionary built from the files in the data folder, see rebuild()
+		"""
+		created = self._legacy_session_datetimes()
+
+		catalog = {'version': CATALOG_VERSION, 'sessions': {}}
+		for session_uid in sorted(os.listdir(self.data_path)):
+			session_path = os.path.join(self.data_path, session_uid)
+			if not os.path.isdir(session_path) or not session_uid.isdigit():
+				continue
+
+			if session_uid not in created:
+				created[session_uid] = datetime.datetime.fromtimestamp(os.path.getmtime(session_path)).strftime(DATETIME_FORMAT)
+
+			session_entry = SessionEntry({'created': created[session_uid], 'session_types': {}})
+			for session_type_name in sorted(os.listdir(session_path)):
+				session_type_path = os.path.join(session_path, session_type_name)
+				if os.path.isdir(session_type_path):
+					logging.info(f'Rebuilding catalog of {session_uid}/{session_type_name}')
+					self._rebuild_session_type(session_entry, session_type_name, session_type_path)
+
+			catalog['sessions'][session_uid] = session_entry.entry
+
+		return catalog
+
+	def _rebuild_session_type(self, session_entry, session_type_name, session_type_path):
+		import pandas as pd
+
+		session_type, track_id = None, None
+		session_file_path = os.path.join(session_type_path, 'session.csv')
+		if os.path.exists(session_file_path):
+			session_info = pd.read_csv(session_file_path)
+			if 'sessionType' in session_info:
+				session_type = int(session_info['sessionType'].iloc[0])
+			if 'trackId' in session_info:
+				track_id = int(session_info['trackId'].iloc[0])
+		session_entry.set_session_type(session_type_name, session_type, track_id)
+
+		for driver in sorted(os.listdir(session_type_path)):
+			driver_path = os.path.join(session_type_path, driver)
+			if not os.path.isdir(driver_path):
+				continue
+
+			missing_frames_path = os.path.join(driver_path, MISSING_FRAMES_FILE)
+			if os.path.exists(missing_frames_path):
+				for row in pd.read_csv(missing_frames_path).itertuples(index=False):
+					session_entry.add_missing_frames(session_type_name, driver, int(row.lapNumber), row.stream,
+													 int(row.missingFrames))
+
+			for file_name in sorted(os.listdir(driver_path)):
+				match = LAP_FILE_PATTERN.match(file_name)
+				if match is None:
+					continue
+				lap_number, stream, extension = int(match.group(1)), match.group(2), match.group(3)
+				file_path = os.path.join(driver_path, file_name)
+
+				if stream != 'data':
+					session_entry.add_rows(session_type_name, driver, lap_number, stream, _count_rows(file_path))
+					continue
+
+				# Lap data files also give the lap time and validity
+				if extension == COLUMNAR_SUFFIX:
+					reader = ColumnarReader(file_path)
+					lap_data = reader.columns([c for c in LAP_COLUMNS if c in reader.column_names()])
+					rows = reader.num_rows
+				else:
+					lap_data_frame = pd.read_csv(file_path)
+					lap_data = {c: lap_data_frame[c].to_numpy() for c in LAP_COLUMNS if c in lap_data_frame}
+					rows = len(lap_data_frame)
+
+				session_entry.add_rows(session_type_name, driver, lap_number, stream, rows)
+
+				if all(c in lap_data for c in LAP_COLUMNS):
+					self._rebuild_lap(session_entry, session_type_name, driver, lap_number, lap_data)
+
+	@staticmethod
+	def _rebuild_lap(session_entry, session_type_name, driver, lap_number, lap_data):
+		"""
+		Sets the lap time and validity of a lap from its lap data. The last row of a finished lap already has the next
+		currentLapNum, the rows before it belong to the lap itself.
+		"""
+		lap_rows = lap_data['currentLapNum'] == lap_number
+		finished = (lap_data['currentLapNum'] > lap_number).any()
+		if lap_number > 0 and finished and lap_rows.any():
+			session_entry.finish_lap(session_type_name, driver, lap_number,
+									 float(lap_data['currentLapTime'][lap_rows].max()),
+									 not lap_data['currentLapInvalid'][lap_rows].any())
+
+	def _legacy_session_datetimes(self):
+		"""
+		:return: Dictionary of sessionUID to datetime string, from the sessions.csv that was saved before the catalog
+		"""
+		sessions_file_path = os.path.join(self.data_path, 'sessions.csv')
+		created = {}
+		if os.path.exists(sessions_file_path):
+			with open(sessions_file_path) as sessions_file:
+				next(sessions_file, None)
+				for line in sessions_file:
+					values = line.strip().split(',')
+					if len(values) == 2:
+						created[values[1]] = values[0]
+		return created
+
+	@contextlib.contextmanager
+	def _lock(self):
+		"""
+		Holds the lock of the catalog, of threads in this process and of other processes, with a lock file next to the
+		catalog.
+		"""
+		os.makedirs(self.data_path, exist_ok=True)
+		with _catalog_lock, open(self.path + '.lock', 'a+b') as lock_file:
+			if fcntl is not None:
+				fcntl.flock(lock_file, fcntl.LOCK_EX)
+			else:
+				# Locks the first byte of the file, msvcrt raises after trying for 10 seconds
+				lock_file.seek(0)
+				while True:
+					try:
+						msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+						break
+					except OSError:
+						continue
+			try:
+				yield
+			finally:
+				if fcntl is not None:
+					fcntl.flock(lock_file, fcntl.LOCK_UN)
+				else:
+					lock_file.seek(0)
+					msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+	def _save(self, catalog):
+		# Write to a temporary file first, so that readers never see a partially written catalog
+		os.makedirs(self.data_path, exist_ok=True)
+		tmp_path = self.path + '.tmp'
+		with open(tmp_path, 'w') as catalog_file:
+			json.dump(catalog, catalog_file, indent='\t')
+		os.replace(tmp_path, self.path)
+
+		self._catalog = catalog
+		stat = os.stat(self.path)
+		self._file_state = (stat.st_mtime_ns, stat.st_size)
+
+
+def _count_rows(path):
+	"""
+	:param path: Path of a csv lap file, compressed or not, or a columnar lap folder
+	:return: Number of rows in the lap file
+	"""
+	if path.endswith(COLUMNAR_SUFFIX):
+		return ColumnarReader(path).num_rows
+
+	# Number of lines minus the header line
+	with open_file(path) as f:
+		return max(sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b'')) - 1, 0)
@@ -0,0 +1,197 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from src.storage.compression import CODEC_SUFFIXES, read_bytes
+
+# Columnar lap files are folders, e.g. lap3_telemetry.col, with a schema.json header and one raw binary file per column
+COLUMNAR_SUFFIX = '.col'
+SCHEMA_FILE = 'schema.json'
+SCHEMA_VERSION = 1
+
+# Every row starts with the header fields that identify the packet it came from
+HEADER_COLUMNS = [('sessionTime', '<f4', []), ('frameIdentifier', '<u4', [])]
+
+
+def columnar_path(path):
+	"""
+	:param path: Path of a lap file without extension, e.g. [...]/player/lap3_telemetry
+	:return: Path of the columnar folder of that lap file
+	"""
+	return path + COLUMNAR_SUFFIX
+
+
+def schema_from_dtype(structure_dtype, fields, packet_config_key):
+	"""
+	Creates the schema of a columnar lap file from the dtype of a structure and the fields that are saved of it.
+	Fixed size arrays, like the 4 values per wheel, keep their shape and become 2D columns.
+	:param structure_dtype: numpy structured dtype, e.g. of CarTelemetryData_V1
+	:param fields: Fields of the structure to save, as specified in packet_keys.ini
+	:param packet_config_key: Key of the fields in packet_keys.ini
+	:return: Schema dictionary as saved in schema.json
+	"""
+	columns = [{'name': name, 'dtype': dtype, 'shape': shape} for name, dtype, shape in HEADER_COLUMNS]
+	for f in fields:
+		field_dtype = structure_dtype.fields[f][0]
+		base, shape = (field_dtype.base, list(field_dtype.shape)) if field_dtype.subdtype else (field_dtype, [])
+		columns.append({'name': f, 'dtype': base.str, 'shape': shape})
+
+	return {'version': SCHEMA_VERSION, 'packet_config': packet_config_key, 'columns': columns}
+
+
+class ColumnarWriter:
+	"""
+	ColumnarWriter appends the rows of one lap file to per column binary files.
+	Rows are buffered as the raw bytes of the structure they come from and converted to columns when flushed.
+	"""
+
+	def __init__(self, path, structure_dtype, fields, packet_config_key, buffer_rows=256, flush_interval=1.):
+		"""
+		Opens the columnar folder at path, creates it and its schema.json if it does not exist yet.
+		:param path: Path of the columnar folder
+		:param structure_dtype: numpy structured dtype of the rows
+		:param fields: Fields of the structure to save
+		:param packet_config_key: Key of the fields in packet_keys.ini
+		:param buffer_rows: Number of rows to buffer before writing to disk
+		:param flush_interval: Maximum number of seconds rows are kept in the buffer
+		"""
+		self.path = path
+		self.schema = schema_from_dtype(structure_dtype, fields, packet_config_key)
+
+		os.makedirs(path, exist_ok=True)
+		schema_path = os.path.join(path, SCHEMA_FILE)
+		if os.path.exists(schema_path):
+			with open(schema_path) as schema_file:
+				if json.load(schema_file)['columns'] != self.schema['columns']:
+					raise ValueError(f'Schema of {path} does not match the current packet config.')
+		else:
+			with open(schema_path, 'w') as schema_file:
+				json.dump(self.schema, schema_file, indent='\t')
+
+		self._structure_dtype = structure_dtype
+		self._fields = fields
+		self._files = {c['name']: open(os.path.join(path, c['name'] + '.bin'), 'ab') for c in self.schema['columns']}
+
+		self._buffer_rows = buffer_rows
+		self._flush_interval = flush_interval
+
+		self._session_times = []
+		self._frame_identifiers = []
+		self._records = bytearray()
+		self._last_flush = time.monotonic()
+
+	def write(self, session_time, frame_identifier, structure):
+		"""
+		Adds a row to the buffer, flushes the buffer to disk if one of the thresholds is reached.
+		:param session_time: sessionTime from the packet header
+		:param frame_identifier: frameIdentifier from the packet header
+		:param structure: ctypes structure or numpy record with dtype structure_dtype
+		:return:
+		"""
+		self._session_times.append(session_time)
+		self._frame_identifiers.append(frame_identifier)
+		self._records += bytes(structure)
+
+		if len(self._session_times) >= self._buffer_rows or time.monotonic() - self._last_flush >= self._flush_interval:
+			self.flush()
+
+	def flush(self):
+		"""
+		Writes the buffered rows to the column files.
+		:return:
+		"""
+		if self._session_times:
+			self._files['sessionTime'].write(np.asarray(self._session_times, dtype='<f4').tobytes())
+			self._files['frameIdentifier'].write(np.asarray(self._frame_identifiers, dtype='<u4').tobytes())
+
+			records = np.frombuffer(self._records, dtype=self._structure_dtype)
+			for f in self._fields:
+				self._files[f].write(np.ascontiguousarray(records[f]).tobytes())
+
+			for column_file in self._files.values():
+				column_file.flush()
+
+			self._session_times = []
+			self._frame_identifiers = []
+			self._records = bytearray()
+		self._last_flush = time.monotonic()
+
+	def flush_if_due(self):
+		if time.monotonic() - self._last_flush >= self._flush_interval:
+			self.flush()
+
+	def close(self):
+		self.flush()
+		for column_file in self._files.values():
+			column_file.close()
+
+
+class ColumnarReader:
+	"""
+	ColumnarReader memory-maps the columns of a columnar lap file. Columns of a lap file that has been compressed, see
+	compress_columnar, are decompressed into memory instead.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		with open(os.path.join(path, SCHEMA_FILE)) as schema_file:
+			self.schema = json.load(schema_file)
+
+		self._columns = {c['name']: c for c in self.schema['columns']}
+
+		self.codec = self.schema['compression']['codec'] if 'compression' in self.schema else None
+		if self.codec is not None:
+			self.num_rows = self.schema['compression']['num_rows']
+		else:
+			# A row only counts if all its columns have been written
+			self.num_rows = min(os.path.getsize(self._column_path(name)) // self._dtype(name).itemsize
+								for name in self._columns)
+
+	def _column_path(self, name):
+		path = os.path.join(self.path, name + '.bin')
+		return path if self.codec is None else path + CODEC_SUFFIXES[self.codec]
+
+	def _dtype(self, name):
+		return np.dtype((self._columns[name]['dtype'], tuple(self._columns[name]['shape'])))
+
+	def column_names(self):
+		return list(self._columns)
+
+	def column(self, name):
+		"""
+		:param name: Name of the column
+		:return: Read-only numpy array of the column, memory-mapped from disk unless it is compressed. Array fields have
+		shape (rows, size).
+		"""
+		column = self._columns[name]
+		shape = (self.num_rows, *column['shape'])
+		if self.num_rows == 0:
+			return np.empty(shape, dtype=column['dtype'])
+		if self.codec is not None:
+			return np.frombuffer(read_bytes(self._column_path(name)), dtype=column['dtype'],
+								 count=int(np.prod(shape))).reshape(shape)
+		return np.memmap(self._column_path(name), dtype=column['dtype'], mode='r', shape=shape)
+
+	def columns(self, names=None):
+		"""
+		:param names: Names of the columns, None for all columns
+		:return: Dictionary of column name to memory-mapped array
+		"""
+		return {name: self.column(name) for name in (names if names is not None else self._columns)}
+
+	def to_dataframe(self, names=None):
+		"""
+		Creates a pandas.DataFrame of the columns. Array fields become columns holding one numpy array per row.
+		:param names: Names of the columns, None for all columns
+		:return: pandas.DataFrame object
+		"""
+		import pandas as pd
+
+		data = {}
+		for name, values in self.columns(names).items():
+			# Rows of a plain ndarray view are much cheaper to create than rows of a np.memmap
+			data[name] = list(np.asarray(values)) if values.ndim > 1 else values
+
+		return pd.DataFrame(data)
@@ -0,0 +1,331 @@
+import bz2
+import gzip
+import json
+import logging
+import lzma
+import os
+import queue
+import threading
+import time
+
+# Codec name -> file extension that is appended to the compressed file, pandas infers the codec from this extension
+CODEC_SUFFIXES = {
+	'gzip': '.gz',
+	'bz2': '.bz2',
+	'lzma': '.xz',
+	'zstd': '.zst'
+}
+
+
+def _open(codec, path, mode, level=None):
+	"""
+	Opens a compressed file in binary mode.
+	:param codec: One of CODEC_SUFFIXES
+	:param path: Path of the compressed file
+	:param mode: 'rb' or 'wb'
+	:param level: Compression level when writing, None for the default level of the codec
+	:return: File object
+	"""
+	if codec == 'gzip':
+		return gzip.open(path, mode, compresslevel=9 if level is None else level)
+	if codec == 'bz2':
+		return bz2.open(path, mode, compresslevel=9 if level is None else level)
+	if codec == 'lzma':
+		return lzma.open(path, mode, preset=level)
+	if codec == 'zstd':
+		# zstandard is optional, it is only needed when zstd is configured
+		import zstandard
+		if 'w' in mode:
+			return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=3 if level is None else level))
+		return zstandard.open(path, mode)
+	raise ValueError(f'Unknown compression codec {codec}, must be one of {tuple(CODEC_SUFFIXES)}.')
+
+
+def find_compressed(path):
+	"""
+	:param path: Path of an uncompressed file, e.g. [...]/player/lap3_telemetry.csv
+	:return: Codec and path of the compressed version of the file, (None, None) if there is none
+	"""
+	for codec, suffix in CODEC_SUFFIXES.items():
+		if os.path.exists(path + suffix):
+			return codec, path + suffix
+	return None, None
+
+
+def codec_of(path):
+	"""
+	:param path: Path of a file
+	:return: Codec the file is compressed with according to its extension, None if it is not compressed
+	"""
+	return next((codec for codec, suffix in CODEC_SUFFIXES.items() if path.endswith(suffix)), None)
+
+
+def open_file(path):
+	"""
+	Opens a file for reading in binary mode, decompressing it if its extension is one of CODEC_SUFFIXES.
+	:param path: Path of the file
+	:return: File object
+	"""
+	codec = codec_of(path)
+	return open(path, 'rb') if codec is None else _open(codec, path, 'rb')
+
+
+def read_bytes(path):
+	"""
+	:param path: Path of a file, compressed or not
+	:return: Decompressed contents of the file
+	"""
+	with open_file(path) as f:
+		return f.read()
+
+
+def compress_file(path, codec='gzip', level=None):
+	"""
+	Compresses a file to path + the suffix of codec and removes the original. The compressed file is written under a
+	temporary name first, so that readers never see a partially written file.
+	:param path: Path of the file
+	:param codec: One of CODEC_SUFFIXES
+	:param level: Compression level, None for the default level of the codec
+	:return: Size in bytes of the file before and after compression
+	"""
+	compressed_path = path + CODEC_SUFFIXES[codec]
+	if os.path.exists(compressed_path):
+		# The file was written to again after it was compressed, e.g. a session that was recorded twice
+		logging.warning(f'{compressed_path} already exists, leaving {path} uncompressed.')
+		size = os.path.getsize(path)
+		return size, size
+
+	tmp_path = compressed_path + '.tmp'
+	with open(path, 'rb') as source, _open(codec, tmp_path, 'wb', level) as target:
+		for chunk in iter(lambda: source.read(1 << 20), b''):
+			target.write(chunk)
+	os.replace(tmp_path, compressed_path)
+
+	size = os.path.getsize(path)
+	os.remove(path)
+	return size, os.path.getsize(compressed_path)
+
+
+def decompress_file(compressed_path, remove=True):
+	"""
+	Decompresses a file compressed with compress_file back to its original path and removes the compressed file, e.g.
+	to append to a lap file again. The file is written under a temporary name first, so that readers never see a
+	partially written file.
+	:param compressed_path: Path of the compressed file, ending with one of CODEC_SUFFIXES
+	:param remove: Whether to remove the compressed file
+	:return: Path of the decompressed file
+	"""
+	path = compressed_path[:-len(CODEC_SUFFIXES[codec_of(compressed_path)])]
+	tmp_path = path + '.tmp'
+	with open_file(compressed_path) as source, open(tmp_path, 'wb') as target:
+		for chunk in iter(lambda: source.read(1 << 20), b''):
+			target.write(chunk)
+	os.replace(tmp_path, path)
+	if remove:
+		os.remove(compressed_path)
+	return path
+
+
+def compress_columnar(path, codec='gzip', level=None):
+	"""
+	Compresses every column file of a columnar lap folder. Compressed columns cannot be memory-mapped, so the codec and
+	the number of rows are saved in schema.json for ColumnarReader, which then decompresses the columns into memory.
+	:param path: Path of the columnar folder
+	:param codec: One of CODEC_SUFFIXES
+	:param level: Compression level, None for the default level of the codec
+	:return: Size in bytes of the column files before and after compression
+	"""
+	# Imported here, columnar imports this module to read compressed columns
+	from src.storage.columnar import SCHEMA_FILE, ColumnarReader
+
+	reader = ColumnarReader(path)
+	if 'compression' in reader.schema:
+		logging.warning(f'{path} is already compressed.')
+		return 0, 0
+
+	schema = dict(reader.schema, compression={'codec': codec, 'num_rows': reader.num_rows})
+	before, after = 0, 0
+	for name in reader.column_names():
+		column_before, column_after = compress_file(os.path.join(path, name + '.bin'), codec, level)
+		before += column_before
+		after += column_after
+
+	tmp_path = os.path.join(path, SCHEMA_FILE + '.tmp')
+	with open(tmp_path, 'w') as schema_file:
+		json.dump(schema, schema_file, indent='\t')
+	os.replace(tmp_path, os.path.join(path, SCHEMA_FILE))
+
+	return before, after
+
+
+def decompress_columnar(path):
+	"""
+	Decompresses the column files of a columnar lap folder compressed with compress_columnar and removes the codec from
+	schema.json, so that rows can be appended to it again.
+	:param path: Path of the columnar folder
+	:return:
+	"""
+	from src.storage.columnar import SCHEMA_FILE, ColumnarReader
+
+	reader = ColumnarReader(path)
+	if reader.codec is None:
+		return
+
+	compressed_paths = [os.path.join(path, name + '.bin' + CODEC_SUFFIXES[reader.codec]) for name in reader.column_names()]
+	# The compressed columns are only removed once schema.json no longer refers to them, so readers never miss them
+	for compressed_path in compressed_paths:
+		decompress_file(compressed_path, remove=False)
+
+	schema = {key: value for key, value in reader.schema.items() if key != 'compression'}
+	tmp_path = os.path.join(path, SCHEMA_FILE + '.tmp')
+	with open(tmp_path, 'w') as schema_file:
+		json.dump(schema, schema_file, indent='\t')
+	os.replace(tmp_path, os.path.join(path, SCHEMA_FILE))
+
+	for compressed_path in compressed_paths:
+		os.remove(compressed_path)
+
+
+def reopen_lap_file(path):
+	"""
+	Decompresses a lap file that has been compressed, so that rows can be appended to it again. Called before a lap file
+	is opened for writing, e.g. when a session resumes after its PacketSaver was closed, or when the lap number goes back
+	after a flashback. Otherwise the appended rows would end up next to the compressed file as a second, partial lap file.
+	:param path: Path of a csv lap file or columnar lap folder
+	:return: Whether the lap file was decompressed
+	"""
+	if os.path.isdir(path):
+		from src.storage.columnar import SCHEMA_FILE
+
+		with open(os.path.join(path, SCHEMA_FILE)) as schema_file:
+			if 'compression' not in json.load(schema_file):
+				return False
+		decompress_columnar(path)
+	else:
+		_, compressed_path = find_compressed(path)
+		if compressed_path is None:
+			return False
+		decompress_file(compressed_path)
+
+	logging.info(f'Decompressed {path} to append to it.')
+	return True
+
+
+class LapCompressor:
+	"""
+	LapCompressor compresses finished lap files on a background thread, so that the recorder does not wait for it.
+	Lap files are csv files or columnar folders. The codecs in the standard library release the GIL while compressing,
+	so compressing does not hold up receiving and saving packets.
+	"""
+
+	def __init__(self, codec='gzip', level=None):
+		"""
+		:param codec: One of CODEC_SUFFIXES
+		:param level: Compression level, None for the default level of the codec
+		"""
+		if codec not in CODEC_SUFFIXES:
+			raise ValueError(f'Unknown compression codec {codec}, must be one of {tuple(CODEC_SUFFIXES)}.')
+		if codec == 'zstd':
+			# Fail now rather than on the first finished lap when the optional zstandard package is missing
+			import zstandard
+		self.codec = codec
+		self.level = level
+
+		# Counters, see stats()
+		self._files = 0
+		self._bytes_before = 0
+		self._bytes_after = 0
+		self._seconds = 0.
+		self._errors = 0
+
+		# Paths that are queued or being compressed, see cancel()
+		self._pending = set()
+		self._active = None
+		self._condition = threading.Condition()
+
+		self._queue = queue.Queue()
+		self._thread = threading.Thread(target=self._run, name='LapCompressor', daemon=True)
+		self._thread.start()
+
+	def submit(self, paths):
+		"""
+		Queues lap files for compression. The files must not be written to anymore.
+		:param paths: Paths of csv lap files or columnar lap folders
+		:return:
+		"""
+		with self._condition:
+			self._pending.update(paths)
+		for path in paths:
+			self._queue.put(path)
+
+	def cancel(self, path):
+		"""
+		Cancels the compression of a lap file that is about to be written to again, e.g. when the lap number goes back
+		after a flashback. Waits if the file is being compressed right now, so that it can be decompressed afterwards,
+		see reopen_lap_file.
+		:param path: Path of a csv lap file or columnar lap folder
+		:return:
+		"""
+		with self._condition:
+			self._pending.discard(path)
+			self._condition.wait_for(lambda: self._active != path)
+
+	def _run(self):
+		while True:
+			path = self._queue.get()
+			if path is None:
+				return
+
+			with self._condition:
+				if path not in self._pending:
+					# Cancelled
+					continue
+				self._pending.discard(path)
+				self._active = path
+
+			start = time.perf_counter()
+			try:
+				if os.path.isdir(path):
+					before, after = compress_columnar(path, self.codec, self.level)
+				else:
+					before, after = compress_file(path, self.codec, self.level)
+			except (OSError, ValueError) as e:
+				logging.error(f'Could not compress {path}: {e}')
+				self._errors += 1
+				continue
+			finally:
+				with self._condition:
+					self._active = None
+					self._condition.notify_all()
+
+			self._files += 1
+			self._bytes_before += before
+			self._bytes_after += after
+			self._seconds += time.perf_counter() - start
+
+	def stats(self):
+		"""
+		:return: Dictionary with the number of compressed lap files, their size before and after compression in bytes,
+		the seconds spent compressing, the number of files that could not be compressed and the files still queued
+		"""
+		return {
+			'files': self._files,
+			'bytes_before': self._bytes_before,
+			'bytes_after': self._bytes_after,
+			'seconds': self._seconds,
+			'errors': self._errors,
+			'queued': self._queue.qsize()
+		}
+
+	def close(self):
+		"""
+		Compresses the lap files that are still queued and stops the thread.
+		:return:
+		"""
+		self._queue.put(None)
+		self._thread.join()
+
+		stats = self.stats()
+		if stats['files']:
+			logging.info(f'Compressed {stats["files"]} lap files with {self.codec} from {stats["bytes_before"]} to '
+						 f'{stats["bytes_after"]} bytes in {stats["seconds"]:.2f} s.')
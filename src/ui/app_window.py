@@ -1,16 +1,15 @@
 import configparser
 import logging
 import os.path
-import socket
 
 import matplotlib
 from PyQt5 import QtWidgets, QtGui
-from PyQt5.QtCore import pyqtSlot, QObject, pyqtSignal, QThread, QTimer
+from PyQt5.QtCore import pyqtSlot, QObject, QThread, QTimer
 from PyQt5.QtWidgets import QWidget, QTabWidget
-from f1_2020_telemetry.packets import PackedLittleEndianStructure, unpack_udp_packet
 
-from src import packets
+from src import packets, config, sessions
 
+from src.ui.packet_batcher import PacketBatcher
 from src.ui.tabs import *
 
 matplotlib.use('Qt5Agg')
@@ -23,10 +22,12 @@ class AppWindow(QtWidgets.QMainWindow):
 	Which tabs are added depends on the session type and is specified in cfg/ui.ini
 	"""
 
-	def __init__(self, data_root, *args, **kwargs):
+	def __init__(self, data_root, *args, replay_path=None, replay_speed=1., **kwargs):
 		"""
 		Create an AppWindow.
 		:param data_root: Points to the base folder which contains the folders data, cfg and logs.
+		:param replay_path: Path of a capture file to replay instead of listening for live packets
+		:param replay_speed: Replay speed of the capture file, None to replay as fast as possible
 		:param args:
 		:param kwargs:
 		"""
@@ -36,8 +37,17 @@ class AppWindow(QtWidgets.QMainWindow):
 		self.title = 'F1 2020 telemetry tool'
 		self.setWindowTitle(self.title)
 
-		# Create Worker to listen for incoming packets
-		self.packet_listener = PacketListener(data_root)
+		# Received packets are collected here and handed to the tabs in one batch per refresh
+		ui_config = configparser.ConfigParser()
+		ui_config.read(os.path.join(data_root, 'cfg', 'ui.ini'))
+		self.packet_batcher = PacketBatcher(ui_config.getint('batcher', 'max_size', fallback=4096),
+											ui_config.get('batcher', 'overflow', fallback='drop_oldest'))
+
+		# Create Worker to listen for incoming packets, or to replay them from a capture file
+		if replay_path is None:
+			self.packet_listener = PacketListener(data_root, self.packet_batcher)
+		else:
+			self.packet_listener = PacketReplayer(data_root, self.packet_batcher, replay_path, replay_speed)
 
 		# Create QThread on which packet_listener will run
 		self.l_thread = QThread()
@@ -45,54 +55,69 @@ class AppWindow(QtWidgets.QMainWindow):
 
 		# When the thread is started, run packet_listener.listen
 		self.l_thread.started.connect(self.packet_listener.listen)
-		self.packet_listener.received.connect(self.update_data)
 		self.l_thread.start()
 
 		# Create widget with tabs
-		self.tabs_widget = TabsWidget(data_root)
+		self.tabs_widget = TabsWidget(data_root, self.packet_batcher)
 		self.setCentralWidget(self.tabs_widget)
 
 		# Show this window
 		self.showMaximized()
 
-	@pyqtSlot(PackedLittleEndianStructure)
-	def update_data(self, packet):
+	def closeEvent(self, event):
 		"""
-		Updates the AppWindow with the new data from packet.
-		:param packet: UPD telemetry packet from the F1 game.
+		Stops the PacketListener and waits for it to write its buffered data to disk before closing.
+		:param event:
 		:return:
 		"""
-		self.tabs_widget.update_data(packet)
+		self.packet_listener.quit()
+		self.l_thread.quit()
+		self.l_thread.wait()
+		super().closeEvent(event)
 
 
 class TabsWidget(QTabWidget):
 
-	def __init__(self, data_root):
+	def __init__(self, data_root, packet_batcher=None):
+		"""
+		:param data_root: Points to the base folder which contains the folders data, cfg and logs.
+		:param packet_batcher: PacketBatcher from which new packets are taken on every refresh
+		"""
 		super().__init__()
 
 		self.data_root = data_root
+		self.packet_batcher = packet_batcher
 
 		# Read UI config
 		self.ui_config = configparser.ConfigParser()
 		self.ui_config.read(os.path.join(data_root, 'cfg', 'ui.ini'))
+		sessions.configure_lap_cache(data_root)
 
 		self.session_type = -1
 
 		# Timer for refreshing of active tab
 		self.timer = QTimer()
 		self.timer.setInterval(int(self.ui_config['general']['refresh_rate']))
-		self.timer.timeout.connect(self.redraw_active_tab)
+		self.timer.timeout.connect(self.refresh)
 		self.timer.start()
 
 		# Called when the currently displayed tab changes
 		self.currentChanged.connect(self.tab_changed)
 
 	def update_data(self, packet):
+		self.update_data_batch([packet])
+
+	def update_data_batch(self, packets):
+		"""
+		Passes a batch of packets, in the order they were received, to each tab.
+		:param packets: List of packets
+		:return:
+		"""
 		# TODO: check for event session ended for post screen
 
-		# If it's a session packet, set the session type of the TabsWidget
-		if packet.header.packetId == 1:
-			if packet.sessionType != self.session_type:
+		# If there is a session packet, set the session type of the TabsWidget
+		for packet in packets:
+			if packet.header.packetId == 1 and packet.sessionType != self.session_type:
 				self.session_type = packet.sessionType
 
 				# TODO: remove tabs
@@ -103,15 +128,48 @@ class TabsWidget(QTabWidget):
 				# for t in tab_classes_names:
 				# 	print(eval(t))  # TODO: maybe need to do f'src.ui.tabs.{t}' ?
 
-				t = TelemetryTab()
+				t = TelemetryTab(reference=self._reference_lap())
 
 				self.addTab(t, t.get_title())
 
 				print('tab added')
 
-		# Pass the new packet to each tab
+		# Pass the new packets to each tab
 		for i in range(0, self.count()):
-			self.widget(i).update_data(packet)
+			self.widget(i).update_data_batch(packets)
+
+	def _reference_lap(self):
+		"""
+		:return: ReferenceLap configured in the [telemetry] section of cfg/ui.ini, None to use the best lap of the session
+		"""
+		reference = self.ui_config.get('telemetry', 'reference', fallback='best').strip()
+		if reference == 'best':
+			return None
+
+		try:
+			session_uid, lap_number, *rest = [value.strip() for value in reference.split(',')]
+			session_type = rest[0] if len(rest) > 0 else 'timetrial'
+			driver = rest[1] if len(rest) > 1 else 'player'
+			session_data = sessions.SessionData(int(session_uid), os.path.join(self.data_root, 'data'))
+			return sessions.ReferenceLap.from_session(session_data, int(lap_number), session_type=session_type,
+													  driver=driver)
+		except (ValueError, FileNotFoundError) as e:
+			logging.warning(f'Could not load reference lap {reference}, using the best lap of the session instead: {e}')
+			return None
+
+	@pyqtSlot()
+	def refresh(self):
+		"""
+		Called every refresh_rate ms, passes the packets received since the last refresh to the tabs and redraws the
+		active tab.
+		:return:
+		"""
+		if self.packet_batcher is not None:
+			packets = self.packet_batcher.take()
+			if packets:
+				self.update_data_batch(packets)
+
+		self.redraw_active_tab()
 
 	@pyqtSlot(int)
 	def tab_changed(self, new_index):
@@ -125,42 +183,55 @@ class TabsWidget(QTabWidget):
 
 class PacketListener(QObject):
 	"""
-	PacketListener is a Worker class that listens for F1 2020 UDP packets.
+	PacketListener is a Worker class that runs a LiveRecorder, which listens for F1 2020 UDP packets of one or more games
+	on the ports configured in the [listener] section of cfg/recorder.ini.
+	Received packets are added to a PacketBatcher, from which the GUI takes them.
 	"""
-	received = pyqtSignal(PackedLittleEndianStructure)
 
-	def __init__(self, data_root):
+	def __init__(self, data_root, packet_batcher):
 		super().__init__()
 		self.data_root = data_root
-		self.quit_flag = False
+		self.packet_batcher = packet_batcher
+
+		self.live_recorder = packets.LiveRecorder(data_root, on_packet=packet_batcher.add)
 
 	def listen(self):
-		udp_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
-		udp_socket.bind(("", 20777))
+		self.live_recorder.run()
 
-		# Initial session is whatever
-		curr_session_uid = 0
-		packet_saver = None
+	def stats(self):
+		"""
+		:return: Packet counters, latencies, queue depth and frame gaps of the writer thread, see PacketWriterThread.stats(),
+		with the stats of the PacketBatcher under 'batcher'
+		"""
+		stats = self.live_recorder.stats()
+		stats['batcher'] = self.packet_batcher.stats()
+		return stats
 
-		while not self.quit_flag:
-			udp_packet = udp_socket.recv(2048)
-			packet = unpack_udp_packet(udp_packet)
+	@pyqtSlot()
+	def quit(self):
+		self.live_recorder.quit()
 
-			if curr_session_uid != packet.header.sessionUID:
-				print(f'Creating new session stuff with sessionUID {packet.header.sessionUID}\n and packet {packet}')
-				# Sets logging up and points it to save_path/logs/[sessionUID].log
-				logging.basicConfig(filename=os.path.join(self.data_root, 'logs', f'{packet.header.sessionUID}.log'), level=logging.DEBUG,
-									format='%(asctime)s %(levelname)-8s %(module)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-				packet_saver = packets.PacketSaver(packet.header.sessionUID, self.data_root)
 
-			# Save this sessionUID to be able to check if new one has started
-			curr_session_uid = packet.header.sessionUID
+class PacketReplayer(QObject):
+	"""
+	PacketReplayer is a Worker class that replays a capture file as if the packets were received live.
+	"""
 
-			# Save the packet
-			packet_saver.save(packet)
-			# Emit the packet to GUI
-			self.received.emit(packet)
+	def __init__(self, data_root, packet_batcher, capture_path, speed=1.):
+		"""
+		:param data_root: Points to the base folder which contains the folders data, cfg and logs.
+		:param packet_batcher: PacketBatcher to which the replayed packets are added
+		:param capture_path: Path of the capture file to replay
+		:param speed: Replay speed, None to replay as fast as possible
+		"""
+		super().__init__()
+		self.packet_batcher = packet_batcher
+		decoder = config.RecorderConfig(data_root).get('decoder', 'type', fallback='ctypes')
+		self.replayer = packets.Replayer(capture_path, data_root, speed, decoder)
+
+	def listen(self):
+		self.replayer.run(on_packet=self.packet_batcher.add)
 
 	@pyqtSlot()
 	def quit(self):
-		self.quit_flag = True
+		self.replayer.quit()
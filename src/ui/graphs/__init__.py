@@ -0,0 +1,9 @@
+from .downsampling import LodLine, min_max_indices
+
+
+def __getattr__(name):
+	# TrackMap imports matplotlib, only when it is used
+	if name == 'TrackMap':
+		from .track_map import TrackMap
+		return TrackMap
+	raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,124 @@
+import numpy as np
+
+
+def min_max_indices(y, num_buckets):
+	"""
+	Min/max downsampling: splits the samples into num_buckets buckets of consecutive samples and keeps the smallest and
+	the largest sample of each bucket, and the first and last sample. Drawn as a line, the result looks the same as all
+	samples when there is a bucket per pixel column, peaks such as braking points are never dropped.
+	:param y: 1D array of values
+	:param num_buckets: Number of buckets, usually the width in pixels of the plotted range
+	:return: Sorted 1D array of the indices of the samples to keep, all indices if there are few enough samples
+	"""
+	n = len(y)
+	num_buckets = max(int(num_buckets), 1)
+	if n <= 2 * num_buckets + 2:
+		return np.arange(n)
+
+	# Equally sized buckets can be reduced in one go as a 2D array, the remaining samples form one more bucket
+	size = n // num_buckets
+	full = size * num_buckets
+	y = np.asarray(y, dtype=float)
+	# argmin and argmax return the index of a NaN in a bucket, e.g. a gap in an outer merged lap, instead of its peaks.
+	# NaNs are never the smallest or largest value this way, a bucket of only NaNs gives its first index
+	nan = np.isnan(y)
+	low = np.where(nan, np.inf, y)
+	high = np.where(nan, -np.inf, y)
+	offsets = np.arange(num_buckets) * size
+
+	indices = [[0], np.argmin(low[:full].reshape(num_buckets, size), axis=1) + offsets,
+			   np.argmax(high[:full].reshape(num_buckets, size), axis=1) + offsets, [n - 1]]
+	if full < n:
+		indices.append([full + np.argmin(low[full:]), full + np.argmax(high[full:])])
+
+	return np.unique(np.concatenate(indices))
+
+
+def visible_slice(x, xmin, xmax):
+	"""
+	:param x: 1D array of x values
+	:param xmin: Lower limit of the visible x range
+	:param xmax: Upper limit of the visible x range
+	:return: Indices of the samples in the visible range, including one sample on either side so that lines run to the
+	edges. A slice when x is sorted, otherwise an index array.
+	"""
+	if len(x) < 2 or np.all(x[1:] >= x[:-1]):
+		start = max(np.searchsorted(x, xmin, side='left') - 1, 0)
+		stop = min(np.searchsorted(x, xmax, side='right') + 1, len(x))
+		return slice(start, stop)
+
+	# x can run backwards, e.g. lap distance after a flashback
+	visible = (x >= xmin) & (x <= xmax)
+	visible[:-1] |= visible[1:]
+	visible[1:] |= visible[:-1]
+	return np.flatnonzero(visible)
+
+
+class LodLine:
+	"""
+	LodLine keeps all samples of a matplotlib line and only hands the line a min/max downsampled level of detail of the
+	visible x range, with about two points per pixel column of the axes. The level of detail is recomputed whenever the
+	x limits of the axes change, e.g. on pan and zoom, and when the canvas is resized.
+	"""
+
+	def __init__(self, line, points_per_pixel=1.):
+		"""
+		:param line: matplotlib Line2D to draw the samples with
+		:param points_per_pixel: Buckets per pixel column, each bucket gives at most two points
+		"""
+		self.line = line
+		self.ax = line.axes
+		self.points_per_pixel = points_per_pixel
+
+		self.x = np.empty(0)
+		self.y = np.empty(0)
+
+		self.ax.callbacks.connect('xlim_changed', lambda ax: self.update())
+		self.ax.figure.canvas.mpl_connect('resize_event', lambda event: self.update())
+
+	@classmethod
+	def plot(cls, ax, x, y, *args, points_per_pixel=1., **kwargs):
+		"""
+		Plots a line like ax.plot, but with a level of detail.
+		:return: LodLine object
+		"""
+		lod_line = cls(ax.plot([], [], *args, **kwargs)[0], points_per_pixel=points_per_pixel)
+		lod_line.set_data(x, y)
+		ax.autoscale_view()
+		return lod_line
+
+	def set_data(self, x, y):
+		"""
+		Replaces the samples of the line, the arrays are not copied.
+		:param x: 1D array of x values
+		:param y: 1D array of y values
+		:return:
+		"""
+		self.x = np.asarray(x)
+		self.y = np.asarray(y)
+		self.update(relim=True)
+
+	def update(self, relim=False):
+		"""
+		Sets the level of detail of the visible x range as the data of the line.
+		:param relim: Whether to extend the data limits of the axes to all samples, not only the drawn ones, so that
+		autoscaling shows the whole line
+		:return: Number of points drawn
+		"""
+		if len(self.x) == 0:
+			self.line.set_data(self.x, self.y)
+			return 0
+
+		xmin, xmax = sorted(self.ax.get_xlim())
+		visible = visible_slice(self.x, xmin, xmax)
+		x, y = self.x[visible], self.y[visible]
+
+		keep = min_max_indices(y, self.ax.bbox.width * self.points_per_pixel)
+		self.line.set_data(x[keep], y[keep])
+
+		if relim:
+			finite = np.isfinite(self.x) & np.isfinite(self.y)
+			if finite.any():
+				self.ax.update_datalim([(self.x[finite].min(), self.y[finite].min()),
+										(self.x[finite].max(), self.y[finite].max())])
+		return len(keep)
@@ -0,0 +1,52 @@
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import Normalize
+
+
+class TrackMap:
+	"""
+	TrackMap draws a channel of a lap, e.g. speed, as colors on the centerline of its track. The segments come from the
+	cached TrackGeometry, so their number is bounded by max_segments however long the lap is, and showing another lap
+	or channel only changes the colors.
+	"""
+
+	def __init__(self, ax, geometry, max_segments=1000, cmap='viridis', norm=None, linewidth=5):
+		"""
+		:param ax: matplotlib Axes to draw the map in
+		:param geometry: TrackGeometry of the track
+		:param max_segments: Maximum number of segments of the map
+		:param cmap: Name of the matplotlib colormap
+		:param norm: matplotlib Normalize of the channel values, None to scale to the values of each lap
+		:param linewidth: Width of the track
+		"""
+		self.ax = ax
+		self.geometry = geometry
+		self.max_segments = max_segments
+		self._autoscale = norm is None
+
+		# matplotlib.colormaps does not exist yet in the pinned matplotlib. pyplot is imported here, importing it picks a
+		# backend, which the application window selects itself
+		from matplotlib import pyplot
+
+		self.collection = LineCollection(geometry.segments(max_segments), cmap=pyplot.get_cmap(cmap),
+										 norm=norm if norm is not None else Normalize(), linewidth=linewidth)
+		ax.add_collection(self.collection)
+		ax.autoscale_view()
+		ax.set_aspect('equal', adjustable='datalim')
+		# For some reason, tracks are mirrored so unmirror it by inverting an axis
+		ax.invert_yaxis()
+		ax.tick_params(labelleft=False, left=False, labelbottom=False, bottom=False)
+
+	def set_lap(self, distances, values):
+		"""
+		Colors the map with the values of a lap.
+		:param distances: 1D array, the lap distance of every sample
+		:param values: 1D array, the value of the channel of every sample
+		:return: 1D array with the value of every segment
+		"""
+		segment_values = self.geometry.segment_values(distances, values, self.max_segments)
+		# Segments without samples are not drawn
+		self.collection.set_array(np.ma.masked_invalid(segment_values))
+		if self._autoscale:
+			self.collection.autoscale()
+		return segment_values
@@ -0,0 +1,81 @@
+import collections
+import logging
+import threading
+import time
+
+
+class PacketBatcher:
+	"""
+	PacketBatcher collects the packets received on the listener thread, so that the GUI thread can take them all at once
+	on every refresh, instead of handling a cross-thread signal for every single packet.
+	The batch holds at most max_size packets, e.g. when the GUI thread stalls on a slow redraw or a modal dialog. What
+	happens to a packet that is added to a full batch is determined by the overflow policy:
+		drop_newest: the added packet is dropped
+		drop_oldest: the oldest packet in the batch is dropped to make room for the added one
+	"""
+
+	OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest')
+
+	def __init__(self, max_size=4096, overflow_policy='drop_oldest'):
+		"""
+		:param max_size: Maximum number of packets in the batch
+		:param overflow_policy: One of OVERFLOW_POLICIES
+		"""
+		if overflow_policy not in self.OVERFLOW_POLICIES:
+			raise ValueError(f'Unknown overflow policy {overflow_policy}, must be one of {self.OVERFLOW_POLICIES}.')
+
+		self._max_size = max_size
+		self._overflow_policy = overflow_policy
+		self._packets = self._new_batch()
+		self._lock = threading.Lock()
+
+		# Counters, see stats()
+		self._dropped = 0
+		self._max_batch_size = 0
+		self._last_drop_warning = 0.
+
+	def add(self, packet):
+		"""
+		Adds a packet to the current batch. Called from the thread that receives the packets.
+		:param packet:
+		:return:
+		"""
+		with self._lock:
+			if len(self._packets) >= self._max_size:
+				self._drop()
+				if self._overflow_policy == 'drop_newest':
+					return
+			# With drop_oldest the deque drops its oldest packet itself
+			self._packets.append(packet)
+
+	def _drop(self):
+		self._dropped += 1
+		# Warn at most once per second to not make things worse by logging every dropped packet
+		if time.monotonic() - self._last_drop_warning > 1.:
+			logging.warning(f'Packet batch is full, the GUI is not keeping up, {self._dropped} packets dropped so far.')
+			self._last_drop_warning = time.monotonic()
+
+	def take(self):
+		"""
+		Takes all packets that were added since the last call. Called from the GUI thread.
+		:return: List of packets in the order they were added
+		"""
+		with self._lock:
+			packets, self._packets = self._packets, self._new_batch()
+		if len(packets) > self._max_batch_size:
+			self._max_batch_size = len(packets)
+		return list(packets)
+
+	def _new_batch(self):
+		return collections.deque(maxlen=self._max_size if self._overflow_policy == 'drop_oldest' else None)
+
+	def stats(self):
+		"""
+		:return: Dictionary with the number of packets in the current batch, the largest batch taken so far and the number
+		of packets dropped because the batch was full
+		"""
+		return {
+			'batch_size': len(self._packets),
+			'max_batch_size': self._max_batch_size,
+			'dropped': self._dropped
+		}
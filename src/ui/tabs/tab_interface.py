@@ -17,3 +17,12 @@ class Tab(type(QTabWidget)):
 	@abc.abstractmethod
 	def update_data(self, packet: PackedLittleEndianStructure):
 		raise NotImplementedError
+
+	@abc.abstractmethod
+	def update_data_batch(self, packets):
+		"""
+		Called once per refresh with all packets received since the previous refresh, in order.
+		:param packets: List of packets
+		:return:
+		"""
+		raise NotImplementedError
@@ -1,18 +1,69 @@
 import logging
 import math
 
+import numpy as np
 from PyQt5 import QtWidgets
-from PyQt5.QtWidgets import QWidget, QListWidget
+from PyQt5.QtWidgets import QWidget, QListWidget, QLabel
 
+from src.sessions import ReferenceLap
+from src.ui.graphs import LodLine
 from src.ui.tabs.tab_interface import Tab
 
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
 from matplotlib.figure import Figure
 
 
+class LapBuffer:
+	"""
+	LapBuffer holds the telemetry of one lap in preallocated numpy arrays. Each sample is the lap distance together with
+	the value of each attribute at that moment.
+	"""
+
+	# The game sends telemetry at up to 60Hz, at an average speed of ~50m/s that is a bit over one sample per metre
+	SAMPLES_PER_METRE = 2
+	DEFAULT_CAPACITY = 8192
+
+	def __init__(self, num_attrs, track_length=-1):
+		"""
+		:param num_attrs: Number of attributes per sample
+		:param track_length: Length of the track in metres, used to size the buffer, -1 if unknown
+		"""
+		capacity = int(track_length * self.SAMPLES_PER_METRE) if track_length > 0 else self.DEFAULT_CAPACITY
+		self.x = np.empty(capacity, dtype=np.float32)
+		self.ys = np.empty((num_attrs, capacity), dtype=np.float32)
+		self.size = 0
+
+	def append(self, x, ys):
+		"""
+		Adds a sample, doubles the capacity when the buffer is full.
+		:param x: Lap distance
+		:param ys: Value of each attribute
+		:return:
+		"""
+		if self.size == len(self.x):
+			self.x = np.concatenate((self.x, np.empty_like(self.x)))
+			self.ys = np.concatenate((self.ys, np.empty_like(self.ys)), axis=1)
+
+		self.x[self.size] = x
+		self.ys[:, self.size] = ys
+		self.size += 1
+
+
 class TelemetryTab(QWidget):
+	"""
+	TelemetryTab shows the telemetry of the current lap and the live delta time to a reference lap, which is either a
+	fixed lap, e.g. loaded with ReferenceLap.from_session, or the fastest valid lap driven so far in this session.
+	The laps and the best lap are cleared when a new session starts or the track changes. A fixed lap that was driven on
+	another track than the current one is not used, the best lap of the session is used instead.
+	"""
 
-	def __init__(self):
+	# Range of the delta time graph in seconds, above and below zero
+	DELTA_LIMIT = 2.
+
+	def __init__(self, reference=None):
+		"""
+		:param reference: ReferenceLap to compare against, None to compare against the best lap of this session
+		"""
 		super().__init__()
 
 		# Layout to which QWidgets can be added
@@ -22,14 +73,36 @@ class TelemetryTab(QWidget):
 		self.cur_lap_number = 0
 		self.track_length = -1
 
+		# Last received lap distance of the player, telemetry samples are plotted at this distance
+		self.lap_distance = 0.
+
 		self.lap_times = []
 
 		self.attrs = ['speed', 'throttle', 'brake', 'gear']
-		# y values for each attribute, for each lap
-		self.ys = [[[], [], [], []]]
+		# LapBuffer for each lap number
+		self.laps = {}
 
-		# x is the distance into the lap
-		self.lap_distance_x = [[]]
+		# Session and track of the received packets, None until known
+		self.session_uid = None
+		self.track_id = None
+
+		# Reference lap the delta time is computed to, replaced by every new best lap unless it was given
+		self.configured_reference = reference
+		self.reference = reference
+		self.fixed_reference = reference is not None
+		self.best_lap_time = None
+		# Lap distance and time into the lap of every lap data packet of the current lap, the reference lap when it
+		# turns out to be the best lap
+		self.cur_lap_distances = []
+		self.cur_lap_times = []
+		self.cur_lap_invalid = 0
+		# Last delta time to the reference lap, None when there is no reference lap yet
+		self.delta = None
+		# LapBuffer of the delta time for each lap number
+		self.deltas = {}
+
+		# Set when new data has arrived since the last redraw
+		self.dirty = False
 
 		# Elements are added in order
 		self._create_lap_list()
@@ -39,75 +112,238 @@ class TelemetryTab(QWidget):
 
 	def _create_mpl_canvas(self):
 		self.figure = Figure(figsize=(10, 10))
-		self.axes = self.figure.subplots(4, 1, sharex='all')
+		self.axes = self.figure.subplots(5, 1, sharex='all')
 
 		# Set ylims for the graphs
 		self.axes[0].set_ylim(ymin=0, ymax=375)
 		self.axes[1].set_ylim(ymin=0, ymax=1)
 		self.axes[2].set_ylim(ymin=0, ymax=1)
 		self.axes[3].set_ylim(ymin=0, ymax=8)
+		self.axes[4].set_ylim(ymin=-self.DELTA_LIMIT, ymax=self.DELTA_LIMIT)
+		self.axes[4].axhline(0, color='grey', linewidth=.5)
 
 		# TODO: labels
 		# for i, attr in enumerate(self.attr):
 		# 	self.axes[i].set_ylabel()
 
-		self.plots = [None, None, None, None]
+		# The lines are animated, they are left out of full draws and drawn on top of the cached background instead
+		self.plots = [ax.plot([], [], animated=True)[0] for ax in self.axes]
 
 		# Create Matplotlib canvas
 		self.canvas = FigureCanvasQTAgg(self.figure)
 
+		# Only a min/max downsampled level of detail of the lap is handed to the lines, about two points per pixel column.
+		# Created after the canvas, LodLine connects to the resize events of the canvas the figure has at that moment
+		self.lod_lines = [LodLine(line) for line in self.plots]
+
+		# Static parts of the figure, captured after every full draw, e.g. on resize or when the x limits change
+		self.background = None
+		self.canvas.mpl_connect('draw_event', self._on_draw)
+
 		self.layout.addWidget(self.canvas, 4)
 
 	def _create_lap_list(self):
+		left_layout = QtWidgets.QVBoxLayout()
+
+		# Delta time to the reference lap, updated on every redraw
+		self.delta_label = QLabel()
+		font = self.delta_label.font()
+		font.setPointSize(28)
+		self.delta_label.setFont(font)
+		self.reference_label = QLabel()
+		self._update_delta_labels()
+		left_layout.addWidget(self.delta_label)
+		left_layout.addWidget(self.reference_label)
+
 		self.lap_list = QListWidget()
 
 		font = self.lap_list.font()
 		font.setPointSize(22)
-		self.lap_list.setFont(22)
+		self.lap_list.setFont(font)
+
+		left_layout.addWidget(self.lap_list)
+		self.layout.addLayout(left_layout, 1)
+
+	def _update_delta_labels(self):
+		self.delta_label.setText('\u0394 -' if self.delta is None else f'\u0394 {self.delta:+.3f}')
+		if self.reference is None:
+			self.reference_label.setText('No reference lap yet')
+		else:
+			lap_time = f', {format_lap_time(self.reference.lap_time)}' if self.reference.lap_time else ''
+			self.reference_label.setText(f'Reference: {self.reference.label}{lap_time}')
 
-		self.layout.addWidget(self.lap_list, 1)
+	def _lap_buffer(self, lap_number):
+		if lap_number not in self.laps:
+			self.laps[lap_number] = LapBuffer(len(self.attrs), self.track_length)
+		return self.laps[lap_number]
+
+	def _delta_buffer(self, lap_number):
+		if lap_number not in self.deltas:
+			self.deltas[lap_number] = LapBuffer(1, self.track_length)
+		return self.deltas[lap_number]
+
+	def _finish_lap(self, lap_time):
+		"""
+		Called when the current lap has been completed, makes it the reference lap if it is the best valid lap so far.
+		:param lap_time: Time of the completed lap
+		:return:
+		"""
+		if self.cur_lap_invalid or lap_time <= 0:
+			return
+		if self.best_lap_time is None or lap_time < self.best_lap_time:
+			self.best_lap_time = lap_time
+			if not self.fixed_reference:
+				self.reference = ReferenceLap(self.cur_lap_distances, self.cur_lap_times, lap_time=lap_time,
+											  label=f'best lap, lap {self.cur_lap_number}', track_id=self.track_id)
+
+	def _reset_laps(self):
+		"""
+		Clears the laps and the best lap, called when a new session starts or the track changes.
+		:return:
+		"""
+		self.cur_lap_number = 0
+		self.laps = {}
+		self.deltas = {}
+		self.lap_list.clear()
+		self.best_lap_time = None
+		self.cur_lap_distances = []
+		self.cur_lap_times = []
+		self.cur_lap_invalid = 0
+		self.delta = None
+		if not self.fixed_reference:
+			self.reference = None
+		self.dirty = True
+
+	def _set_track(self, track_id):
+		"""
+		Uses the configured reference lap if it was driven on track_id, otherwise the best lap of the session.
+		:param track_id: trackId of the session packets
+		:return:
+		"""
+		self.track_id = track_id
+		configured = self.configured_reference
+		if configured is None:
+			return
+
+		if configured.track_id is not None and configured.track_id != track_id:
+			logging.warning(f'Reference lap {configured.label} was driven on track {configured.track_id}, not on track '
+							f'{track_id}, using the best lap of the session instead.')
+			self.fixed_reference = False
+			self.reference = None
+		else:
+			self.fixed_reference = True
+			self.reference = configured
 
 	def update_data(self, packet):
+		if packet.header.sessionUID != self.session_uid:
+			# A new session, the track is known again from its first session packet
+			if self.session_uid is not None:
+				self._reset_laps()
+			self.session_uid = packet.header.sessionUID
+			self.track_id = None
+
 		if packet.header.packetId == 1:
-			# Session packet, has track length data
+			# Session packet, has track and track length data
+			if self.track_id != packet.trackId:
+				if self.track_id is not None:
+					self._reset_laps()
+				self._set_track(packet.trackId)
+				self.dirty = True
+
 			if self.track_length != packet.trackLength:
 				self.track_length = packet.trackLength
 				self.axes[0].set_xlim(xmin=0, xmax=self.track_length)
+				# Axes changed, the cached background is no longer valid
+				self.background = None
+				self.dirty = True
 		elif packet.header.packetId == 2:
 			# Lap data packet, has current lap number and lap distance
-			self.lap_distance_x[self.cur_lap_number].append(packet.lapData[packet.header.playerCarIndex].lapDistance)
-			# If a new lap has been started, and the previous lap was lap >0, add it to the lap list
-			if self.cur_lap_number != packet.lapData[packet.header.playerCarIndex].currentLapNum and self.cur_lap_number > 0:
-				self.ys.append([[], [], [], []])
-				self.lap_distance_x.append([])
+			lap_data = packet.lapData[packet.header.playerCarIndex]
+			self.lap_distance = lap_data.lapDistance
 
-				last_lap_time = packet.lapData[packet.header.playerCarIndex].lastLapTime
-				last_lap_time_min = math.floor(last_lap_time / 60)
-				last_lap_time_s = math.floor(last_lap_time) - last_lap_time_min * 60
-				last_lap_time_ms = last_lap_time % 1
-				last_lap_time_string = f'Lap {self.cur_lap_number}, {last_lap_time_min}:{last_lap_time_s:02}.{last_lap_time_ms:.3f}'
+			if self.cur_lap_number != lap_data.currentLapNum:
+				# If a new lap has been started, and the previous lap was lap >0, add it to the lap list
+				if self.cur_lap_number > 0:
+					last_lap_time = float(lap_data.lastLapTime)
+					self.lap_list.addItem(f'Lap {self.cur_lap_number}, {format_lap_time(last_lap_time)}')
+					self._finish_lap(last_lap_time)
 
-				self.lap_list.addItem(last_lap_time_string)
+				self.cur_lap_number = lap_data.currentLapNum
+				self.cur_lap_distances = []
+				self.cur_lap_times = []
+				self.dirty = True
 
-				self.cur_lap_number = packet.lapData[packet.header.playerCarIndex].currentLapNum
+			lap_time = float(lap_data.currentLapTime)
+			self.cur_lap_distances.append(float(self.lap_distance))
+			self.cur_lap_times.append(lap_time)
+			self.cur_lap_invalid = lap_data.currentLapInvalid
+
+			# A binary search in the reference lap, not a scan of the lap
+			if self.reference is not None:
+				self.delta = self.reference.delta(self.lap_distance, lap_time)
+				if self.delta is not None:
+					self._delta_buffer(self.cur_lap_number).append(self.lap_distance, (self.delta,))
+					self.dirty = True
 		elif packet.header.packetId == 6:
 			# Car telemetry data, has speed, throttle, brake, gear
-			for l, attr in zip(self.ys[self.cur_lap_number], self.attrs):
-				l.append(getattr(packet.carTelemetryData[packet.header.playerCarIndex], attr))
+			telemetry = packet.carTelemetryData[packet.header.playerCarIndex]
+			self._lap_buffer(self.cur_lap_number).append(self.lap_distance, [getattr(telemetry, attr) for attr in self.attrs])
+			self.dirty = True
+
+	def update_data_batch(self, packets):
+		"""
+		Updates the tab with a batch of packets, in the order they were received.
+		:param packets: List of packets
+		:return:
+		"""
+		for packet in packets:
+			self.update_data(packet)
+
+	def _on_draw(self, event):
+		"""
+		Called after every full draw of the canvas, caches the static background and draws the lines on top of it.
+		:param event:
+		:return:
+		"""
+		self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+		self._draw_lines()
+
+	def _draw_lines(self):
+		for ax, line in zip(self.axes, self.plots):
+			ax.draw_artist(line)
 
 	def redraw(self):
-		# Update plots data with new data, when lengths are equal
-		for i in range(len(self.plots)):
-			# The arrays are not guaranteed to be equal size, plot as far as the shortest of the two
-			min_length = min(len(self.ys[self.cur_lap_number][i]), len(self.lap_distance_x[self.cur_lap_number]))
-			if self.plots[i] is None:
-				self.plots[i] = self.axes[i].plot(self.lap_distance_x[self.cur_lap_number][0:min_length],
-												  self.ys[self.cur_lap_number][i][0:min_length])[0]
-			else:
-				self.plots[i].set_xdata(self.lap_distance_x[self.cur_lap_number][0:min_length])
-				self.plots[i].set_ydata(self.ys[self.cur_lap_number][i][0:min_length])
-		self.canvas.draw()
+		# Nothing new since the last redraw
+		if not self.dirty:
+			return
+		self.dirty = False
+
+		lap = self._lap_buffer(self.cur_lap_number)
+		deltas = self._delta_buffer(self.cur_lap_number)
+		# The telemetry attributes are sampled per telemetry packet, the delta time per lap data packet
+		series = [(lap, ys) for ys in lap.ys] + [(deltas, deltas.ys[0])]
+		for lod_line, (buffer, ys) in zip(self.lod_lines, series):
+			lod_line.set_data(buffer.x[:buffer.size], ys[:buffer.size])
+		self._update_delta_labels()
+
+		if self.background is None:
+			# Full draw, _on_draw caches the new background and draws the lines
+			self.canvas.draw()
+		else:
+			# Only re-render the lines on top of the cached background
+			self.canvas.restore_region(self.background)
+			self._draw_lines()
+			self.canvas.blit(self.figure.bbox)
 
 	# TODO: configs for tabs? allows for easier creation of tabs for users?
 	def get_title(self):
 		return 'Telemetry'
+
+
+def format_lap_time(lap_time):
+	"""
+	:param lap_time: Lap time in seconds
+	:return: Lap time as [minutes]:[seconds].[milliseconds]
+	"""
+	minutes = math.floor(lap_time / 60)
+	return f'{minutes}:{lap_time - minutes * 60:06.3f}'
@@ -0,0 +1,17 @@
+import os
+import shutil
+
+import pytest
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def data_root(tmp_path):
+	"""
+	:return: Path of a temporary data root with a copy of the configuration in cfg and empty data and logs folders
+	"""
+	shutil.copytree(os.path.join(REPOSITORY_ROOT, 'cfg'), tmp_path / 'cfg')
+	(tmp_path / 'data').mkdir()
+	(tmp_path / 'logs').mkdir()
+	return str(tmp_path)
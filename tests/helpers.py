@@ -0,0 +1,52 @@
+import ctypes
+import math
+import os
+
+import numpy as np
+from f1_2020_telemetry.packets import HeaderFieldsToPacketType
+
+
+def random_datagram(packet_type, rng):
+	"""
+	:return: A datagram of packet_type with random contents and a valid header.
+	"""
+	packet = packet_type.from_buffer_copy(rng.integers(0, 256, ctypes.sizeof(packet_type), dtype=np.uint8).tobytes())
+	key = next(k for k, t in HeaderFieldsToPacketType.items() if t is packet_type)
+	packet.header.packetFormat, packet.header.packetVersion, packet.header.packetId = key
+	return bytes(packet)
+
+
+def assert_same(ctypes_value, numpy_value, path):
+	"""
+	Recursively asserts that a ctypes value and the corresponding numpy value are the same.
+	"""
+	if isinstance(ctypes_value, (ctypes.Structure, ctypes.Union)):
+		for name, _ in ctypes_value._fields_:
+			assert_same(getattr(ctypes_value, name), numpy_value[name], f'{path}.{name}')
+	elif isinstance(ctypes_value, ctypes.Array):
+		for i, v in enumerate(ctypes_value):
+			assert_same(v, numpy_value[i], f'{path}[{i}]')
+	elif isinstance(ctypes_value, bytes):
+		# ctypes cuts char arrays off at the first null byte, numpy only strips trailing null bytes
+		assert ctypes_value == numpy_value.split(b'\x00', 1)[0], path
+	elif isinstance(ctypes_value, float) and math.isnan(ctypes_value):
+		assert math.isnan(numpy_value), path
+	else:
+		assert ctypes_value == numpy_value, f'{path}: {ctypes_value!r} != {numpy_value!r}'
+
+
+def set_config(data_root, file_name, section, option, value):
+	"""
+	Sets an option of a config file in data_root/cfg, the rest of the file is left as it is.
+	"""
+	path = os.path.join(data_root, 'cfg', file_name)
+	with open(path) as config_file:
+		lines = config_file.read().split('\n')
+
+	start = lines.index(f'[{section}]')
+	end = next((i for i in range(start + 1, len(lines)) if lines[i].startswith('[')), len(lines))
+	option_line = next(i for i in range(start + 1, end) if lines[i].startswith(f'{option}='))
+	lines[option_line] = f'{option}={value}'
+
+	with open(path, 'w') as config_file:
+		config_file.write('\n'.join(lines))
@@ -0,0 +1,85 @@
+import os
+
+from src.storage import SessionCatalog, SessionEntry
+
+
+def write_file(path, content):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, 'w') as f:
+		f.write(content)
+
+
+def recorded_session(data_path, session_uid):
+	"""
+	Writes the files of a session with one finished and one unfinished lap of the player, as PacketSaver saves them.
+	"""
+	session_type_path = os.path.join(data_path, str(session_uid), 'timetrial')
+	write_file(os.path.join(session_type_path, 'session.csv'), 'sessionType,trackId\n12,3\n')
+	write_file(os.path.join(session_type_path, 'player', 'lap1_data.csv'),
+			   'sessionTime,frameIdentifier,currentLapNum,currentLapTime,currentLapInvalid\n'
+			   '0.0,0,1,0.0,0\n1.0,60,1,40.5,0\n2.0,120,1,81.25,0\n2.1,126,2,0.1,0\n')
+	write_file(os.path.join(session_type_path, 'player', 'lap2_data.csv'),
+			   'sessionTime,frameIdentifier,currentLapNum,currentLapTime,currentLapInvalid\n'
+			   '2.1,126,2,0.1,0\n2.5,150,2,0.5,1\n')
+	write_file(os.path.join(session_type_path, 'player', 'lap1_telemetry.csv'),
+			   'sessionTime,frameIdentifier,speed\n0.0,0,100\n1.0,60,200\n2.0,120,150\n')
+	write_file(os.path.join(session_type_path, 'player', 'missing_frames.csv'),
+			   'lapNumber,stream,missingFrames\n1,telemetry,2\n1,telemetry,1\n')
+
+
+def test_update_session_keeps_other_sessions(tmp_path):
+	first, second = SessionCatalog(str(tmp_path)), SessionCatalog(str(tmp_path))
+	first.update_session(1, SessionEntry().entry)
+	second.update_session(2, SessionEntry().entry)
+	first.update_session(1, dict(SessionEntry().entry, source='game'))
+
+	sessions = SessionCatalog(str(tmp_path)).sessions()
+	assert sorted(sessions) == ['1', '2']
+	assert sessions['1']['source'] == 'game'
+
+
+def test_rebuild(tmp_path):
+	recorded_session(str(tmp_path), 5)
+
+	session_type = SessionCatalog(str(tmp_path)).rebuild()['sessions']['5']['session_types']['timetrial']
+	assert session_type['session_type'] == 12
+	assert session_type['track_id'] == 3
+
+	laps = session_type['drivers']['player']
+	assert laps['1']['lap_time'] == 81.25
+	assert laps['1']['valid'] is True
+	assert laps['1']['rows'] == {'data': 4, 'telemetry': 3}
+	assert laps['1']['missing_frames'] == {'telemetry': 3}
+	# Not finished
+	assert laps['2']['lap_time'] is None
+	assert laps['2']['valid'] is None
+
+
+def test_rebuild_keeps_live_entries(tmp_path):
+	recorded_session(str(tmp_path), 5)
+	catalog = SessionCatalog(str(tmp_path))
+	catalog.update_session(5, dict(SessionEntry().entry, source='192.168.1.10:20777'))
+	# A session that is being recorded, none of its files have been written yet
+	catalog.update_session(6, SessionEntry().entry)
+
+	sessions = catalog.rebuild()['sessions']
+	assert sessions['5']['source'] == '192.168.1.10:20777'
+	assert sessions['5']['session_types']['timetrial']['drivers']['player']['1']['lap_time'] == 81.25
+	assert '6' in sessions
+	assert SessionCatalog(str(tmp_path)).sessions() == sessions
+
+
+def test_legacy_sessions_are_imported(tmp_path):
+	"""
+	Sessions recorded before the catalog existed are listed in sessions.csv, they are added to the catalog when it is
+	first saved.
+	"""
+	recorded_session(str(tmp_path), 12345)
+	write_file(os.path.join(str(tmp_path), 'sessions.csv'), 'datetime,sessionUID\n2020-08-01 12:00:00,12345\n')
+
+	SessionCatalog(str(tmp_path)).update_session(77, SessionEntry().entry)
+
+	sessions = SessionCatalog(str(tmp_path)).sessions()
+	assert sorted(sessions) == ['12345', '77']
+	assert sessions['12345']['created'] == '2020-08-01 12:00:00'
+	assert sessions['12345']['session_types']['timetrial']['drivers']['player']['1']['lap_time'] == 81.25
@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from f1_2020_telemetry.packets import CarTelemetryData_V1
+
+from benchmarks.synthetic import SyntheticSession
+from src.packets.numpy_packets import dtype_from_ctypes, unpack_udp_packet_numpy
+from src.packets.packet_saver import PacketSaver
+from src.storage import ColumnarReader, ColumnarWriter, LapCompressor, SessionCatalog, compress_columnar, \
+	compress_file, reopen_lap_file
+from tests.helpers import set_config
+
+TELEMETRY_DTYPE = dtype_from_ctypes(CarTelemetryData_V1)
+
+
+def write_columnar(path, speeds):
+	writer = ColumnarWriter(path, TELEMETRY_DTYPE, ['speed'], 'car_telemetry_data')
+	for speed in speeds:
+		structure = np.zeros((), dtype=TELEMETRY_DTYPE)
+		structure['speed'] = speed
+		writer.write(0., 0, structure)
+	writer.close()
+
+
+def test_reopen_csv(tmp_path):
+	path = str(tmp_path / 'lap1_telemetry.csv')
+	with open(path, 'w') as f:
+		f.write('speed\n100\n200\n')
+
+	assert not reopen_lap_file(path)
+	compress_file(path)
+	assert not os.path.exists(path)
+
+	assert reopen_lap_file(path)
+	assert not os.path.exists(path + '.gz')
+	with open(path, 'a') as f:
+		f.write('300\n')
+	with open(path) as f:
+		assert f.read() == 'speed\n100\n200\n300\n'
+
+
+def test_reopen_columnar(tmp_path):
+	path = str(tmp_path / 'lap1_telemetry.col')
+	write_columnar(path, [100, 200])
+	compress_columnar(path)
+	assert ColumnarReader(path).codec == 'gzip'
+
+	assert reopen_lap_file(path)
+	assert ColumnarReader(path).codec is None
+	assert not any(name.endswith('.gz') for name in os.listdir(path))
+
+	write_columnar(path, [300])
+	np.testing.assert_array_equal(ColumnarReader(path).column('speed'), [100, 200, 300])
+
+
+def test_cancel(tmp_path):
+	paths = []
+	for i in range(20):
+		paths.append(str(tmp_path / f'lap{i}_telemetry.csv'))
+		with open(paths[-1], 'w') as f:
+			f.write('speed\n' + '100\n' * 10000)
+
+	compressor = LapCompressor()
+	compressor.submit(paths)
+	# The last lap file is still queued, or it is compressed before cancel() returns
+	compressor.cancel(paths[-1])
+	reopen_lap_file(paths[-1])
+	compressor.close()
+
+	assert os.path.exists(paths[-1])
+	assert not os.path.exists(paths[-1] + '.gz')
+	assert compressor.stats()['files'] <= len(paths)
+	assert all(os.path.exists(path + '.gz') for path in paths[:-1] if not os.path.exists(path))
+
+
+@pytest.mark.parametrize('storage_format', ['csv', 'columnar'])
+def test_resume_compressed_session(data_root, storage_format):
+	"""
+	A session whose PacketSaver is closed in the middle of a lap and opened again continues the lap in the same lap file,
+	which is compressed as a whole once the lap has finished.
+	"""
+	set_config(data_root, 'recorder.ini', 'compression', 'enabled', 'yes')
+	set_config(data_root, 'recorder.ini', 'storage', 'format', storage_format)
+
+	datagrams = [d for _, d in SyntheticSession(session_uid=3, track_length=1000., num_laps=3, num_cars=1,
+												send_rate=20).datagrams()]
+	# In the middle of lap 2
+	resume = len(datagrams) // 2
+	for part in (datagrams[:resume], datagrams[resume:]):
+		saver = PacketSaver(3, data_root)
+		for datagram in part:
+			saver.save(unpack_udp_packet_numpy(datagram))
+		saver.close()
+
+	player_path = os.path.join(data_root, 'data', '3', 'timetrial', 'player')
+	rows = SessionCatalog(os.path.join(data_root, 'data')).session(3)['session_types']['timetrial']['drivers']['player']
+	for lap_number in (1, 2):
+		if storage_format == 'csv':
+			# Finished laps are compressed, there is no uncompressed part next to them
+			assert not os.path.exists(os.path.join(player_path, f'lap{lap_number}_telemetry.csv'))
+			saved_rows = len(pd.read_csv(os.path.join(player_path, f'lap{lap_number}_telemetry.csv.gz')))
+		else:
+			reader = ColumnarReader(os.path.join(player_path, f'lap{lap_number}_telemetry.col'))
+			assert reader.codec == 'gzip'
+			saved_rows = reader.num_rows
+		assert saved_rows == rows[str(lap_number)]['rows']['telemetry']
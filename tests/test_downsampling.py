@@ -0,0 +1,34 @@
+import numpy as np
+
+from src.ui.graphs.downsampling import min_max_indices
+
+
+def test_few_samples():
+	np.testing.assert_array_equal(min_max_indices(np.arange(10.), 5), np.arange(10))
+
+
+def test_peaks_are_kept():
+	rng = np.random.default_rng(1)
+	y = rng.normal(size=10000)
+	y[1234], y[8765] = 100., -100.
+
+	indices = min_max_indices(y, 100)
+	assert len(indices) <= 2 * 100 + 4
+	assert 1234 in indices and 8765 in indices
+	assert indices[0] == 0 and indices[-1] == len(y) - 1
+	assert (np.diff(indices) > 0).all()
+	# Every bucket keeps its smallest and largest sample
+	for bucket in y.reshape(100, 100):
+		assert bucket.min() in y[indices] and bucket.max() in y[indices]
+
+
+def test_nan_values():
+	y = np.arange(1000.)
+	y[100:200] = np.nan
+	y[150] = -1.
+
+	indices = min_max_indices(y, 10)
+	assert 150 in indices
+	# A bucket of only NaNs gives its first index
+	y[300:400] = np.nan
+	assert 300 in min_max_indices(y, 10)
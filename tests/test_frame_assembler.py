@@ -0,0 +1,51 @@
+import pytest
+
+from src.packets.frame_assembler import FrameAssembler
+
+NUM_FIELDS = {'telemetry': 2, 'motion': 1, 'status': 1, 'data': 1}
+
+
+def assemble(partial_frames, packets):
+	"""
+	:param packets: List of (frameIdentifier, stream, lap number, row) of car 0
+	:return: List of (car index, lap number, row) of the written frames
+	"""
+	frames = []
+	assembler = FrameAssembler(lambda *frame: frames.append(frame), NUM_FIELDS, partial_frames=partial_frames)
+	for frame_identifier, stream, lap_number, row in packets:
+		assembler.add(frame_identifier, frame_identifier / 60., stream, 0, lap_number, row)
+	assembler.flush()
+	return frames
+
+
+FRAME_1 = [(60, 'telemetry', 1, '200,3'), (60, 'motion', 1, '1.5'), (60, 'status', 1, '40.0'), (60, 'data', 1, '100.0')]
+
+
+def test_complete_frame():
+	assert assemble('forward_fill', FRAME_1) == [(0, 1, '1.0,60,200,3,1.5,40.0,100.0,0\n')]
+
+
+def test_forward_fill():
+	frames = assemble('forward_fill', FRAME_1 + [(61, 'telemetry', 1, '201,3'), (61, 'data', 1, '101.0')])
+	# Motion is bit 1 and status bit 2 of missingStreams
+	assert frames[1] == (0, 1, f'{61 / 60.},61,201,3,1.5,40.0,101.0,6\n')
+
+
+def test_flag():
+	frames = assemble('flag', FRAME_1 + [(61, 'motion', 1, '1.6')])
+	assert frames[1] == (0, 1, f'{61 / 60.},61,,,1.6,,,13\n')
+
+
+def test_first_frame_without_previous_rows():
+	# There is nothing to forward-fill a stream with before it has been received once
+	assert assemble('forward_fill', [(60, 'motion', 1, '1.5')]) == [(0, 1, '1.0,60,,,1.5,,,13\n')]
+
+
+def test_lap_number_at_start_of_frame():
+	frames = assemble('forward_fill', [(60, 'data', 1, '4999.0'), (60, 'telemetry', 2, '200,3')])
+	assert frames[0][1] == 1
+
+
+def test_unknown_policy():
+	with pytest.raises(ValueError):
+		FrameAssembler(lambda *frame: None, NUM_FIELDS, partial_frames='interpolate')
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.sessions.lap_cache import LAP_CACHE, LapCache, file_states
+from src.sessions.session_data import LAP_STREAMS, SessionData
+
+ROWS = 1000
+
+
+def frame(value):
+	return pd.DataFrame({'speed': np.full(ROWS, value, dtype=np.float64)})
+
+
+def test_eviction():
+	size = int(frame(0.).memory_usage(index=True, deep=True).sum())
+	cache = LapCache(max_bytes=2 * size)
+
+	cache.put('lap1', (), frame(1.))
+	cache.put('lap2', (), frame(2.))
+	assert cache.get('lap1', ()) is not None
+	# lap2 is now the least recently used lap
+	cache.put('lap3', (), frame(3.))
+
+	assert cache.get('lap2', ()) is None
+	assert cache.get('lap1', ()) is not None and cache.get('lap3', ()) is not None
+	assert cache.stats()['evictions'] == 1
+	assert cache.stats()['bytes'] == 2 * size
+
+	# A lap larger than the whole budget is not cached
+	cache.put('lap4', (), pd.DataFrame({'speed': np.zeros(3 * ROWS)}))
+	assert cache.get('lap4', ()) is None
+
+	cache.set_max_bytes(0)
+	assert cache.stats()['entries'] == 0
+
+
+def test_invalidation():
+	cache = LapCache()
+	cache.put('lap1', (('lap1_telemetry.csv', 1, 100),), frame(1.))
+	assert cache.get('lap1', (('lap1_telemetry.csv', 2, 120),)) is None
+	assert cache.stats()['invalidations'] == 1
+
+
+def test_file_states(tmp_path):
+	path = str(tmp_path / 'lap1_telemetry.csv')
+	assert file_states([path]) == ((path, None, None),)
+	with open(path, 'w') as f:
+		f.write('speed\n100\n')
+	assert file_states([path])[0][2] == 10
+
+
+def test_loaded_laps_are_copies(tmp_path):
+	"""
+	Changing a loaded lap in place does not change the lap that is loaded next from the cache.
+	"""
+	player_path = tmp_path / '1' / 'timetrial' / 'player'
+	player_path.mkdir(parents=True)
+	for i, stream in enumerate(LAP_STREAMS):
+		with open(player_path / f'lap1_{stream}.csv', 'w') as f:
+			f.write(f'sessionTime,frameIdentifier,value{i}\n0.0,0,1\n0.5,30,2\n')
+
+	LAP_CACHE.clear()
+	session_data = SessionData(1, str(tmp_path))
+	first = session_data.load_telemetry(1)
+	first['value0'] *= 10
+	first.loc[0, 'value1'] = -1
+
+	hits = LAP_CACHE.stats()['hits']
+	second = session_data.load_telemetry(1)
+	assert LAP_CACHE.stats()['hits'] == hits + 1
+	assert second['value0'].tolist() == [1, 2]
+	assert second['value1'].tolist() == [1, 2]
+
+	# The files have changed, the lap is loaded again. Rows of the lap data are kept by the outer merge
+	with open(player_path / 'lap1_data.csv', 'a') as f:
+		f.write('1.0,60,3\n')
+	os.utime(player_path / 'lap1_data.csv', ns=(0, 0))
+	assert len(session_data.load_telemetry(1)) == 3
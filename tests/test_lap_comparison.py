@@ -0,0 +1,54 @@
+import numpy as np
+
+from src.sessions.lap_comparison import LapComparison, resample
+from src.sessions.reference_lap import ReferenceLap
+
+
+def test_resample():
+	grid = np.arange(0., 101., 10.)
+	laps = resample([np.array([0., 50., 100.]), np.array([20., 60.]), np.array([])],
+					[np.array([0., 5., 10.]), np.array([100., 300.]), np.array([])], grid)
+
+	np.testing.assert_allclose(laps[0], grid / 10.)
+	# Outside the samples of a lap and for laps without samples the values are NaN
+	np.testing.assert_allclose(laps[1], [np.nan, np.nan, 100., 150., 200., 250., 300., np.nan, np.nan, np.nan, np.nan])
+	assert np.isnan(laps[2]).all()
+
+
+def test_resample_unordered_and_missing_samples():
+	grid = np.array([0., 25., 50.])
+	laps = resample([np.array([50., np.nan, 0., 20.])], [np.array([5., 1., 0., np.nan])], grid)
+	np.testing.assert_allclose(laps[0], [0., 2.5, 5.])
+
+
+def test_corner_stats():
+	grid = np.arange(0., 10.)
+	comparison = LapComparison(grid, [1, 2], {'speed': np.array([np.arange(10.), np.arange(10.) * 2])})
+
+	stats = comparison.corner_stats('speed', [(2., 5., 4.), (7., 8., 9.)])
+	np.testing.assert_allclose(stats['min'], [[2., 7.], [4., 14.]])
+	np.testing.assert_allclose(stats['max'], [[4., 9.], [8., 18.]])
+	np.testing.assert_allclose(stats['mean'], [[3., 8.], [6., 16.]])
+
+
+def test_corner_stats_without_corners():
+	comparison = LapComparison(np.arange(0., 10.), [1, 2], {'speed': np.ones((2, 10))})
+	assert comparison.corner_stats('speed', [])['mean'].shape == (2, 0)
+
+
+def test_reference_lap_time_at():
+	reference = ReferenceLap([0., 100., 200.], [0., 2., 6.])
+	assert reference.time_at(50.) == 1.
+	assert reference.time_at(150.) == 4.
+	# Outside the samples the first or last time is used
+	assert reference.time_at(300.) == 6.
+	assert reference.delta(150., 5.) == 1.
+	assert reference.delta(-10., 5.) is None
+	assert ReferenceLap([], []).time_at(50.) is None
+
+
+def test_reference_lap_flashback():
+	# Samples before the start line and of the attempt before a flashback at 150 m are dropped
+	reference = ReferenceLap([-5., 0., 100., 150., 80., 120., 200.], [-0.1, 0., 2., 3., 5., 6., 8.])
+	assert reference.distances == [0., 80., 120., 200.]
+	assert reference.time_at(100.) == 5.5
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import SyntheticSession
+from src.packets.lap_summary import LAP_SUMMARY_COLUMNS, LapSummaries
+from src.packets.numpy_packets import unpack_udp_packet_numpy
+from src.packets.packet_saver import PacketSaver
+from src.storage import SessionCatalog
+
+
+def summary(row):
+	return dict(zip(LAP_SUMMARY_COLUMNS, row.rstrip('\n').split(',')))
+
+
+def test_lap_summary():
+	summaries = LapSummaries(num_cars=2)
+	summaries.add_status([0, 1], [50., 40.], [[1., 1., 2., 2.], [0., 0., 0., 0.]], [16, 17], [0, 3])
+	summaries.add_lap_data([0, 1], [0, 0], [0, 0], [0, 0], [0, 0])
+	summaries.add_telemetry([0, 1], [250, 100])
+	summaries.add_lap_data([0, 1], [30000, 0], [0, 0], [1, 1], [1, 0])
+	summaries.add_telemetry([0, 1], [120, 110])
+	summaries.add_lap_data([0, 1], [30000, 0], [31000, 0], [2, 2], [0, 0])
+	summaries.add_telemetry([0, 1], [310, 120])
+	summaries.add_status([0, 1], [48.5, 39.], [[2., 2., 3., 4.], [0., 0., 0., 0.]], [16, 17], [0, 3])
+
+	lap = summary(summaries.finish(0, 1, 90.5, True))
+	assert float(lap['lapTime']) == 90.5
+	assert (float(lap['sector1Time']), float(lap['sector2Time']), float(lap['sector3Time'])) == (30., 31., 29.5)
+	assert lap['valid'] == '1'
+	assert lap['pitStatus'] == '1'
+	assert float(lap['topSpeed']) == 310.
+	assert [float(lap[f'minSpeedSector{i}']) for i in (1, 2, 3)] == [250., 120., 310.]
+	assert float(lap['fuelUsed']) == 1.5
+	assert [float(lap[f'tyreWear{tyre}']) for tyre in ('RL', 'RR', 'FL', 'FR')] == [1., 1., 1., 2.]
+	assert lap['visualTyreCompound'] == '16'
+
+	# The lap of car 1 has no sector times, the sector times and the third sector are left empty
+	lap = summary(summaries.finish(1, 1, 95., False))
+	assert lap['valid'] == '0'
+	assert lap['sector1Time'] == lap['sector2Time'] == lap['sector3Time'] == ''
+
+	# The next lap starts from scratch, with the fuel the previous lap ended with
+	summaries.add_status([0], [47.], [[2., 2., 3., 4.]], [16], [1])
+	lap = summary(summaries.finish(0, 2, 91., True))
+	assert lap['topSpeed'] == ''
+	assert float(lap['fuelUsed']) == 1.5
+
+
+def test_laps_match_lap_data(data_root):
+	"""
+	The lap times and validity in laps.csv, taken from the lap data packets when the next lap starts, match those
+	derived from the saved lap data.
+	"""
+	saver = PacketSaver(4, data_root)
+	for _, datagram in SyntheticSession(session_uid=4, track_length=1000., num_laps=4, num_cars=2, send_rate=20,
+										seed=1).datagrams():
+		saver.save(unpack_udp_packet_numpy(datagram))
+	saver.close()
+
+	data_path = os.path.join(data_root, 'data')
+	drivers = SessionCatalog(data_path).rebuild()['sessions']['4']['session_types']['timetrial']['drivers']
+	valid = []
+	for driver in os.listdir(os.path.join(data_path, '4', 'timetrial')):
+		laps_path = os.path.join(data_path, '4', 'timetrial', driver, 'laps.csv')
+		if not os.path.exists(laps_path):
+			continue
+		laps = pd.read_csv(laps_path)
+		assert len(laps) > 0
+		for lap in laps.itertuples():
+			rebuilt = drivers[driver][str(lap.lapNumber)]
+			assert np.isclose(lap.lapTime, rebuilt['lap_time'], atol=0.1)
+			assert bool(lap.valid) == rebuilt['valid']
+			valid.append(bool(lap.valid))
+
+	# With this seed both cars invalidate a lap
+	assert valid.count(False) == 2
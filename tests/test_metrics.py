@@ -0,0 +1,47 @@
+from src.packets.metrics import FrameGapTracker, RecorderMetrics
+
+
+def missing_frames(frames, tracker=None):
+	tracker = tracker or FrameGapTracker()
+	return [tracker.record('motion', frame) for frame in frames]
+
+
+def test_no_gaps():
+	assert sum(missing_frames(range(0, 300, 3))) == 0
+
+
+def test_gaps():
+	missing = missing_frames([0, 3, 6, 12, 15, 18, 27, 30, 33])
+	# The frames of a gap are counted when the next step shows the send rate has not changed
+	assert missing == [0, 0, 0, 0, 1, 0, 0, 2, 0]
+
+
+def test_send_rate_changes():
+	# 60 Hz, then 20 Hz, e.g. in the menus, then 60 Hz again
+	frames = list(range(0, 100)) + list(range(100, 400, 3)) + list(range(400, 500))
+	assert sum(missing_frames(frames)) == 0
+
+
+def test_gap_after_send_rate_change():
+	# After 397 the frames 400 and 403 are missed
+	frames = list(range(0, 100)) + list(range(100, 400, 3)) + [406, 409, 412]
+	assert sum(missing_frames(frames)) == 2
+
+
+def test_restart():
+	tracker = FrameGapTracker()
+	missing_frames(range(0, 100), tracker)
+	# A flashback or a new session restarts the frameIdentifiers, that is not a gap
+	assert sum(missing_frames([50, 51, 52], tracker)) == 0
+	assert tracker.record('status', 1000) == 0
+
+
+def test_recorder_metrics():
+	metrics = RecorderMetrics(summary_interval=0)
+	for frame in [0, 1, 2, 5, 6, 7]:
+		metrics.record_packet(0, frame, source='game')
+	metrics.record_packet(3, 4, source='game')
+
+	stats = metrics.stats()
+	assert stats['packets'] == {'motion': 6, 'event': 1}
+	assert stats['frame_gaps'] == {'motion': {'gaps': 1, 'missing_frames': 2}}
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from f1_2020_telemetry.packets import HeaderFieldsToPacketType, unpack_udp_packet
+
+from benchmarks.synthetic import SyntheticSession
+from src.packets.numpy_packets import unpack_udp_packet_numpy
+from tests.helpers import assert_same, random_datagram
+
+# Datagrams compared per packet type, comparing every field of a packet takes a while
+DATAGRAMS_PER_TYPE = 20
+
+
+def synthetic_datagrams():
+	"""
+	:return: Dictionary of packetId to the first DATAGRAMS_PER_TYPE datagrams of that packet type of a synthetic session
+	"""
+	datagrams = {}
+	for _, datagram in SyntheticSession(num_laps=1, num_cars=3, seed=1).datagrams():
+		packet_id = unpack_udp_packet(datagram).header.packetId
+		datagrams.setdefault(packet_id, [])
+		if len(datagrams[packet_id]) < DATAGRAMS_PER_TYPE:
+			datagrams[packet_id].append(datagram)
+	return datagrams
+
+
+SYNTHETIC_DATAGRAMS = synthetic_datagrams()
+
+
+@pytest.mark.parametrize('packet_type', list(HeaderFieldsToPacketType.values()), ids=lambda t: t.__name__)
+def test_random_packets(packet_type):
+	rng = np.random.default_rng(2020)
+	for _ in range(DATAGRAMS_PER_TYPE):
+		datagram = random_datagram(packet_type, rng)
+		assert_same(unpack_udp_packet(datagram), unpack_udp_packet_numpy(datagram), packet_type.__name__)
+
+
+@pytest.mark.parametrize('packet_id', sorted(SYNTHETIC_DATAGRAMS))
+def test_synthetic_packets(packet_id):
+	for datagram in SYNTHETIC_DATAGRAMS[packet_id]:
+		ctypes_packet = unpack_udp_packet(datagram)
+		assert_same(ctypes_packet, unpack_udp_packet_numpy(datagram), type(ctypes_packet).__name__)
+
+
+def test_all_packet_types_synthesized():
+	assert sorted(SYNTHETIC_DATAGRAMS) == sorted(key[2] for key in HeaderFieldsToPacketType)
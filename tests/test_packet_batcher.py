@@ -0,0 +1,25 @@
+import pytest
+
+from src.ui.packet_batcher import PacketBatcher
+
+
+@pytest.mark.parametrize('overflow_policy, expected', [
+	('drop_newest', [0, 1, 2]),
+	('drop_oldest', [2, 3, 4])
+])
+def test_overflow_policies(overflow_policy, expected):
+	batcher = PacketBatcher(max_size=3, overflow_policy=overflow_policy)
+	for packet in range(5):
+		batcher.add(packet)
+
+	assert batcher.stats() == {'batch_size': 3, 'max_batch_size': 0, 'dropped': 2}
+	assert batcher.take() == expected
+	# The next batch starts empty and is bounded as well
+	batcher.add(5)
+	assert batcher.take() == [5]
+	assert batcher.stats() == {'batch_size': 0, 'max_batch_size': 3, 'dropped': 2}
+
+
+def test_unknown_overflow_policy():
+	with pytest.raises(ValueError):
+		PacketBatcher(overflow_policy='block')
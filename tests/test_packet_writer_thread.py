@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from benchmarks.synthetic import SyntheticSession
+from src.packets.packet_writer_thread import PacketWriterThread
+
+
+def queued(writer):
+	return [item[2] for item in list(writer._queue.queue)]
+
+
+def test_unknown_overflow_policy(data_root):
+	with pytest.raises(ValueError):
+		PacketWriterThread(data_root, overflow_policy='drop_all')
+
+
+@pytest.mark.parametrize('overflow_policy, expected', [
+	('drop_newest', [b'0', b'1']),
+	('drop_oldest', [b'1', b'2'])
+])
+def test_drop_policies(data_root, overflow_policy, expected):
+	# The thread is not started, so nothing is taken from the queue
+	writer = PacketWriterThread(data_root, max_size=2, overflow_policy=overflow_policy)
+	for i in range(3):
+		writer.put(str(i).encode())
+
+	assert queued(writer) == expected
+	stats = writer.stats()
+	assert (stats['received'], stats['dropped'], stats['queue_depth']) == (3, 1, 2)
+
+
+def test_block_policy(data_root):
+	writer = PacketWriterThread(data_root, max_size=2, overflow_policy='block')
+	writer.put(b'0')
+	writer.put(b'1')
+
+	receiver = threading.Thread(target=writer.put, args=(b'2',), daemon=True)
+	receiver.start()
+	receiver.join(timeout=0.2)
+	# The receiving thread waits until there is room in the queue
+	assert receiver.is_alive()
+
+	writer._queue.get_nowait()
+	receiver.join(timeout=1.)
+	assert not receiver.is_alive()
+	assert queued(writer) == [b'1', b'2']
+	assert writer.stats()['dropped'] == 0
+
+
+def test_close_saves_queued_datagrams(data_root):
+	writer = PacketWriterThread(data_root)
+	datagrams = [datagram for _, datagram in SyntheticSession(session_uid=5, track_length=1000., num_laps=1,
+															   num_cars=1, send_rate=20, seed=1).datagrams()]
+	for datagram in datagrams:
+		writer.put(datagram)
+	writer.start()
+	writer.close()
+
+	stats = writer.stats()
+	assert stats['saved'] == len(datagrams)
+	assert (stats['dropped'], stats['errors'], stats['queue_depth']) == (0, 0, 0)
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from f1_2020_telemetry.packets import CarTelemetryData_V1
+
+from src.packets.packet_config import ExtractionPlan
+from src.sessions.schema import ColumnSchema
+
+
+def telemetry_structure():
+	structure = CarTelemetryData_V1()
+	structure.speed = 250
+	for i, value in enumerate((22.5, 23.1, 24., 21.)):
+		structure.tyresPressure[i] = value
+	for i, value in enumerate((90, 105, 88, 101)):
+		structure.tyresSurfaceTemperature[i] = value
+	return structure
+
+
+def test_array_formats():
+	"""
+	Array fields saved by extraction plans and as formatted by numpy, as in files recorded before them, load the same.
+	"""
+	structure = telemetry_structure()
+	fields = ['speed', 'tyresPressure', 'tyresSurfaceTemperature']
+	new_row = ExtractionPlan(CarTelemetryData_V1, fields).format(structure, newline=False).split(',')
+	old_row = [str(structure.speed)] + [str(np.ctypeslib.as_array(getattr(structure, f)))[1:-1] for f in fields[1:]]
+	assert new_row != old_row
+
+	frame = pd.DataFrame([new_row, old_row], columns=fields)
+	compact = ColumnSchema(['car_telemetry_data']).compact(frame)
+
+	np.testing.assert_array_equal(compact.iloc[0].to_numpy(), compact.iloc[1].to_numpy())
+	assert compact['tyresPressureFL'].dtype == np.float32
+	assert compact['tyresPressureFL'].iloc[1] == np.float32(24.)
+	assert compact['tyresSurfaceTemperatureRR'].dtype == np.uint8
+	assert compact['tyresSurfaceTemperatureRR'].iloc[1] == 105
+
+
+def test_array_missing_values():
+	frame = pd.DataFrame({'tyresPressure': ['22.5 23.1 24.0', None]})
+	with pytest.raises(ValueError):
+		ColumnSchema(['car_telemetry_data']).compact(frame)